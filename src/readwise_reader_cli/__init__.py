@@ -0,0 +1,15 @@
+from .client import AsyncReader, Reader, ReaderError, SaveResult
+from .query import DocumentQuery
+from .scheduler import Job, Priority, RequestCancelled, use_job
+
+__all__ = [
+    "AsyncReader",
+    "DocumentQuery",
+    "Job",
+    "Priority",
+    "Reader",
+    "ReaderError",
+    "RequestCancelled",
+    "SaveResult",
+    "use_job",
+]
@@ -3,17 +3,81 @@
 import click
 
 from . import commands
+from .api import set_transport
+from .constants import STREAM_BATCH_SIZE
+from .data import set_batch_size
+from .profiles import DEFAULT_PROFILE, PROFILE_NAME, set_profile
+from .transport import LocalTransport
+
+
+def validate_profile(ctx, param, value):
+    value = value.lower()
+    if not PROFILE_NAME.match(value):
+        raise click.BadParameter("Use letters, digits and underscores only.")
+    return value
 
 
 @click.group(help="Interact with your Reader Library")
-def cli():
-    pass
+@click.option(
+    "--profile",
+    "-p",
+    envvar="READER_PROFILE",
+    default=DEFAULT_PROFILE,
+    show_default=True,
+    callback=validate_profile,
+    help="Reader account to use. A profile named NAME reads its token from "
+    "READER_API_TOKEN_NAME and keeps its own caches.",
+)
+@click.option(
+    "--local-library",
+    envvar="READER_LOCAL_LIBRARY",
+    metavar="SOURCE",
+    help="Serve requests from a local library instead of the Reader API: "
+    "a .json/.jsonl file of documents, 'cache' for the last synced library, "
+    "or 'synthetic:N' for N generated documents.",
+)
+@click.option(
+    "--batch-size",
+    envvar="READER_BATCH_SIZE",
+    type=click.IntRange(min=1),
+    default=STREAM_BATCH_SIZE,
+    show_default=True,
+    help="Documents held in memory at once while syncing the full library.",
+)
+@click.option("--local-latency", type=float, default=0.0, hidden=True)
+@click.option(
+    "--local-429-ratio", type=click.FloatRange(0, 1), default=0.0, hidden=True
+)
+@click.option("--local-seed", type=int, default=None, hidden=True)
+def cli(profile, local_library, batch_size, local_latency, local_429_ratio, local_seed):
+    set_profile(profile)
+    set_batch_size(batch_size)
+
+    if local_library:
+        try:
+            transport = LocalTransport.from_spec(
+                local_library,
+                latency=local_latency,
+                rate_limit_ratio=local_429_ratio,
+                seed=local_seed,
+            )
+        except (OSError, ValueError) as e:
+            raise click.BadParameter(str(e), param_hint="--local-library")
+        set_transport(transport)
 
 
 # Commands
 cli.add_command(commands.add)  # Add command
+cli.add_command(commands.archive)  # Archive command
+cli.add_command(commands.diff)  # Diff command
+cli.add_command(commands.export)  # Export command
+cli.add_command(commands.highlights)  # Highlights command
 cli.add_command(commands.list)  # List command
 cli.add_command(commands.lib)  # Library command
+cli.add_command(commands.retag)  # Retag command
+cli.add_command(commands.stats)  # Stats command
+cli.add_command(commands.sync)  # Sync command
+cli.add_command(commands.tail)  # Tail command
 cli.add_command(commands.update)  # Update command
 cli.add_command(commands.upload)  # Upload command
 cli.add_command(commands.validate)  # Validate command
@@ -1,14 +1,14 @@
 """Provides code to fetch and manage document information."""
 
 import logging
-import os
+import threading
 import time
+from collections import Counter
 from datetime import datetime
 from functools import wraps
-from typing import Dict, Iterable, List, Optional, Tuple, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import dotenv
-import requests
 import urllib3
 from click import secho
 from requests import Response
@@ -17,11 +17,18 @@ from .constants import (
     AUTH_TOKEN_URL,
     BASE_URL,
     CREATE_ENDPOINT,
+    CREATE_RATE_LIMIT,
     LIST_ENDPOINT,
     TOKEN_URL,
     UPDATE_ENDPOINT,
+    UPDATE_RATE_LIMIT,
 )
+from .memo import QueryMemo
 from .models import CategoryEnum, DocumentInfo, ListParameters, LocationEnum
+from .profiles import get_profile, get_token
+from .query import DocumentQuery
+from .scheduler import RateLimiter
+from .transport import HTTPTransport, Transport, decode_json
 
 urllib3.disable_warnings()
 dotenv.load_dotenv()
@@ -44,12 +51,16 @@ HTTP_CODE_HANDLING = {
 
 
 def build_log_message(func, *args, **kwargs):
-    if func.__name__ == "list_documents":
+    if func.__name__ in ("list_documents", "iter_documents"):
         request_type = "GET"
         category = kwargs.get("category")
         location = kwargs.get("location")
         updated_after = kwargs.get("updated_after")
         msg = f"Making {request_type} request - parameters: category {category} location {location} updated-after {updated_after}"
+    elif func.__name__ == "iter_query":
+        request_type = "GET"
+        query = kwargs.get("query") or args[0]
+        msg = f"Making {request_type} request - parameters: {query.parameters()}"
     elif func.__name__ == "add_document":
         request_type = "POST"
         doc_info = kwargs.get("doc_info")
@@ -95,31 +106,110 @@ def doc_info_jsonify(doc_info: DocumentInfo) -> Dict[str, Union[str, None]]:
     return doc_info.model_dump(exclude_unset=True, mode="json")
 
 
+# Requests per minute each endpoint is paced to. Listing isn't paced to its
+# limit (20 per minute), which would stretch every sync page by 3 seconds:
+# pages are only held back after a throttled response, fetching is cheap to retry
+RATE_LIMITS = {
+    LIST_ENDPOINT: None,
+    CREATE_ENDPOINT: CREATE_RATE_LIMIT,
+    UPDATE_ENDPOINT: UPDATE_RATE_LIMIT,
+}
+
+_rate_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(endpoint: str) -> RateLimiter:
+    """The current profile's limiter for `endpoint`, each account has its own budget"""
+    key = (get_profile(), endpoint)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(RATE_LIMITS[endpoint])
+        return _rate_limiters[key]
+
+
+_transport: Transport = HTTPTransport()
+
+
+def get_transport() -> Transport:
+    return _transport
+
+
+def set_transport(transport: Transport) -> None:
+    """Send all following requests through `transport`, e.g. a `LocalTransport`"""
+    global _transport
+    _transport = transport
+
+
+_query_memo: Optional[QueryMemo] = QueryMemo()
+
+
+def get_query_memo() -> Optional[QueryMemo]:
+    return _query_memo
+
+
+def set_query_memo(memo: Optional[QueryMemo]) -> None:
+    """Share listings through `memo` from now on, or never with None"""
+    global _query_memo
+    _query_memo = memo
+
+
+def listing_key(
+    params: Dict, account: Optional[str] = None, transport: Optional[Transport] = None
+) -> tuple:
+    # Listings differ per account and transport. Tags are all required, so
+    # their order doesn't matter.
+    normalized = {
+        name: tuple(sorted(value)) if isinstance(value, list) else value
+        for name, value in params.items()
+        if value is not None and name != "pageCursor"
+    }
+    return (
+        account or get_profile(),
+        id(transport or _transport),
+        tuple(sorted(normalized.items())),
+    )
+
+
+def _forget_listings(resp: Response) -> None:
+    # Saved and updated documents make memoized listings stale
+    if resp.ok and _query_memo is not None:
+        _query_memo.clear()
+
+
 def _get_list(params: Dict[str, Union[str, None]]) -> Response:
-    resp = requests.get(
+    get_rate_limiter(LIST_ENDPOINT).wait()
+    resp = _transport.request(
+        "GET",
         url=f"{BASE_URL}{LIST_ENDPOINT}",
         params=params,
-        headers={"Authorization": f"Token {os.getenv('READER_API_TOKEN')}"},
+        headers={"Authorization": f"Token {get_token()}"},
         verify=False,
     )
     return resp
 
 
 def _create_doc(info: Dict[str, Union[str, None]]) -> Response:
-    resp = requests.post(
+    get_rate_limiter(CREATE_ENDPOINT).wait()
+    resp = _transport.request(
+        "POST",
         url=f"{BASE_URL}{CREATE_ENDPOINT}",
-        headers={"Authorization": f"Token {os.getenv('READER_API_TOKEN')}"},
+        headers={"Authorization": f"Token {get_token()}"},
         json=info,
     )
+    _forget_listings(resp)
     return resp
 
 
 def _update_doc(document_id: str, data: Dict[str, Union[str, None]]) -> Response:
-    resp = requests.patch(
+    get_rate_limiter(UPDATE_ENDPOINT).wait()
+    resp = _transport.request(
+        "PATCH",
         url=f"{BASE_URL}{UPDATE_ENDPOINT}/{document_id}/",
-        headers={"Authorization": f"Token {os.getenv('READER_API_TOKEN')}"},
+        headers={"Authorization": f"Token {get_token()}"},
         json=data,
     )
+    _forget_listings(resp)
     return resp
 
 
@@ -131,34 +221,188 @@ def _handle_http_status(
     return handling_code, retry_after
 
 
-def _fetch_results(
-    params: Dict[str, Union[str, None]], retry_after_default: int = 5
-) -> Iterable[List[dict]]:
+# Called with the handling code and Retry-After of a response that isn't valid
+StatusHandler = Callable[[str, int, Response], None]
+
+
+def _print_list_status(handling_code: str, retry_after: int, resp: Response) -> None:
+    if handling_code == "retry":
+        msg = STATUS_ACTIONS[handling_code]
+        secho(msg.format(retry_after), fg="bright_yellow", err=True)
+    elif handling_code in STATUS_ACTIONS:
+        secho(STATUS_ACTIONS[handling_code], fg="yellow", err=True)
+
+
+def _print_write_status(handling_code: str, retry_after: int, resp: Response) -> None:
+    if handling_code == "retry":
+        msg = STATUS_ACTIONS[handling_code]
+        secho(msg.format(retry_after), fg="bright_yellow")
+    else:
+        secho(STATUS_ACTIONS[handling_code], fg="bright_red")
+
+
+def paginate(
+    get_list: Callable[[Dict], Response],
+    params: Dict[str, Union[str, None]],
+    retry_after_default: int = 5,
+    counts: Optional[Counter] = None,
+    on_status: Optional[StatusHandler] = None,
+    backoff: Callable[[float], None] = time.sleep,
+) -> Iterator[List[dict]]:
+    """Yield the results of each list page, following the page cursor.
+
+    Throttled pages are retried after `backoff` is called with the seconds to
+    wait, e.g. to pause a `RateLimiter`. Every response that isn't valid is
+    passed to `on_status` first, which may raise to stop fetching.
+
+    Returns:
+        bool: False if fetching stopped on an error response
+    """
+    counts = Counter() if counts is None else counts
     next_page_cursor = None
     while True:
         params["pageCursor"] = next_page_cursor
 
-        resp = _get_list(params=params)
+        resp = get_list(params)
 
         handling_code, retry_after = _handle_http_status(resp, retry_after_default)
 
         if not handling_code == "valid":
             if handling_code == "retry":
-                time.sleep(retry_after)
-                msg = STATUS_ACTIONS[handling_code]
-                secho(msg.format(retry_after), fg="bright_yellow")
-            elif handling_code in STATUS_ACTIONS:
-                msg = STATUS_ACTIONS[handling_code]
-                secho(msg, fg="yellow")
-                break
-            else:
-                break
-
-        yield resp.json().get("results", [])
-
-        next_page_cursor = resp.json().get("nextPageCursor")
+                counts["retries"] += 1
+                backoff(retry_after)
+            if on_status is not None:
+                on_status(handling_code, retry_after, resp)
+            if handling_code == "retry":
+                continue  # retry the same page
+            return False
+
+        page = decode_json(resp.content)  # parsed once, pages can be large
+        counts["pages"] += 1
+        yield page.get("results", [])
+
+        next_page_cursor = page.get("nextPageCursor")
         if not next_page_cursor:
-            break
+            return True
+
+
+def _fetch_results(
+    params: Dict[str, Union[str, None]],
+    retry_after_default: int = 5,
+    counts: Optional[Counter] = None,
+) -> Iterator[List[dict]]:
+    return paginate(
+        _get_list,
+        params,
+        retry_after_default,
+        counts,
+        on_status=_print_list_status,
+        backoff=get_rate_limiter(LIST_ENDPOINT).pause,
+    )
+
+
+def send_with_retries(
+    request: Callable[[], Response],
+    on_status: Optional[StatusHandler] = None,
+    backoff: Callable[[float], None] = time.sleep,
+) -> Response:
+    """Send a write, resending it after `backoff` while it's throttled"""
+    while True:
+        resp = request()
+
+        handling_code, retry_after = _handle_http_status(resp=resp)
+        if handling_code == "valid":
+            return resp
+        if handling_code == "retry":
+            backoff(retry_after)
+        if on_status is not None:
+            on_status(handling_code, retry_after, resp)
+        if handling_code != "retry":
+            return resp
+
+
+def query_pages(
+    query: DocumentQuery, pages: Iterable[List[dict]]
+) -> Iterator[DocumentInfo]:
+    """Apply a query's remaining filters, projection and limit to fetched pages"""
+    count = 0
+    for results in pages:
+        for doc_info in results:
+            if not query.residual(doc_info):
+                continue
+            # Cheaper than DocumentInfo(**...), which repacks the keywords
+            yield DocumentInfo.model_validate(query.project(doc_info))
+
+            count += 1
+            if query.limit and count >= query.limit:
+                return
+
+
+@log
+def iter_documents(
+    id: Optional[str] = None,
+    category: Optional[CategoryEnum] = None,
+    location: Optional[LocationEnum] = None,
+    updated_after: Optional[datetime] = None,
+    counts: Optional[Counter] = None,
+    memoize: bool = True,
+    debug: bool = False,
+) -> Iterator[DocumentInfo]:
+    """Yields `DocumentInfo` objects page by page as they are fetched.
+
+    Args:
+        id (str, optional): document unique identifier
+        category (str, optional): The category to filter documents by
+        location (str, optional): The location to filter documents by
+        updated_after (datetime, optional): Update after datetime object
+        counts (Counter, optional): Incremented for fetched "pages" and "retries"
+        memoize (bool): Share the listing with identical recent requests
+
+    Yields:
+        DocumentInfo: A `DocumentInfo` object
+    """
+
+    query = DocumentQuery(
+        id=id, category=category, location=location, updated_after=updated_after
+    )
+    return iter_query(query, counts=counts, memoize=memoize)
+
+
+@log
+def iter_query(
+    query: DocumentQuery,
+    counts: Optional[Counter] = None,
+    memoize: bool = True,
+    debug: bool = False,
+) -> Iterator[DocumentInfo]:
+    """Yields the `DocumentInfo` objects matching a query as pages are fetched.
+
+    Filters the API supports are pushed down with the request, the rest are
+    applied to raw documents, which are projected before they're validated.
+    Fetching stops as soon as the query's limit is reached.
+
+    Identical listings requested within `QUERY_MEMO_TTL` seconds are served
+    from memory, and concurrent ones share a single fetch. Pages served from
+    memory aren't counted in `counts`.
+
+    Args:
+        query (DocumentQuery): Filters, limit and projection of the listing
+        counts (Counter, optional): Incremented for fetched "pages" and "retries"
+        memoize (bool): Share the listing with identical recent requests
+
+    Yields:
+        DocumentInfo: A `DocumentInfo` object
+    """
+
+    params = query.parameters()
+    if memoize and _query_memo is not None:
+        pages = _query_memo.pages(
+            listing_key(params), lambda: _fetch_results(params=params, counts=counts)
+        )
+    else:
+        pages = _fetch_results(params=params, counts=counts)
+
+    yield from query_pages(query, pages)
 
 
 @log
@@ -181,20 +425,11 @@ def list_documents(
         List[DocumentInfo]: A list of `DocumentInfo` objects
     """
 
-    params = list_parameter_jsonify(
-        ListParameters(
-            id=id,
-            category=category,
-            location=location,
-            update_after=updated_after,
-            next_page_cursor=None,
-        )
-    )
-
     return [
-        DocumentInfo(**doc_info)
-        for results in _fetch_results(params=params)
-        for doc_info in results
+        doc_info
+        for doc_info in iter_documents(
+            id=id, category=category, location=location, updated_after=updated_after
+        )
     ]
 
 
@@ -208,23 +443,11 @@ def add_document(doc_info: DocumentInfo, debug: bool = False) -> Response:
 
     doc_info_json = doc_info_jsonify(doc_info=doc_info)
 
-    while True:
-        resp = _create_doc(info=doc_info_json)
-
-        handling_code, retry_after = _handle_http_status(resp=resp)
-
-        if not handling_code == "valid":
-            if handling_code == "retry":
-                time.sleep(retry_after)
-                msg = STATUS_ACTIONS[handling_code]
-                secho(msg.format(retry_after), fg="bright_yellow")
-            else:
-                msg = STATUS_ACTIONS[handling_code]
-                secho(msg, fg="bright_red")
-                break
-        else:
-            break
-    return resp
+    return send_with_retries(
+        lambda: _create_doc(info=doc_info_json),
+        _print_write_status,
+        backoff=get_rate_limiter(CREATE_ENDPOINT).pause,
+    )
 
 
 @log
@@ -238,30 +461,19 @@ def update_document(
         data (dict): Fields to update
     """
 
-    while True:
-        resp = _update_doc(document_id=document_id, data=data)
-
-        handling_code, retry_after = _handle_http_status(resp=resp)
-
-        if not handling_code == "valid":
-            if handling_code == "retry":
-                time.sleep(retry_after)
-                msg = STATUS_ACTIONS[handling_code]
-                secho(msg.format(retry_after), fg="bright_yellow")
-            else:
-                msg = STATUS_ACTIONS[handling_code]
-                secho(msg, fg="bright_red")
-                break
-        else:
-            break
-    return resp
+    return send_with_retries(
+        lambda: _update_doc(document_id=document_id, data=data),
+        _print_write_status,
+        backoff=get_rate_limiter(UPDATE_ENDPOINT).pause,
+    )
 
 
 @log
 def validate_token(token: str, debug: bool = False) -> bool:
     """Check that a token is valid."""
 
-    response = requests.get(
+    response = _transport.request(
+        "GET",
         AUTH_TOKEN_URL,
         headers={"Authorization": f"Token {token}"},
     )
@@ -0,0 +1,276 @@
+"""Provides a content-addressed store for offline copies of document bodies."""
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+import requests
+
+from .constants import MAX_WORKERS
+from .models import DocumentInfo
+from .profiles import DATA_DIR, cache_dir
+
+# Bodies kept per document, by the column they're recorded in
+BODY_FIELDS = {"html": "html_content", "content": "content", "summary": "summary"}
+IMAGE_TIMEOUT = 30  # Seconds
+IMAGE_MAX_SIZE = 20 * 1024 * 1024  # Bytes, larger images aren't kept
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    url TEXT,
+    updated_at TEXT,
+    archived_at TEXT NOT NULL,
+    html TEXT,
+    content TEXT,
+    summary TEXT,
+    image TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def blob_path() -> Path:
+    # Shared by every profile, so content saved in several accounts is kept once
+    return DATA_DIR / "blobs.sqlite"
+
+
+def archive_path() -> Path:
+    return cache_dir() / "archive.sqlite"
+
+
+class BlobStore:
+    """Blobs stored once each, gzip-compressed, under the SHA-256 of their data.
+
+    Storing data that's already there only hashes it, so the store grows with
+    unique content, however many documents or syncs share it. Blobs are kept
+    in an SQLite database rather than a file each, as most bodies are smaller
+    than a file system block once compressed. Data is compressed outside the
+    store's lock, so threads storing blobs only wait on each other to insert.
+
+    Args:
+        path: The store's database, created if missing
+    """
+
+    def __init__(self, path=None):
+        path = path or blob_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")  # readers don't block
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS blobs"
+            " (digest TEXT PRIMARY KEY, size INTEGER NOT NULL, data BLOB NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+        return row is not None
+
+    def put(self, data: bytes) -> tuple:
+        """Store `data` unless it's already stored.
+
+        Returns:
+            tuple: The blob's digest, and the compressed bytes written, or 0
+            if the blob was already stored
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self:
+            return digest, 0
+
+        compressed = gzip.compress(data, compresslevel=6)
+        with self._lock:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)",
+                (digest, len(data), compressed),
+            )
+        return digest, len(compressed) if cursor.rowcount else 0
+
+    def get(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT data FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+        return gzip.decompress(row[0]) if row else None
+
+    def commit(self) -> None:
+        with self._lock:
+            self.connection.commit()
+
+
+class ArchivedDocument(NamedTuple):
+    id: str
+    title: Optional[str]
+    url: Optional[str]
+    updated_at: Optional[str]
+    archived_at: str
+    html: Optional[str]
+    content: Optional[str]
+    summary: Optional[str]
+    image: Optional[str]
+
+
+class ContentArchive:
+    """Which blobs hold each archived document's bodies and image.
+
+    Args:
+        path: The archive's manifest, an SQLite database. Default: the current
+            profile's
+        blobs (BlobStore, optional): Where bodies are stored
+    """
+
+    def __init__(self, path=None, blobs: Optional[BlobStore] = None):
+        path = path or archive_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.blobs = blobs or BlobStore()
+
+    @property
+    def archived_until(self) -> Optional[datetime]:
+        """When the last complete archive run started, as an aware time"""
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'archived_until'"
+        ).fetchone()
+        # Earlier runs stored naive local times, which the API would read as UTC
+        return datetime.fromisoformat(row[0]).astimezone() if row else None
+
+    def mark_archived(self, until: datetime) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('archived_until', ?)",
+            (until.isoformat(),),
+        )
+        self.connection.commit()
+
+    def record(self, document: ArchivedDocument) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            document,
+        )
+
+    def commit(self) -> None:
+        self.blobs.commit()
+        self.connection.commit()
+
+    def get(self, document_id: str) -> Optional[ArchivedDocument]:
+        row = self.connection.execute(
+            "SELECT * FROM documents WHERE id = ?", (document_id,)
+        ).fetchone()
+        return ArchivedDocument(*row) if row else None
+
+    def body(self, document_id: str) -> Optional[bytes]:
+        """A document's archived HTML, or its text if it has no HTML"""
+        document = self.get(document_id)
+        if document is None:
+            return None
+        digest = document.html or document.content or document.summary
+        return self.blobs.get(digest) if digest else None
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute("SELECT count(*) FROM documents").fetchone()
+        return count
+
+
+def _fetch_image(session: requests.Session, url: str) -> Optional[bytes]:
+    try:
+        with session.get(url, timeout=IMAGE_TIMEOUT, stream=True) as resp:
+            if resp.status_code != 200:
+                return None
+            data = resp.raw.read(IMAGE_MAX_SIZE + 1, decode_content=True)
+    except (requests.RequestException, OSError):
+        return None
+    return data if len(data) <= IMAGE_MAX_SIZE else None
+
+
+def archive_documents(
+    documents: Iterable[DocumentInfo],
+    archive: ContentArchive,
+    images: bool = False,
+    workers: int = MAX_WORKERS,
+    counts: Optional[Counter] = None,
+) -> int:
+    """Store the bodies, and optionally the images, of documents as they arrive.
+
+    Bodies are hashed, compressed and written by a pool of `workers` threads,
+    which also download images, with a bounded number of documents in flight.
+
+    Args:
+        documents (Iterable[DocumentInfo]): Documents listed with their HTML
+        archive (ContentArchive): Where to record them
+        images (bool): Download and store each document's image too
+        workers (int): Number of threads
+        counts (Counter, optional): Incremented for "blobs" written, "reused"
+            blobs, "bytes" written and "images" that couldn't be downloaded
+
+    Returns:
+        int: The number of documents archived
+    """
+    counts = Counter() if counts is None else counts
+    counts_lock = threading.Lock()
+    session = requests.Session() if images else None
+    if session is not None:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+    def store(data: Optional[bytes]) -> Optional[str]:
+        if not data:
+            return None
+        digest, written = archive.blobs.put(data)
+        with counts_lock:
+            if written:
+                counts["blobs"] += 1
+                counts["bytes"] += written
+            else:
+                counts["reused"] += 1
+        return digest
+
+    def archive_one(doc: DocumentInfo) -> ArchivedDocument:
+        digests = {
+            column: store((getattr(doc, field) or "").encode("utf-8"))
+            for column, field in BODY_FIELDS.items()
+        }
+        image = None
+        if session is not None and doc.image_url:
+            data = _fetch_image(session, str(doc.image_url))
+            if data is None:
+                with counts_lock:
+                    counts["images"] += 1
+            image = store(data)
+
+        return ArchivedDocument(
+            id=doc.id,
+            title=doc.title,
+            url=str(doc.url),
+            updated_at=doc.updated_at.isoformat() if doc.updated_at else None,
+            archived_at=datetime.now().isoformat(),
+            image=image,
+            **digests,
+        )
+
+    archived = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future] = deque()
+        for doc in documents:
+            if len(pending) >= workers * 2:  # bound the documents held in memory
+                archive.record(pending.popleft().result())
+                archived += 1
+            pending.append(executor.submit(archive_one, doc))
+
+        while pending:
+            archive.record(pending.popleft().result())
+            archived += 1
+
+    archive.commit()
+    return archived
@@ -0,0 +1,228 @@
+"""Provides code to read and write the compact, compressed document caches."""
+
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+
+CACHE_FORMAT_VERSION = 2
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Stored once per unique value, however many entries share the document
+BODY_FIELDS = ("content", "html_content", "summary", "image_url")
+
+
+def body_digest(body: str) -> str:
+    return hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def encode_documents(documents: List[dict], bodies: Dict[str, str]) -> dict:
+    """Encode a cached result set as a field list plus one row per document.
+
+    Body fields are replaced by the digest of their value, which is added to
+    `bodies`. The trailing `{"time": ...}` entry is kept as the entry's time.
+    """
+    time = None
+    if documents and documents[-1].keys() == {"time"}:
+        time = documents[-1]["time"]
+        documents = documents[:-1]
+
+    fields = list(dict.fromkeys(key for doc in documents for key in doc))
+
+    rows = []
+    for doc in documents:
+        row = []
+        for field in fields:
+            value = doc.get(field)
+            if field in BODY_FIELDS and isinstance(value, str) and value:
+                digest = body_digest(value)
+                bodies.setdefault(digest, value)
+                value = digest
+            row.append(value)
+        rows.append(row)
+
+    return {"fields": fields, "rows": rows, "time": time}
+
+
+def decode_documents(entry: dict, bodies: Dict[str, str]) -> List[dict]:
+    """Rebuild the documents, and trailing time entry, of an encoded result set"""
+    fields = entry["fields"]
+    body_columns = [i for i, field in enumerate(fields) if field in BODY_FIELDS]
+
+    documents = []
+    for row in entry["rows"]:
+        for i in body_columns:
+            if row[i]:
+                row[i] = bodies[row[i]]
+        documents.append(dict(zip(fields, row)))
+
+    if entry.get("time"):
+        documents.append({"time": entry["time"]})
+    return documents
+
+
+def _load_payload(path) -> Optional[dict]:
+    """Load a cache file, converting caches written as indented JSON"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    if not raw.startswith(GZIP_MAGIC):  # legacy format
+        bodies: Dict[str, str] = {}
+        return {
+            "bodies": bodies,
+            "entries": {
+                key: encode_documents(documents, bodies)
+                for key, documents in json.loads(raw).items()
+            },
+        }
+
+    return json.loads(gzip.decompress(raw))
+
+
+def read_cache(path) -> Dict[str, List[dict]]:
+    """Read a cache file into `{key: [documents..., {"time": ...}]}`.
+
+    Caches written before the compact format (indented JSON) are still read.
+    """
+    payload = _load_payload(path)
+    if payload is None:
+        return {}
+
+    bodies = payload["bodies"]
+    return {
+        key: decode_documents(entry, bodies)
+        for key, entry in payload["entries"].items()
+    }
+
+
+def read_cache_entry(path, key: str) -> Optional[List[dict]]:
+    """Read a single result set, without decoding the cache's other entries"""
+    payload = _load_payload(path)
+    if payload is None or key not in payload["entries"]:
+        return None
+
+    return decode_documents(payload["entries"][key], payload["bodies"])
+
+
+def read_cache_keys(path) -> List[str]:
+    """Keys of a cache's result sets, in the order they were first written"""
+    payload = _load_payload(path)
+    return list(payload["entries"]) if payload else []
+
+
+def _write_payload(path, payload: dict) -> None:
+    """Compress and atomically replace a cache file.
+
+    Bodies no longer referenced by any entry are dropped, and a reader never
+    sees a partial write.
+    """
+    bodies = payload["bodies"]
+    referenced = {}
+    for entry in payload["entries"].values():
+        body_columns = [
+            i for i, field in enumerate(entry["fields"]) if field in BODY_FIELDS
+        ]
+        for row in entry["rows"]:
+            for i in body_columns:
+                if row[i]:
+                    referenced[row[i]] = bodies[row[i]]
+
+    payload = {
+        "version": CACHE_FORMAT_VERSION,
+        "bodies": referenced,
+        "entries": payload["entries"],
+    }
+
+    data = gzip.compress(
+        json.dumps(payload, separators=(",", ":")).encode("utf-8"), compresslevel=1
+    )
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_cache(path, result_dict: Dict[str, List[dict]]) -> None:
+    """Write a cache file in the compact format"""
+    bodies: Dict[str, str] = {}
+    entries = {
+        key: encode_documents(documents, bodies)
+        for key, documents in result_dict.items()
+    }
+    _write_payload(path, {"bodies": bodies, "entries": entries})
+
+
+def update_cache(path, key: str, documents: List[dict]) -> None:
+    """Store `documents` under `key`, keeping the cache's other entries as is"""
+    payload = _load_payload(path) or {"bodies": {}, "entries": {}}
+    payload["entries"][key] = encode_documents(documents, payload["bodies"])
+    _write_payload(path, payload)
+
+
+def write_cache_stream(path, documents: Iterable[dict], time: str) -> int:
+    """Write a result set one document at a time, never holding all of it.
+
+    The file is gzip-compressed JSON lines, headed by a `{"time": ...}` line,
+    and atomically replaces `path` once every document is written.
+
+    Returns:
+        int: The number of documents written
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+
+    count = 0
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=1) as f:
+            f.write(json.dumps({"time": time}) + "\n")
+            for document in documents:
+                f.write(json.dumps(document, separators=(",", ":")) + "\n")
+                count += 1
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_cache_stream_time(path) -> Optional[str]:
+    """Read the time of a result set written by `write_cache_stream`"""
+    if not os.path.exists(path):
+        return None
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.loads(f.readline()).get("time")
+
+
+def read_cache_stream(path) -> Iterator[dict]:
+    """Yield the documents of a result set written by `write_cache_stream`"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        f.readline()  # time
+        for line in f:
+            yield json.loads(line)
+
+
+def read_cache_stream_rows(path, rows: Iterable[int]) -> Iterator[dict]:
+    """Yield the documents at sorted `rows` of a result set, parsing only those"""
+    rows = iter(rows)
+    row = next(rows, None)
+    if row is None:
+        return
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        f.readline()  # time
+        for position, line in enumerate(f):
+            if position == row:
+                yield json.loads(line)
+                # Skip repeated rows, rather than never matching again
+                while row is not None and row <= position:
+                    row = next(rows, None)
+                if row is None:
+                    return
@@ -0,0 +1,468 @@
+"""Provides a client to use a Reader account from Python, without the command line."""
+
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from pydantic import ValidationError
+from requests import Response
+
+from .api import (
+    RATE_LIMITS,
+    STATUS_ACTIONS,
+    doc_info_jsonify,
+    listing_key,
+    paginate,
+    query_pages,
+    send_with_retries,
+)
+from .constants import (
+    BASE_URL,
+    CREATE_ENDPOINT,
+    LIST_ENDPOINT,
+    LIST_PAGE_LIMIT,
+    MAX_WORKERS,
+    UPDATE_ENDPOINT,
+)
+from .data import (
+    library_index,
+    library_snapshot_dates,
+    query_library,
+    sync_library,
+    sync_lock_path,
+)
+from .lock import FileLock
+from .memo import QueryMemo
+from .models import DocumentInfo
+from .profiles import get_profile, get_token, token_variable, use_profile
+from .query import DocumentQuery
+from .scheduler import Job, Priority, RateLimiter
+from .store import LibraryIndex
+from .transport import HTTPTransport, Transport, decode_json
+
+# Nothing is printed unless the embedding application configures logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+T = TypeVar("T")
+
+
+class ReaderError(Exception):
+    """A request Reader refused, or a local library that isn't there yet.
+
+    Args:
+        message (str): What went wrong
+        status_code (int, optional): The status code of Reader's response
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SaveResult(NamedTuple):
+    """A saved document, and whether it was already in the library."""
+
+    id: str
+    url: str
+    created: bool
+
+
+def _completed(
+    function: Callable[[T], Any], items: Iterable[T], workers: int, job: Job
+) -> Iterator[Tuple[T, Future]]:
+    """Call `function` on each item as part of `job`, from a pool of threads.
+
+    Items are consumed lazily, with a bounded number in flight, and yielded
+    with their future as they complete. The job is cancelled if iteration
+    stops early, so requests still queued aren't sent.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: Dict[Future, T] = {}
+        try:
+            for item in items:
+                if len(pending) >= workers * 2:  # bound the items held in memory
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future
+                pending[executor.submit(job.run, function, item)] = item
+
+            for future in as_completed([*pending]):
+                yield pending.pop(future), future
+        except BaseException:
+            job.cancel()
+            raise
+
+
+class Reader:
+    """Typed access to a Reader account and its synced library.
+
+    Nothing is written to the terminal: responses Reader refuses raise a
+    `ReaderError`, and throttled requests are sent again after waiting, as the
+    commands do. Listings are lazy, pages are fetched as they're iterated.
+
+    Args:
+        token (str, optional): The account's access token. Default: the profile's
+        profile (str, optional): The profile whose token and local library are
+            used. Default: the current profile
+        transport (Transport, optional): Where requests are sent, e.g. a
+            `LocalTransport`. Default: a new `HTTPTransport`
+        memo (QueryMemo, optional): Shares identical listings between callers.
+            Default: listings aren't shared
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        profile: Optional[str] = None,
+        transport: Optional[Transport] = None,
+        memo: Optional[QueryMemo] = None,
+    ):
+        self.profile = profile or get_profile()
+        self.token = token or get_token(self.profile)
+        if not self.token:
+            raise ReaderError(
+                f"No token given, and {token_variable(self.profile)} isn't set"
+            )
+        self.transport = transport or HTTPTransport()
+        self.memo = memo
+        # Each client has its own budget, share a client to share one. Requests
+        # are scheduled by the priority of the current thread's `Job`.
+        self._rate_limiters = {
+            endpoint: RateLimiter(rate) for endpoint, rate in RATE_LIMITS.items()
+        }
+
+    def _request(self, method: str, path: str, **kwargs) -> Response:
+        return self.transport.request(
+            method,
+            url=f"{BASE_URL}{path}",
+            headers={"Authorization": f"Token {self.token}"},
+            **kwargs,
+        )
+
+    @staticmethod
+    def _raise_status(handling_code: str, retry_after: int, resp: Response) -> None:
+        if handling_code == "retry":
+            logger.info(STATUS_ACTIONS[handling_code].format(retry_after))
+            return
+        msg = STATUS_ACTIONS.get(handling_code, STATUS_ACTIONS["unknown"])
+        raise ReaderError(msg, resp.status_code)
+
+    def _pages(
+        self, query: DocumentQuery, counts: Optional[Counter] = None
+    ) -> Iterator[List[dict]]:
+        limiter = self._rate_limiters[LIST_ENDPOINT]
+
+        def get_list(params: Dict) -> Response:
+            limiter.wait()
+            return self._request("GET", LIST_ENDPOINT, params=params)
+
+        return paginate(
+            get_list,
+            query.parameters(),
+            counts=counts,
+            on_status=self._raise_status,
+            backoff=limiter.pause,
+        )
+
+    def _write(self, endpoint: str, request: Callable[[], Response]) -> Response:
+        limiter = self._rate_limiters[endpoint]
+
+        def limited() -> Response:
+            limiter.wait()
+            return request()
+
+        resp = send_with_retries(limited, self._raise_status, backoff=limiter.pause)
+        if self.memo is not None:  # listings may have changed
+            self.memo.clear()
+        return resp
+
+    def documents(
+        self,
+        query: Optional[DocumentQuery] = None,
+        counts: Optional[Counter] = None,
+        **filters,
+    ) -> Iterator[DocumentInfo]:
+        """Documents in Reader matching a query, fetched as they're iterated.
+
+        Args:
+            query (DocumentQuery, optional): Filters, limit and projection
+            counts (Counter, optional): Incremented for fetched "pages" and "retries"
+            **filters: `DocumentQuery` arguments, used when no query is given,
+                e.g. `category="article", tags=["ai"]`
+
+        Raises:
+            ReaderError: If Reader refuses a page, while iterating
+        """
+        query = query or DocumentQuery(**filters)
+        if self.memo is None:
+            return query_pages(query, self._pages(query, counts))
+
+        key = listing_key(query.parameters(), self.token, self.transport)
+        return query_pages(
+            query, self.memo.pages(key, lambda: self._pages(query, counts))
+        )
+
+    def document(self, document_id: str) -> Optional[DocumentInfo]:
+        """A document in Reader by its id, or None if there's no such document"""
+        return next(self.documents(id=document_id), None)
+
+    def save(self, document: Union[str, DocumentInfo], **fields) -> SaveResult:
+        """Save a document to the library.
+
+        Args:
+            document (str | DocumentInfo): The document, or its URL
+            **fields: `DocumentInfo` fields of a document given by URL, e.g. `tags`
+
+        Raises:
+            ReaderError: If the document isn't valid, or Reader refuses it
+        """
+        if not isinstance(document, DocumentInfo):
+            try:
+                document = DocumentInfo(url=document, **fields)
+            except ValidationError as e:
+                raise ReaderError(f"Invalid document: {document}") from e
+
+        info = doc_info_jsonify(doc_info=document)
+        resp = self._write(
+            CREATE_ENDPOINT, lambda: self._request("POST", CREATE_ENDPOINT, json=info)
+        )
+        saved = decode_json(resp.content)
+        return SaveResult(
+            id=saved.get("id"),
+            url=saved.get("url", str(document.url)),
+            created=resp.status_code == 201,
+        )
+
+    def update(self, document_id: str, **fields) -> None:
+        """Update a document's fields, e.g. `location="archive"` or `tags=[...]`
+
+        Raises:
+            ReaderError: If Reader refuses the update
+        """
+        path = f"{UPDATE_ENDPOINT}/{document_id}/"
+        self._write(UPDATE_ENDPOINT, lambda: self._request("PATCH", path, json=fields))
+
+    def save_many(
+        self,
+        documents: Iterable[Union[str, DocumentInfo]],
+        workers: int = MAX_WORKERS,
+        failed: Optional[List[Tuple[Any, ReaderError]]] = None,
+        job: Optional[Job] = None,
+    ) -> Iterator[SaveResult]:
+        """Save documents concurrently, yielding each result as it completes.
+
+        Documents are consumed lazily by a pool of `workers` threads, which
+        share the client's rate limit.
+
+        Args:
+            documents (Iterable): Documents, or their URLs
+            workers (int): Number of concurrent requests
+            failed (List, optional): Documents that couldn't be saved are
+                appended with their error. Default: the first error is raised
+            job (Job, optional): The job saving them. Default: a new bulk job
+        """
+        job = job or Job(Priority.BULK, "upload")
+        for document, future in _completed(self.save, documents, workers, job):
+            try:
+                yield future.result()
+            except ReaderError as e:
+                if failed is None:
+                    raise
+                failed.append((document, e))
+
+    def update_many(
+        self,
+        updates: Iterable[Tuple[str, Dict]],
+        workers: int = MAX_WORKERS,
+        failed: Optional[List[Tuple[Any, ReaderError]]] = None,
+        job: Optional[Job] = None,
+    ) -> Iterator[str]:
+        """Send `(document_id, fields)` updates concurrently.
+
+        Args:
+            updates (Iterable[tuple]): One PATCH each, consumed lazily
+            workers (int): Number of concurrent requests
+            failed (List, optional): Updates that were refused are appended
+                with their error. Default: the first error is raised
+            job (Job, optional): The job sending them. Default: a new bulk job
+
+        Yields:
+            str: The id of each updated document, as its update completes
+        """
+
+        def update(item: Tuple[str, Dict]) -> str:
+            self.update(item[0], **item[1])
+            return item[0]
+
+        job = job or Job(Priority.BULK, "update")
+        for item, future in _completed(update, updates, workers, job):
+            try:
+                yield future.result()
+            except ReaderError as e:
+                if failed is None:
+                    raise
+                failed.append((item, e))
+
+    def _sync_documents(
+        self, updated_after=None, counts=None, memoize=False, debug=False
+    ) -> Iterator[DocumentInfo]:
+        # Syncs always ask Reader, a shared listing could predate the sync
+        query = DocumentQuery(updated_after=updated_after)
+        return query_pages(query, self._pages(query, counts))
+
+    def sync(self, full: bool = False) -> Dict:
+        """Sync the profile's local library, only fetching what changed if it can.
+
+        Pages are fetched as a sync job, after requests of interactive ones.
+
+        Returns:
+            Dict: The stats of the sync
+        """
+        job = Job(Priority.SYNC, "sync")
+        with use_profile(self.profile), FileLock(sync_lock_path()):
+            # Not recorded as scheduled, which would keep the CLI's `list` offline
+            return job.run(sync_library, full=full, fetch=self._sync_documents)
+
+    def library(
+        self, query: Optional[DocumentQuery] = None, **filters
+    ) -> Iterator[DocumentInfo]:
+        """Documents in the synced library matching a query, without requests.
+
+        Tag queries are served through the library's index.
+
+        Args:
+            query (DocumentQuery, optional): Filters, limit and projection
+            **filters: `DocumentQuery` arguments, used when no query is given
+
+        Raises:
+            ReaderError: If the library was never synced
+        """
+        query = query or DocumentQuery(**filters)
+        with use_profile(self.profile):
+            documents = query_library(query)
+            if documents is None and library_snapshot_dates():
+                self.index()  # built from another sync
+                documents = query_library(query)
+        if documents is None:
+            raise ReaderError("The library isn't synced yet, call sync() first")
+
+        return (
+            DocumentInfo.model_validate(query.project(doc_info))
+            for doc_info in documents
+        )
+
+    def index(self) -> LibraryIndex:
+        """The index of the synced library's tags, highlights and activity.
+
+        Raises:
+            ReaderError: If the library was never synced
+        """
+        with use_profile(self.profile):
+            dates = library_snapshot_dates()
+            if not dates:
+                raise ReaderError("The library isn't synced yet, call sync() first")
+            return library_index(dates[-1])
+
+
+async def _aiter(iterator: Iterator[T], batch: int = 1) -> AsyncIterator[T]:
+    """Advance a blocking iterator in a thread, `batch` items at a time"""
+    try:
+        while True:
+            items = await asyncio.to_thread(lambda: [*islice(iterator, batch)])
+            if not items:
+                return
+            for item in items:
+                yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:  # e.g. stops a batch's pool
+            await asyncio.to_thread(close)
+
+
+class AsyncReader:
+    """The `Reader` client, for asyncio applications.
+
+    Requests are sent from threads so the event loop isn't blocked, and
+    listings are async iterators fetched a page at a time.
+
+    Takes the arguments of `Reader`, or wraps an existing client with `reader`.
+    """
+
+    def __init__(self, *args, reader: Optional[Reader] = None, **kwargs):
+        self.reader = reader or Reader(*args, **kwargs)
+
+    def documents(
+        self,
+        query: Optional[DocumentQuery] = None,
+        counts: Optional[Counter] = None,
+        **filters,
+    ) -> AsyncIterator[DocumentInfo]:
+        """See `Reader.documents`"""
+        documents = self.reader.documents(query, counts, **filters)
+        return _aiter(documents, batch=LIST_PAGE_LIMIT)
+
+    async def document(self, document_id: str) -> Optional[DocumentInfo]:
+        return await asyncio.to_thread(self.reader.document, document_id)
+
+    async def save(self, document: Union[str, DocumentInfo], **fields) -> SaveResult:
+        return await asyncio.to_thread(self.reader.save, document, **fields)
+
+    async def update(self, document_id: str, **fields) -> None:
+        await asyncio.to_thread(self.reader.update, document_id, **fields)
+
+    def save_many(
+        self,
+        documents: Iterable[Union[str, DocumentInfo]],
+        workers: int = MAX_WORKERS,
+        failed: Optional[List[Tuple[Any, ReaderError]]] = None,
+        job: Optional[Job] = None,
+    ) -> AsyncIterator[SaveResult]:
+        """See `Reader.save_many`, `documents` is consumed from a thread"""
+        return _aiter(self.reader.save_many(documents, workers, failed, job))
+
+    def update_many(
+        self,
+        updates: Iterable[Tuple[str, Dict]],
+        workers: int = MAX_WORKERS,
+        failed: Optional[List[Tuple[Any, ReaderError]]] = None,
+        job: Optional[Job] = None,
+    ) -> AsyncIterator[str]:
+        """See `Reader.update_many`, `updates` is consumed from a thread"""
+        return _aiter(self.reader.update_many(updates, workers, failed, job))
+
+    async def sync(self, full: bool = False) -> Dict:
+        return await asyncio.to_thread(self.reader.sync, full)
+
+    async def library(
+        self, query: Optional[DocumentQuery] = None, **filters
+    ) -> AsyncIterator[DocumentInfo]:
+        """See `Reader.library`"""
+        documents = await asyncio.to_thread(self.reader.library, query, **filters)
+        async for document in _aiter(documents, batch=LIST_PAGE_LIMIT):
+            yield document
+
+    async def index(self) -> LibraryIndex:
+        return await asyncio.to_thread(self.reader.index)
@@ -2,31 +2,146 @@
 
 import json
 import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import chain
+from typing import Dict, Iterator, List
 
 import click
 from click import secho
-from xdg_base_dirs import xdg_data_home
 
-from .api import add_document, list_documents, update_document, validate_token
-from .constants import VALID_CATEGORY_OPTIONS, VALID_LOCATION_OPTIONS
-from .data import fetch_full_library
-from .layout import print_results, print_view_results
+from .api import (
+    RATE_LIMITS,
+    add_document,
+    get_transport,
+    iter_documents,
+    iter_query,
+    set_transport,
+    update_document,
+    validate_token,
+)
+from .archive import ContentArchive, archive_documents
+from .cache import read_cache_entry, update_cache
+from .constants import (
+    MAX_WORKERS,
+    UPDATE_ENDPOINT,
+    VALID_CATEGORY_OPTIONS,
+    VALID_LOCATION_OPTIONS,
+    WATCH_INTERVAL,
+    WATCH_MAX_INTERVAL,
+    WATCH_MIN_INTERVAL,
+)
+from .data import (
+    fetch_library_index,
+    fetch_library_snapshot,
+    iter_library,
+    iter_profile_libraries,
+    iter_tagged_library,
+    library_snapshot_dates,
+    library_time,
+    query_library,
+    read_sync_stats,
+    refresh_library,
+    run_sync,
+    update_library,
+)
+from .diff import CHANGE_FIELDS, STATE_FIELDS, diff_library, index_states, summarize
+from .display import with_display_fields
+from .export import (
+    EXPORT_FORMATS,
+    export_documents,
+    export_stats,
+    project,
+    resolve_fields,
+    write_rows,
+)
+from .layout import (
+    browse_layout,
+    layout_fields,
+    print_activity_results,
+    print_changes,
+    print_plan,
+    print_progress_results,
+    print_results,
+    print_series_results,
+    print_stream_results,
+    print_view_results,
+)
 from .models import DocumentInfo
-from .reading_list import build_reading_list
+from .plan import (
+    PLAN_ACTIONS,
+    estimate_duration,
+    format_duration,
+    library_by_id,
+    library_by_url,
+    plan_saves,
+    plan_updates,
+    summarize_plan,
+)
+from .profiles import cache_dir, get_profile, list_profiles, use_profile
+from .query import DocumentQuery
+from .reading_list import (
+    TitleCache,
+    enrich_reading_list,
+    iter_reading_list,
+    write_rejects,
+)
+from .retag import plan_retag, stored_tags
+from .scheduler import Job, Priority, use_job
+from .snapshot import LibrarySnapshot, require_pyarrow, snapshot_available
+from .store import (
+    CHILD_CATEGORIES,
+    INDEX_VERSION,
+    ROLLUP_PERIODS,
+    load_index,
+    with_highlight_counts,
+)
+from .transport import HTTPTransport, LocalTransport
 from .utils import (
     batch_add_documents,
+    batch_update_documents,
     convert_date_range,
     count_category_values,
     count_location_values,
-    count_tag_values,
+    count_snapshot_values,
+    documents_from_urls,
 )
+from .watch import watch_library
 
 DEFAULT_CATEGORY_NAME = "all"
 
-CACHE_DIR = xdg_data_home() / "reader"
-CACHED_RESULT_PATH = CACHE_DIR / "library.json"
 CACHE_EXPIRATION = 1  # Minutes
+CACHE_REVALIDATE_LIMIT = 24 * 60  # Minutes, older entries are fetched in full
+REVALIDATE_OVERLAP = timedelta(minutes=1)  # Guards against clock skew
+SYNC_EXPIRATION = (
+    60  # Minutes `list` reads a library synced by `sync` instead of the API
+)
+
+HIGHLIGHT_FIELDS = ("id", "parent_id", "category", "content", "notes", "tags", "url")
+
+LIVE_LIBRARY = "live"
+
+ACTIVITY_FIELDS = ["period", "saved", "archived", "words_read"]
+PROGRESS_FIELDS = ["category", "average_progress"]
+
+SERIES_VIEWS = {  # view: (title, value column)
+    "weekly": ("Documents Saved per Week", "Saved"),
+    "progress": ("Reading Progress by Week", "Avg. Progress"),
+}
+# Views computed from the columnar snapshot only
+ARROW_VIEWS = (*SERIES_VIEWS, "sites")
+
+
+def complete_tags(ctx, param, incomplete):
+    """Suggest the synced library's tags, most used first"""
+
+    profile = ctx.find_root().params.get("profile") or get_profile()
+    with use_profile(profile):
+        index = load_index()
+        if index is None or index.version != INDEX_VERSION:
+            return []
+        return index.tag_names(incomplete)
 
 
 @click.command(help="List Documents")
@@ -61,6 +176,28 @@ CACHE_EXPIRATION = 1  # Minutes
     type=click.Choice(["table", "list"], case_sensitive=True),
     help="Display documents either as a list or table. Default: table.",
 )
+@click.option(
+    "--tag",
+    "-t",
+    "tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Only documents with this tag. Repeat to require several tags.",
+)
+@click.option(
+    "--any-tag",
+    "any_tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Only documents with at least one of these tags. Can be repeated.",
+)
+@click.option(
+    "--not-tag",
+    "exclude_tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Leave out documents with this tag. Can be repeated.",
+)
 @click.option(
     "--num-results",
     "-n",
@@ -68,6 +205,47 @@ CACHE_EXPIRATION = 1  # Minutes
     help="The number of documents to show.",
 )
 @click.option("--pager", "-P", is_flag=True, default=False, help="Use to page output.")
+@click.option(
+    "--stale-while-revalidate",
+    "stale_while_revalidate",
+    is_flag=True,
+    default=False,
+    help="Show expired cached results right away, then fetch what changed since.",
+)
+@click.option(
+    "--stream",
+    "-S",
+    is_flag=True,
+    default=False,
+    help="Print documents in chunks as they are fetched.",
+)
+@click.option(
+    "--browse",
+    "-B",
+    is_flag=True,
+    default=False,
+    help="Browse documents in an interactive, scrollable table.",
+)
+@click.option(
+    "--format",
+    "-F",
+    "file_format",
+    type=click.Choice(EXPORT_FORMATS, case_sensitive=True),
+    help="Write documents in a machine-readable format instead of a layout.",
+)
+@click.option(
+    "--fields",
+    "-f",
+    multiple=True,
+    help="Field(s) to include with --format. Default: all but content, summary and notes.",
+)
+@click.option(
+    "--watch",
+    "-W",
+    is_flag=True,
+    default=False,
+    help="Keep polling, and print documents as they're saved or change.",
+)
 @click.option("--debug", is_flag=True, default=False, hidden=True)
 @click.option(  # Don't hit Reader API
     "--no-api",
@@ -82,74 +260,400 @@ def list(
     date_range,
     layout,
     num_results,
+    tags=(),
+    any_tags=(),
+    exclude_tags=(),
     pager=False,
+    stale_while_revalidate=False,
+    stream=False,
+    browse=False,
+    file_format=None,
+    fields=(),
+    watch=False,
     debug=False,
     no_api=False,
 ):
     if date_range:
         update_after = convert_date_range(date_range=date_range)
 
+    if watch:  # the changes since `update_after`, then each one as it's polled
+        excluded = () if category in CHILD_CATEGORIES else CHILD_CATEGORIES
+        query = DocumentQuery(
+            category=category,
+            location=location,
+            tags=tags,
+            any_tags=any_tags,
+            exclude_tags=exclude_tags,
+            fields=(),
+            exclude_categories=excluded,
+        )
+        follow_changes(
+            query,
+            since=update_after,
+            file_format=file_format,
+            fields=fields,
+            debug=debug,
+        )
+        return
+
     update_after_str = update_after.strftime("%Y-%m-%d") if update_after else "all"
 
-    options_key = f"{location}_{(DEFAULT_CATEGORY_NAME if not category else category)}_{update_after_str}"
+    # Fetch only what will be shown: exports keep their fields, layouts skip
+    # content unless they show highlights, and drop highlights otherwise
+    if file_format:
+        projection, excluded = resolve_fields(fields), ()
+    elif category in CHILD_CATEGORIES:
+        projection, excluded = layout_fields(category), ()
+    else:
+        projection, excluded = layout_fields(category), CHILD_CATEGORIES
+
+    query = DocumentQuery(
+        category=category,
+        location=location,
+        updated_after=update_after,
+        tags=tags,
+        any_tags=any_tags,
+        exclude_tags=exclude_tags,
+        limit=max(1, num_results) if num_results else None,
+        fields=projection,
+        exclude_categories=excluded,
+    )
+
+    options_key = f"{location}_{(DEFAULT_CATEGORY_NAME if not category else category)}_{update_after_str}{query.variant}"
 
-    if no_api:  # check options_key
-        click.echo(options_key)
+    if not no_api and isinstance(get_transport(), HTTPTransport):
+        no_api = recently_synced()  # a scheduled sync keeps list offline
+
+    if no_api:  # serve the request from the last synced library
+        if debug:
+            click.echo(options_key)
+        try:
+            set_transport(LocalTransport.from_cache())
+        except FileNotFoundError as e:
+            raise click.ClickException(str(e))
+
+    def fetch() -> Iterator[DocumentInfo]:
+        if no_api and query.tag_filtered:  # read only the tagged documents
+            documents = iter_tagged_library(query, debug=debug)
+            if documents is not None:
+                return documents
+        return iter_query(query, debug=debug)
 
     tmp_docs = None
+    revalidate = False
 
-    if os.path.exists(CACHED_RESULT_PATH):
-        with open(CACHED_RESULT_PATH, "r") as f:
-            json_file = json.load(f)
-            result = json_file.get(options_key)
-            if result:
-                t = result[-1].get("time")
-                time = datetime.strptime(t, "%Y-%m-%d %H:%M:%S.%f")
-                diff = datetime.now() - time
-                if diff < timedelta(minutes=CACHE_EXPIRATION):
+    if os.path.exists(result_cache_path()):
+        result = read_cache_entry(result_cache_path(), options_key)
+        if result:
+            t = result[-1].get("time")
+            time = datetime.strptime(t, "%Y-%m-%d %H:%M:%S.%f")
+            diff = datetime.now() - time
+            if diff < timedelta(minutes=CACHE_EXPIRATION):
+                if debug:
+                    print("Using cache")
+                tmp_docs = result
+            elif diff < timedelta(minutes=CACHE_REVALIDATE_LIMIT):
+                if stale_while_revalidate:
                     if debug:
-                        print("Using cache")
+                        print("Using stale cache")
                     tmp_docs = result
+                    revalidate = True
+                else:
+                    tmp_docs = revalidate_results(
+                        options_key, result, query, debug=debug
+                    )
 
-    if not tmp_docs:  # If cache expired or results not yet cached
-        if no_api:
-            return
+    if not tmp_docs and (stream or file_format) and not browse:
+        fetched = []
 
-        tmp_docs = list_documents(
-            category=category,
-            location=location,
-            updated_after=update_after,
-            debug=debug,
-        )
+        def fetch_and_collect():
+            for doc in fetch():
+                doc_json = serialize_result(doc, query)
+                fetched.append(doc_json)
+                yield doc_json
 
-        if len(tmp_docs) == 0:  # if list of documents is empty
-            return
+        docs = with_highlight_counts(fetch_and_collect(), load_index())
 
-        else:  # Cache documents
-            tmp_docs = [doc.model_dump(mode="json") for doc in tmp_docs]
+        if file_format:
+            export_documents(docs, file_format=file_format, fields=fields)
+        else:
+            print_stream_results(docs, layout=layout, category=category)
 
-            tmp_docs.append({"time": str(datetime.now())})
-            os.makedirs(CACHE_DIR, exist_ok=True)
+        if fetched and not query.limit:  # only cache a complete result set
+            fetched.append({"time": str(datetime.now())})
+            cache_results(options_key, fetched)
+        return
 
-            with open(CACHED_RESULT_PATH, "a+") as f:
-                if os.path.getsize(CACHED_RESULT_PATH) == 0:  # file is empty
-                    result_dict = {options_key: tmp_docs}
-                    f.write(json.dumps(result_dict, indent=4))
-                else:
-                    f.seek(0)
-                    result_dict = json.load(f)
-                    result_dict[options_key] = tmp_docs
-                    f.truncate(0)
-                    f.write(json.dumps(result_dict, indent=4))
+    if not tmp_docs:  # If cache expired or results not yet cached
+        tmp_docs = [serialize_result(doc, query) for doc in fetch()]
+
+        if len(tmp_docs) == 0:  # if list of documents is empty
+            return
+
+        tmp_docs.append({"time": str(datetime.now())})
+        if not query.limit:  # only cache a complete result set
+            cache_results(options_key, tmp_docs)
 
     if num_results:
-        docs = tmp_docs[
+        docs = tmp_docs[:-1][
             0 : max(1, num_results)
         ]  # Prevent removing all documents from the list
     else:
         docs = tmp_docs[:-1]  # Slice off the time key before passing to layout
 
-    print_results(docs, page=pager, layout=layout, category=category)
+    docs = [doc for doc in with_highlight_counts(docs, load_index())]
+
+    if file_format:
+        export_documents(docs, file_format=file_format, fields=fields)
+    elif browse:
+        browse_layout(docs, category=category)
+    elif stream:
+        print_stream_results(docs, layout=layout, category=category)
+    else:
+        print_results(docs, page=pager, layout=layout, category=category)
+
+    if revalidate:  # refresh after the stale results are shown
+        revalidate_results(options_key, tmp_docs, query, debug=debug)
+
+
+def profiles_option(all_profiles: bool) -> List[str]:
+    """The profiles a command runs for: every configured one, or the current one"""
+
+    if not all_profiles:
+        return [get_profile()]
+
+    profiles = list_profiles()
+    if not profiles:
+        raise click.ClickException(
+            "No profiles found. Set READER_API_TOKEN_<NAME> for each account."
+        )
+    return profiles
+
+
+def result_cache_path():
+    return cache_dir() / "library.json"
+
+
+def cache_results(options_key: str, documents: List[dict]) -> None:
+    """Store a result set, with its trailing time entry, under `options_key`"""
+
+    update_cache(result_cache_path(), options_key, documents)
+
+
+def recently_synced() -> bool:
+    """Whether `rw-cli sync` refreshed the library within `SYNC_EXPIRATION`"""
+
+    stats = read_sync_stats()
+    if not stats or not stats.get("scheduled"):
+        return False
+
+    finished = datetime.strptime(stats["finished"], "%Y-%m-%d %H:%M:%S.%f")
+    return datetime.now() - finished < timedelta(minutes=SYNC_EXPIRATION)
+
+
+def serialize_result(doc: DocumentInfo, query: DocumentQuery) -> dict:
+    """Serialize a fetched document, keeping only the fields `query` projects"""
+
+    return with_display_fields(doc.model_dump(mode="json", include=query.fields))
+
+
+def revalidate_results(
+    options_key: str, cached: List[dict], query: DocumentQuery, debug=False
+) -> List[dict]:
+    """Merge documents changed since a result set was cached, and re-cache it.
+
+    Only documents updated after the cache time are fetched, without the
+    query's filters, so documents that moved out of the result set are
+    dropped as well. Deleted documents aren't reported by the API,
+    which is why entries older than `CACHE_REVALIDATE_LIMIT` are fetched in full.
+    """
+
+    cache_time = datetime.strptime(
+        cached[-1]["time"], "%Y-%m-%d %H:%M:%S.%f"
+    ).astimezone()  # cache times are local, the API reads naive times as UTC
+    refreshed_at = datetime.now()
+
+    changed = {}
+    for doc in iter_query(
+        query.unfiltered(cache_time - REVALIDATE_OVERLAP), debug=debug
+    ):
+        changed[doc.id] = serialize_result(doc, query)
+
+    if debug:
+        print(f"Revalidated cache: {len(changed)} changed document(s)")
+
+    documents = [doc for doc in changed.values() if query.matches(doc)]
+    documents.extend(doc for doc in cached[:-1] if doc["id"] not in changed)
+    documents.append({"time": str(refreshed_at)})
+
+    cache_results(options_key, documents)
+
+    return documents
+
+
+def follow_changes(
+    query: DocumentQuery,
+    since=None,
+    file_format=None,
+    fields=(),
+    interval=WATCH_INTERVAL,
+    max_interval=WATCH_MAX_INTERVAL,
+    debug=False,
+) -> None:
+    """Print changes to the documents of `query` as they're polled, until Ctrl-C"""
+
+    if file_format not in (None, "jsonl"):
+        raise click.BadParameter(
+            "Changes are streamed as jsonl only.", param_hint="--format"
+        )
+    export_fields = resolve_fields(fields) if file_format else ()
+    query.fields = query.fields.union(STATE_FIELDS, export_fields, ["created_at"])
+
+    # The synced library tells what changed about documents seen before
+    dates = library_snapshot_dates()
+    states = index_states(iter_library(dates[-1])) if dates else {}
+    synced = library_time(dates[-1]) if dates else None
+
+    counts = Counter()
+    changes = watch_library(
+        query,
+        since=since,
+        states=states,
+        synced=synced,
+        interval=interval,
+        max_interval=max_interval,
+        counts=counts,
+        debug=debug,
+    )
+    secho("Watching for changes, press Ctrl-C to stop.", dim=True, err=True)
+    try:
+        if file_format:
+            for change, document in changes:
+                row = {**change, **project(document, export_fields)}
+                click.echo(json.dumps(row, ensure_ascii=False))  # flushed per line
+        else:
+            print_changes(change for change, _ in changes)
+    except KeyboardInterrupt:
+        pass
+
+    errors = f", {counts['errors']} failed poll(s)" if counts["errors"] else ""
+    secho(
+        f"{summarize(counts) or 'No changes'} in {counts['polls']} poll(s){errors}.",
+        fg="bright_green",
+        err=True,
+    )
+
+
+@click.command(help="Follow changes to the library as they happen")
+@click.option(
+    "--location",
+    "-l",
+    type=click.Choice(tuple(VALID_LOCATION_OPTIONS), case_sensitive=True),
+    help="Document(s) location",
+)
+@click.option(
+    "--category",
+    "-c",
+    type=click.Choice(tuple(VALID_CATEGORY_OPTIONS), case_sensitive=True),
+    help="Document(s) category",
+)
+@click.option(
+    "--tag",
+    "-t",
+    "tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Only documents with this tag. Repeat to require several tags.",
+)
+@click.option(
+    "--any-tag",
+    "any_tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Only documents with at least one of these tags. Can be repeated.",
+)
+@click.option(
+    "--not-tag",
+    "exclude_tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Leave out documents with this tag. Can be repeated.",
+)
+@click.option(
+    "--update-after",
+    "-a",
+    default=None,
+    type=click.DateTime(),
+    help="Start with the documents updated after this date. Default: now.",
+)
+@click.option(
+    "--date-range",
+    "-d",
+    type=str,
+    help="Start with the documents updated in the last day, week or month.",
+)
+@click.option(
+    "--format",
+    "-F",
+    "file_format",
+    type=click.Choice(["jsonl"], case_sensitive=True),
+    help="Write changes as JSON lines instead of printing them.",
+)
+@click.option(
+    "--fields",
+    "-f",
+    multiple=True,
+    help="Field(s) to include with --format. Default: all but content, summary and notes.",
+)
+@click.option(
+    "--interval",
+    "-i",
+    type=click.FloatRange(min=WATCH_MIN_INTERVAL),
+    default=WATCH_INTERVAL,
+    help=f"Seconds between polls while documents change. Default: {WATCH_INTERVAL}.",
+)
+@click.option(
+    "--max-interval",
+    type=click.FloatRange(min=WATCH_MIN_INTERVAL),
+    default=WATCH_MAX_INTERVAL,
+    help=f"Seconds between polls once idle. Default: {WATCH_MAX_INTERVAL}.",
+)
+@click.option("--debug", is_flag=True, default=False, hidden=True)
+def tail(
+    location,
+    category,
+    tags,
+    any_tags,
+    exclude_tags,
+    update_after,
+    date_range,
+    file_format,
+    fields,
+    interval=WATCH_INTERVAL,
+    max_interval=WATCH_MAX_INTERVAL,
+    debug=False,
+):
+    if date_range:
+        update_after = convert_date_range(date_range=date_range)
+
+    query = DocumentQuery(
+        category=category,
+        location=location,
+        tags=tags,
+        any_tags=any_tags,
+        exclude_tags=exclude_tags,
+        fields=(),
+        exclude_categories=() if category in CHILD_CATEGORIES else CHILD_CATEGORIES,
+    )
+    follow_changes(
+        query,
+        since=update_after,
+        file_format=file_format,
+        fields=fields,
+        interval=interval,
+        max_interval=max(interval, max_interval),
+        debug=debug,
+    )
 
 
 @click.command(help="Library breakdown")
@@ -157,49 +661,645 @@ def list(
     "--view",
     "-V",
     default="category",
-    type=click.Choice(["category", "location", "tags"], case_sensitive=True),
+    type=click.Choice(
+        ["category", "location", "tags", "highlights", "weekly", "progress", "sites"],
+        case_sensitive=True,
+    ),
+    help="weekly, progress and sites need the optional pyarrow dependency.",
+)
+@click.option(
+    "--format",
+    "-F",
+    "file_format",
+    type=click.Choice(EXPORT_FORMATS, case_sensitive=True),
+    help="Write counts in a machine-readable format instead of a table.",
+)
+@click.option(
+    "--all-profiles",
+    "-A",
+    is_flag=True,
+    default=False,
+    help="Break down the libraries of every profile with a token together.",
 )
 @click.option("--debug", is_flag=True, default=False, hidden=True)
-def lib(view, debug=False):
-    full_data = fetch_full_library(debug=debug)
+def lib(view, file_format=None, all_profiles=False, debug=False):
+    if view in ARROW_VIEWS:
+        require_pyarrow()
+
+    profiles = profiles_option(all_profiles)
+
+    if view in ("highlights", "tags"):  # counted when the index was built
+        stats = Counter()
+        titles = {}
+        for profile in profiles:
+            with use_profile(profile):
+                index = fetch_library_index(debug=debug)
+                if view == "highlights":
+                    counts = index.highlight_counts()
+                    titles.update(index.titles(counts))
+                    stats.update(counts)
+                else:
+                    stats.update(index.tag_counts())
+
+        if view == "highlights":
+            stats = highlight_stats(stats, titles)
+    elif snapshot_available():
+        snapshots = []
+        for profile in profiles:
+            with use_profile(profile):
+                snapshot = fetch_library_snapshot(debug=debug)
+            if snapshot:
+                snapshots.append(snapshot)
+
+        if not snapshots:
+            print("Library is empty.")
+            return
+        snapshot = LibrarySnapshot.concat(snapshots)
+
+        if view == "weekly":
+            stats = snapshot.saved_per_week()
+        elif view == "progress":
+            stats = snapshot.progress_per_week()
+        elif view == "sites":
+            stats = snapshot.words_per_site()
+        else:
+            stats = count_snapshot_values(snapshot, view)
+    else:
+        documents = iter_profile_libraries(profiles, debug=debug)
+        first = next(documents, None)
+        if first is None:
+            print("Library is empty.")
+            return
+
+        full_data = chain([first], documents)
 
-    if full_data:
         if view == "location":
             stats = count_location_values(full_data)
-        elif view == "tags":
-            stats = count_tag_values(full_data)
         else:
             stats = count_category_values(full_data)
 
+    if file_format:
+        export_stats(stats, file_format=file_format)
+    elif view in SERIES_VIEWS:
+        title, value_name = SERIES_VIEWS[view]
+        print_series_results(stats, title=title, value_name=value_name)
+    else:
         print_view_results(stats=stats, view=view)
+
+
+def highlight_stats(counts: Dict[str, int], titles: Dict[str, str]) -> Dict[str, int]:
+    """Highlight counts by document title, telling apart documents sharing a title"""
+    repeated = Counter(titles.get(document_id) for document_id in counts)
+    stats = {}
+    for document_id, count in counts.items():
+        title = titles.get(document_id)
+        if title is None:
+            stats[document_id] = count
+        elif repeated[title] > 1:
+            stats[f"{title} ({document_id})"] = count
+        else:
+            stats[title] = count
+    return stats
+
+
+@click.command(help="Reading statistics over time")
+@click.option(
+    "--view",
+    "-V",
+    type=click.Choice(["activity", "progress"], case_sensitive=True),
+    help="Only show documents saved, archived and read per period, or the "
+    "average reading progress per category. Default: both.",
+)
+@click.option(
+    "--period",
+    "-P",
+    type=click.Choice(tuple(ROLLUP_PERIODS), case_sensitive=True),
+    default="week",
+    help="Length of the periods activity is counted over. Default: week.",
+)
+@click.option(
+    "--since",
+    "-s",
+    type=click.DateTime(),
+    help="Leave out activity before this date, in ISO format.",
+)
+@click.option(
+    "--category",
+    "-c",
+    type=click.Choice(tuple(VALID_CATEGORY_OPTIONS), case_sensitive=True),
+    help="Only documents of this category",
+)
+@click.option(
+    "--format",
+    "-F",
+    "file_format",
+    type=click.Choice(EXPORT_FORMATS, case_sensitive=True),
+    help="Write statistics in a machine-readable format instead of a table.",
+)
+@click.option(
+    "--all-profiles",
+    "-A",
+    is_flag=True,
+    default=False,
+    help="Combine the statistics of every profile with a token.",
+)
+@click.option("--debug", is_flag=True, default=False, hidden=True)
+def stats(
+    view=None,
+    period="week",
+    since=None,
+    category=None,
+    file_format=None,
+    all_profiles=False,
+    debug=False,
+):
+    view = view or ("activity" if file_format else None)
+
+    # Read from the rollups the index keeps per day, not from the library
+    activity = {}
+    progress_totals = {}
+    for profile in profiles_option(all_profiles):
+        with use_profile(profile):
+            index = fetch_library_index(debug=debug)
+        for start, counts in index.activity(period, since, category).items():
+            totals = activity.setdefault(start, Counter())
+            totals.update(counts)
+        for name, (progress, count) in index.progress_totals(since, category).items():
+            totals = progress_totals.setdefault(name, [0.0, 0])
+            totals[0] += progress
+            totals[1] += count
+
+    progress = {
+        name: progress / count
+        for name, (progress, count) in progress_totals.items()
+        if count
+    }
+    activity = dict(sorted(activity.items()))
+
+    if not activity:
+        secho("No activity found.", fg="yellow")
+        return
+
+    if file_format and view == "progress":
+        rows = (
+            {"category": name, "average_progress": average}
+            for name, average in progress.items()
+        )
+        write_rows(rows, PROGRESS_FIELDS, file_format=file_format, output="-")
+    elif file_format:
+        rows = ({"period": start, **counts} for start, counts in activity.items())
+        write_rows(rows, ACTIVITY_FIELDS, file_format=file_format, output="-")
     else:
-        print("Library is empty.")
+        if view in (None, "activity"):
+            print_activity_results(activity, period=period)
+        if view in (None, "progress"):
+            print_progress_results(progress)
 
 
-@click.command(help="Add Document")
-@click.argument("url")
+@click.command(help="Export Documents")
 @click.option(
-    "--tag",
-    "-t",
+    "--location",
+    "-l",
+    type=click.Choice(tuple(VALID_LOCATION_OPTIONS), case_sensitive=True),
+    help="Document(s) location",
+)
+@click.option(
+    "--category",
+    "-c",
+    type=click.Choice(tuple(VALID_CATEGORY_OPTIONS), case_sensitive=True),
+    help="Document(s) category",
+)
+@click.option(
+    "--update-after",
+    "-a",
+    default=None,
+    type=click.DateTime(),
+    help="Updated after date in ISO format. Default: no filter.",
+)
+@click.option(
+    "--date-range",
+    "-d",
+    type=str,
+    help="Export documents updated after choosen time: day, week, month.",
+)
+@click.option(
+    "--format",
+    "-F",
+    "file_format",
+    type=click.Choice(EXPORT_FORMATS, case_sensitive=True),
+    default="jsonl",
+    help="Output format. Default: jsonl.",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default="-",
+    help="File to write to. Default: stdout.",
+)
+@click.option(
+    "--fields",
+    "-f",
     multiple=True,
-    help="Tag(s) to add to the document. Can be used multiple times.",
+    help="Field(s) to include. Default: all but content, summary and notes.",
+)
+@click.option("--debug", is_flag=True, default=False, hidden=True)
+def export(
+    location,
+    category,
+    update_after,
+    date_range,
+    file_format,
+    output,
+    fields,
+    debug=False,
+):
+    if date_range:
+        update_after = convert_date_range(date_range=date_range)
+
+    documents = iter_documents(
+        category=category,
+        location=location,
+        updated_after=update_after,
+        debug=debug,
+    )
+
+    count = export_documents(
+        documents, file_format=file_format, output=output, fields=fields
+    )
+
+    if output != "-":
+        secho(f"Exported {count} document(s) to {output}", fg="bright_green", err=True)
+
+
+@click.command(help="Show what changed between two library snapshots")
+@click.argument("old", required=False)
+@click.argument("new", required=False, default=LIVE_LIBRARY)
+@click.option(
+    "--format",
+    "-F",
+    "file_format",
+    type=click.Choice(EXPORT_FORMATS, case_sensitive=True),
+    help="Write the changes in a machine-readable format.",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default="-",
+    help="File to write to. Default: stdout.",
 )
 @click.option("--debug", is_flag=True, default=False, hidden=True)
-def add(url, tag, debug=False):
-    tags = [t for t in tag] if tag else None
-    response = add_document(doc_info=DocumentInfo(url=url, tags=tags), debug=debug)
-    if response.status_code == 200:
-        secho("Already Exists.", fg="yellow")
+def diff(old, new, file_format, output, debug=False):
+    dates = library_snapshot_dates()
+    if not dates:
+        raise click.ClickException(
+            "No library snapshots yet. Run `rw-cli lib` to store one."
+        )
+
+    if old == LIVE_LIBRARY:
+        raise click.BadParameter("Must be a snapshot date.", param_hint="OLD")
+
+    if old is None:
+        earlier = [date for date in dates if new == LIVE_LIBRARY or date < new]
+        if not earlier:
+            raise click.ClickException(f"No library snapshot before {new}.")
+        old = earlier[-1]
+
+    missing = [date for date in (old, new) if date not in (*dates, LIVE_LIBRARY)]
+    if missing:
+        raise click.ClickException(
+            f"No library snapshot for {', '.join(missing)}. "
+            f"Available: {', '.join(dates)}, {LIVE_LIBRARY}"
+        )
+
+    if debug:
+        print(f"Comparing {old} with {new}")
+
+    old_states = index_states(iter_library(old))
+    if new == LIVE_LIBRARY:
+        new_documents = iter_documents(debug=debug)
     else:
-        secho("Added!", fg="bright_green")
+        new_documents = iter_library(new)
 
+    counts = Counter()
+    changes = diff_library(old_states, new_documents, counts=counts)
 
-@click.command(help="Update Document")
+    if file_format:
+        write_rows(changes, CHANGE_FIELDS, file_format=file_format, output=output)
+        secho(summarize(counts) or "No changes", fg="bright_green", err=True)
+    else:
+        print_changes(changes, counts=counts)
+
+
+@click.command(help="List a document's highlights and notes")
 @click.argument("document_id")
+@click.option(
+    "--format",
+    "-F",
+    "file_format",
+    type=click.Choice(EXPORT_FORMATS, case_sensitive=True),
+    help="Write highlights in a machine-readable format instead of a table.",
+)
+@click.option("--debug", is_flag=True, default=False, hidden=True)
+def highlights(document_id, file_format=None, debug=False):
+    index = fetch_library_index(debug=debug)
+
+    children = index.highlights(document_id) if index else []
+    if not children:
+        secho("No highlights or notes found.", fg="yellow")
+        return
+
+    if file_format:
+        export_documents(children, file_format=file_format, fields=HIGHLIGHT_FIELDS)
+    else:
+        title = index.title(document_id)
+        if title:
+            click.echo(title)
+        print_results(children, category="highlight")
+
+
+@click.command(help="Sync the library for offline use, e.g. from cron")
+@click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Download the whole library instead of what changed since the last sync.",
+)
+@click.option(
+    "--no-wait",
+    is_flag=True,
+    default=False,
+    help="Exit right away if another sync is running instead of waiting for it.",
+)
+@click.option(
+    "--all-profiles",
+    "-A",
+    is_flag=True,
+    default=False,
+    help="Sync every profile with a token, in parallel.",
+)
+@click.option(
+    "--status",
+    is_flag=True,
+    default=False,
+    help="Print the stats of the last sync as JSON instead of syncing.",
+)
+@click.option("--quiet", "-q", is_flag=True, default=False, help="Only print errors.")
+@click.option("--debug", is_flag=True, default=False, hidden=True)
+def sync(
+    full=False,
+    no_wait=False,
+    all_profiles=False,
+    status=False,
+    quiet=False,
+    debug=False,
+):
+    profiles = profiles_option(all_profiles)
+
+    if status:
+        all_stats = {}
+        for profile in profiles:
+            with use_profile(profile):
+                all_stats[profile] = read_sync_stats()
+        if not any(all_stats.values()):
+            raise click.ClickException("The library hasn't been synced yet.")
+        click.echo(
+            json.dumps(all_stats if all_profiles else all_stats[profiles[0]], indent=2)
+        )
+        return
+
+    def sync_profile(profile):
+        with use_profile(profile):
+            return run_sync(full=full, wait=not no_wait, debug=debug)
+
+    # Each profile has its own lock, store and rate limits, so they don't wait
+    # on each other
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+        futures = {
+            profile: executor.submit(sync_profile, profile) for profile in profiles
+        }
+        for profile, future in futures.items():
+            prefix = f"{profile}: " if all_profiles else ""
+            try:
+                stats = future.result()
+            except Exception as e:
+                if not all_profiles:
+                    raise
+                secho(f"{prefix}Sync failed: {e}", fg="bright_red", err=True)
+                failed.append(profile)
+                continue
+
+            if quiet:
+                continue
+            if stats is None:
+                secho(
+                    f"{prefix}Another sync was already running, skipped.", fg="yellow"
+                )
+                continue
+
+            secho(
+                f"{prefix}Synced {stats['documents']:,} documents ({stats['mode']}, "
+                f"{stats['changed']:,} changed) in {stats['duration']:.1f}s, "
+                f"{stats['pages']:,} pages",
+                fg="bright_green",
+            )
+
+    if failed:
+        raise click.ClickException(f"Sync failed for: {', '.join(failed)}")
+
+
+@click.command(help="Archive document bodies for offline reading")
+@click.option(
+    "--location",
+    "-l",
+    type=click.Choice(tuple(VALID_LOCATION_OPTIONS), case_sensitive=True),
+    help="Only documents in this location",
+)
+@click.option(
+    "--category",
+    "-c",
+    type=click.Choice(tuple(VALID_CATEGORY_OPTIONS), case_sensitive=True),
+    help="Only documents of this category",
+)
+@click.option(
+    "--update-after",
+    "-a",
+    default=None,
+    type=click.DateTime(),
+    help="Only documents updated after this date. Default: since the last run.",
+)
+@click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Archive every document instead of those updated since the last run.",
+)
+@click.option(
+    "--images",
+    is_flag=True,
+    default=False,
+    help="Download and archive each document's image too.",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(1, 32),
+    default=MAX_WORKERS,
+    help=f"Threads storing bodies and downloading images. Default: {MAX_WORKERS}.",
+)
+@click.option(
+    "--read",
+    "document_id",
+    metavar="DOCUMENT_ID",
+    help="Print a document's archived HTML, or text, instead of archiving.",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default="-",
+    help="File to write the document read with --read to. Default: stdout.",
+)
+@click.option("--debug", is_flag=True, default=False, hidden=True)
+def archive(
+    location=None,
+    category=None,
+    update_after=None,
+    full=False,
+    images=False,
+    workers=MAX_WORKERS,
+    document_id=None,
+    output="-",
+    debug=False,
+):
+    content_archive = ContentArchive()
+
+    if document_id:
+        body = content_archive.body(document_id)
+        if body is None:
+            raise click.ClickException(f"Document {document_id} isn't archived.")
+        with click.open_file(output, "wb") as out:
+            out.write(body)
+        return
+
+    filtered = bool(location or category or update_after)
+    if not (full or update_after) and content_archive.archived_until:
+        update_after = content_archive.archived_until - REVALIDATE_OVERLAP
+
+    started = datetime.now().astimezone()  # the API reads naive times as UTC
+    query = DocumentQuery(
+        category=category,
+        location=location,
+        updated_after=update_after,
+        exclude_categories=(
+            () if category in ("highlight", "note") else tuple(CHILD_CATEGORIES)
+        ),
+        with_html_content=True,
+    )
+
+    counts = Counter()
+    # Pages with full bodies are large, and read once
+    documents = iter_query(query, memoize=False, debug=debug)
+    with use_job(Job(Priority.SYNC, "archive")):
+        archived = archive_documents(
+            documents, content_archive, images=images, workers=workers, counts=counts
+        )
+
+    if not filtered:  # only then are all documents up to date
+        content_archive.mark_archived(started)
+
+    secho(
+        f"Archived {archived:,} document(s): {counts['blobs']:,} new blob(s), "
+        f"{counts['bytes'] / 1024 / 1024:,.1f} MiB compressed, "
+        f"{counts['reused']:,} already stored.",
+        fg="bright_green",
+    )
+    if counts["images"]:
+        secho(f"{counts['images']:,} image(s) couldn't be downloaded.", fg="yellow")
+
+
+@click.command(help="Add Document(s)")
+@click.argument("urls", nargs=-1, required=True)
+@click.option(
+    "--tag",
+    "-t",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Tag(s) to add to every document. Can be used multiple times.",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(1, 32),
+    default=MAX_WORKERS,
+    help=f"Concurrent requests when adding many documents. Default: {MAX_WORKERS}.",
+)
+@click.option("--debug", is_flag=True, default=False, hidden=True)
+def add(urls, tag, workers=MAX_WORKERS, debug=False):
+    if len(urls) == 1 and urls[0] != "-":
+        tags = [t for t in tag] if tag else None
+        response = add_document(
+            doc_info=DocumentInfo(url=urls[0], tags=tags), debug=debug
+        )
+        if response.status_code == 200:
+            secho("Already Exists.", fg="yellow")
+        else:
+            secho("Added!", fg="bright_green")
+        return
+
+    # "-" reads `URL [TAG ...]` lines from stdin as they arrive
+    entries = chain.from_iterable(
+        click.get_text_stream("stdin") if url == "-" else [url] for url in urls
+    )
+    rejected = []
+
+    batch_add_documents(
+        documents_from_urls(entries, tags=tag, rejected=rejected),
+        debug=debug,
+        rejected=rejected,
+        workers=workers,
+    )
+
+
+def planning_library(debug=False) -> str:
+    """Sync what changed, so plans are made from the library as it is now.
+
+    Returns:
+        str: The date of the synced snapshot
+    """
+    refresh_library(debug=debug)
+    dates = library_snapshot_dates()
+    if not dates:
+        raise click.ClickException("The library couldn't be synced.")
+    return dates[-1]
+
+
+def print_plan_summary(counts: Counter, workers: int = MAX_WORKERS) -> None:
+    """Print the requests a dry run would send, and roughly how long they'd take"""
+    for endpoint, rate in RATE_LIMITS.items():
+        if counts[endpoint]:
+            limit = f"{rate} a minute" if rate else "no rate limit"
+            secho(
+                f"Would send {counts[endpoint]:,} {endpoint} request(s), at {limit}.",
+                fg="bright_yellow",
+            )
+    actions = ", ".join(
+        f"{counts[action]:,} {action}" for action in PLAN_ACTIONS if counts[action]
+    )
+    if actions:
+        secho(f"{actions}; {counts['no_op']:,} would change nothing.")
+    secho(f"Estimated time: {format_duration(estimate_duration(counts, workers))}.")
+
+
+@click.command(help="Update Document(s)")
+@click.argument("document_ids", metavar="DOCUMENT_ID...", nargs=-1, required=True)
 @click.option(
     "--tag",
     "-t",
     multiple=True,
+    shell_complete=complete_tags,
     help="Tag(s) to set on the document. Can be used multiple times.",
 )
 @click.option(
@@ -209,8 +1309,23 @@ def add(url, tag, debug=False):
     help="Move document to location",
 )
 @click.option("--title", "-T", type=str, help="Update document title")
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(1, 32),
+    default=MAX_WORKERS,
+    help=f"Concurrent requests when updating many documents. Default: {MAX_WORKERS}.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Print which documents would change and how long it'd take, without updating.",
+)
 @click.option("--debug", is_flag=True, default=False, hidden=True)
-def update(document_id, tag, location, title, debug=False):
+def update(
+    document_ids, tag, location, title, workers=MAX_WORKERS, dry_run=False, debug=False
+):
     data = {}
     if tag:
         data["tags"] = [t for t in tag]
@@ -226,21 +1341,271 @@ def update(document_id, tag, location, title, debug=False):
         )
         return
 
-    response = update_document(document_id=document_id, data=data, debug=debug)
-    if response.status_code in (200, 201):
-        secho("Updated!", fg="bright_green")
+    # "-" reads document ids from stdin, one per line
+    entries = chain.from_iterable(
+        click.get_text_stream("stdin") if entry == "-" else [entry]
+        for entry in document_ids
+    )
+    document_ids = [*dict.fromkeys(entry.strip() for entry in entries if entry.strip())]
+
+    if dry_run:
+        library = library_by_id(
+            iter_library(planning_library(debug=debug)), {*document_ids}
+        )
+        counts = Counter()
+        print_plan(summarize_plan(plan_updates(document_ids, data, library), counts))
+        print_plan_summary(counts, workers)
+        return
+
+    if len(document_ids) == 1:
+        response = update_document(document_id=document_ids[0], data=data, debug=debug)
+        if response.status_code in (200, 201):
+            secho("Updated!", fg="bright_green")
+        return
+
+    updated = batch_update_documents(
+        ((document_id, data) for document_id in document_ids),
+        debug=debug,
+        workers=workers,
+        total=len(document_ids),
+    )
+    failed = len(document_ids) - len(updated)
+    secho(
+        f"Updated {len(updated):,}, {failed:,} failed.",
+        fg="bright_red" if failed else "bright_green",
+    )
+
+
+@click.command(help="Rename, add or remove tags across many documents")
+@click.option(
+    "--rename",
+    nargs=2,
+    metavar="OLD NEW",
+    shell_complete=complete_tags,
+    help="Rename tag OLD to NEW on every document that has it.",
+)
+@click.option(
+    "--add",
+    "add_tags",
+    multiple=True,
+    help="Tag to add to the selected documents. Can be repeated.",
+)
+@click.option(
+    "--remove",
+    "remove_tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Tag to remove from the selected documents. Can be repeated.",
+)
+@click.option(
+    "--location",
+    "-l",
+    type=click.Choice(tuple(VALID_LOCATION_OPTIONS), case_sensitive=True),
+    help="Only documents in this location",
+)
+@click.option(
+    "--category",
+    "-c",
+    type=click.Choice(tuple(VALID_CATEGORY_OPTIONS), case_sensitive=True),
+    help="Only documents of this category",
+)
+@click.option(
+    "--tag",
+    "-t",
+    "tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Only documents with this tag. Repeat to require several tags.",
+)
+@click.option(
+    "--any-tag",
+    "any_tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Only documents with at least one of these tags. Can be repeated.",
+)
+@click.option(
+    "--not-tag",
+    "exclude_tags",
+    multiple=True,
+    shell_complete=complete_tags,
+    help="Leave out documents with this tag. Can be repeated.",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(1, 32),
+    default=MAX_WORKERS,
+    help=f"Concurrent requests. Default: {MAX_WORKERS}.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Print the changes that would be made without making them.",
+)
+@click.option("--debug", is_flag=True, default=False, hidden=True)
+def retag(
+    rename=None,
+    add_tags=(),
+    remove_tags=(),
+    location=None,
+    category=None,
+    tags=(),
+    any_tags=(),
+    exclude_tags=(),
+    workers=MAX_WORKERS,
+    dry_run=False,
+    debug=False,
+):
+    if not (rename or add_tags or remove_tags):
+        raise click.UsageError("Nothing to do. Use --rename, --add or --remove.")
+    rename = tuple(rename) if rename else None
+
+    # Highlights and notes have tags of their own, only touched when asked for
+    exclude_categories = (
+        () if category in ("highlight", "note") else tuple(CHILD_CATEGORIES)
+    )
+    query = DocumentQuery(
+        category=category,
+        location=location,
+        # Documents without the old tag have nothing to rename
+        tags=(*tags, rename[0]) if rename and not add_tags else tags,
+        any_tags=any_tags,
+        exclude_tags=exclude_tags,
+        exclude_categories=exclude_categories,
+    )
+
+    # PATCHes replace all of a document's tags, so they're planned from tags
+    # as they are now, not as of the last sync
+    refresh_library(debug=debug)
+    documents = query_library(query, debug=debug)
+    if documents is None:
+        raise click.ClickException("The library couldn't be synced.")
+
+    selected = {}
+
+    def select(documents):
+        for document in documents:
+            selected[document["id"]] = {"tags": document.get("tags")}
+            yield document
+
+    skipped = []
+    plan = [
+        *plan_retag(
+            select(documents),
+            add=add_tags,
+            remove=remove_tags,
+            rename=rename,
+            skipped=skipped,
+        )
+    ]
+
+    if dry_run:
+        print_changes(
+            {
+                "change": "retagged",
+                "id": change.id,
+                "title": change.title,
+                "before": ", ".join(change.before),
+                "after": ", ".join(change.after),
+            }
+            for change in plan
+        )
+        secho(
+            f"Would retag {len(plan):,}, skipping {len(skipped):,} unchanged.",
+            fg="bright_yellow",
+        )
+        seconds = estimate_duration({UPDATE_ENDPOINT: len(plan)}, workers)
+        secho(f"Estimated time: {format_duration(seconds)}.")
+        return
+
+    updated = batch_update_documents(
+        ((change.id, {"tags": [*change.after]}) for change in plan),
+        debug=debug,
+        workers=workers,
+        total=len(plan),
+    )
+
+    # Apply the changes that went through to the synced library, so follow-up
+    # queries see them without a sync
+    updated = set(updated)
+    update_library(
+        {
+            change.id: {"tags": stored_tags(selected[change.id], change.after)}
+            for change in plan
+            if change.id in updated
+        }
+    )
+    if updated and os.path.exists(result_cache_path()):
+        os.remove(result_cache_path())
+
+    failed = len(plan) - len(updated)
+    secho(
+        f"Retagged {len(updated):,}, skipped {len(skipped):,} unchanged, "
+        f"{failed:,} failed.",
+        fg="bright_red" if failed else "bright_green",
+    )
 
 
 @click.command(help="Upload Reading List File")
 @click.argument("input_file", type=click.Path(exists=True))
 @click.option("--file-type", type=click.Choice(["html", "csv"]), default="html")
+@click.option(
+    "--reject-file",
+    type=click.Path(dir_okay=False),
+    help="Where to write rows with invalid URLs. Default: INPUT_FILE.rejected.csv",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Print which documents are new or already saved and how long the upload "
+    "would take, without uploading.",
+)
 @click.option("--debug", is_flag=True, default=False, hidden=True)
-def upload(input_file, file_type, debug=False):
-    click.echo(f"Adding Document(s) from: {input_file}")
+def upload(input_file, file_type, reject_file=None, dry_run=False, debug=False):
+    if dry_run:
+        dates = [planning_library(debug=debug)]
+    else:
+        click.echo(f"Adding Document(s) from: {input_file}")
+        dates = library_snapshot_dates()
 
-    reading_list = build_reading_list(input_file=input_file, file_type=file_type)
+    titles = TitleCache()
+    if dates:
+        latest = dates[-1]
+        titles.seed(iter_library(latest), version=f"{latest} {library_time(latest)}")
 
-    batch_add_documents(reading_list, debug=debug)
+    rejected = []
+    counts = Counter()
+    reading_list = enrich_reading_list(
+        iter_reading_list(input_file=input_file, file_type=file_type),
+        titles,
+        rejected=rejected,
+        counts=counts,
+    )
+
+    if dry_run:
+        plan_counts = Counter()
+        library = library_by_url(iter_library(dates[-1]))
+        print_plan(summarize_plan(plan_saves(reading_list, library), plan_counts))
+        print_plan_summary(plan_counts)
+    else:
+        batch_add_documents(reading_list, debug=debug)
+
+    if counts["duplicates"]:
+        secho(f"Skipped {counts['duplicates']} repeated URL(s)", fg="bright_yellow")
+    if counts["titled"]:
+        secho(f"Filled {counts['titled']} missing title(s) from seen URLs")
+    if rejected and dry_run:
+        secho(f"Would reject {len(rejected)} row(s)", fg="bright_red")
+    elif rejected:
+        reject_file = reject_file or f"{input_file}.rejected.csv"
+        write_rejects(reject_file, rejected)
+        secho(
+            f"Rejected {len(rejected)} row(s), written to {reject_file}",
+            fg="bright_red",
+        )
 
 
 @click.command(help="Validate token")
@@ -21,3 +21,27 @@ AUTH_TOKEN_URL = "https://readwise.io/api/v2/auth/"
 LIST_ENDPOINT = "list"
 CREATE_ENDPOINT = "save"
 UPDATE_ENDPOINT = "update"
+
+# Filters the list endpoint accepts per request
+LIST_TAG_LIMIT = 5  # documents must have every tag
+LIST_PAGE_LIMIT = 100  # documents per page
+
+# Requests per minute allowed by the Reader API
+CREATE_RATE_LIMIT = 50
+UPDATE_RATE_LIMIT = 50
+
+MAX_WORKERS = 8  # Concurrent requests for bulk operations
+
+# In-process memo of list requests
+QUERY_MEMO_TTL = 60  # Seconds
+QUERY_MEMO_SIZE = 32  # Listings kept
+QUERY_MEMO_DOCUMENTS = 10_000  # Larger listings are streamed, not kept
+
+# Polling for changes with `tail` and `list --watch`
+WATCH_INTERVAL = 30  # Seconds between polls while documents change
+WATCH_MAX_INTERVAL = 300  # Seconds between polls once idle
+WATCH_BACKOFF = 1.5  # Idle polls stretch the interval by this factor
+WATCH_MIN_INTERVAL = 3  # Seconds, the list endpoint allows 20 requests a minute
+
+# Documents buffered at once when streaming the full library
+STREAM_BATCH_SIZE = 1_000
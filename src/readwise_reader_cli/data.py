@@ -2,17 +2,53 @@
 
 import json
 import os
+import time as timer
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
 
-from xdg_base_dirs import xdg_data_home
-
-from .api import list_documents
+from .api import iter_documents
+from .cache import (
+    read_cache_entry,
+    read_cache_keys,
+    read_cache_stream,
+    read_cache_stream_rows,
+    read_cache_stream_time,
+    write_cache_stream,
+)
+from .constants import STREAM_BATCH_SIZE
+from .display import with_display_fields
+from .lock import FileLock
 from .models import DocumentInfo
+from .profiles import cache_dir, use_profile
+from .query import DocumentQuery
+from .scheduler import Job, Priority, current_job, use_job
+from .snapshot import LibrarySnapshot, LibrarySnapshotWriter, snapshot_available
+from .store import (
+    INDEX_VERSION,
+    LibraryIndex,
+    LibraryIndexWriter,
+    index_path,
+    load_index,
+)
 
-CACHE_DIR = xdg_data_home() / "reader"
-CACHED_RESULT_PATH = CACHE_DIR / "full_library.json"
 CACHE_EXPIRATION = 1  # Day
+FULL_SYNC_INTERVAL = 7  # Days, a full sync drops documents deleted since
+SYNC_OVERLAP = timedelta(minutes=1)  # Guards against clock skew
+
+LIBRARY_SUFFIX = ".jsonl.gz"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Lists documents like `iter_documents`, which syncs use unless given another
+Fetch = Callable[..., Iterator[DocumentInfo]]
+
+_batch_size = STREAM_BATCH_SIZE
+
+
+def set_batch_size(batch_size: int) -> None:
+    """Set how many documents are buffered at once when syncing the library"""
+    global _batch_size
+    _batch_size = batch_size
 
 
 def todays_date():
@@ -20,17 +56,70 @@ def todays_date():
     return now.strftime("%Y-%m-%d")
 
 
-def load_library(date: str) -> List[dict]:
-    with open(CACHED_RESULT_PATH, "r") as f:
-        json_file = json.load(f)
-        return json_file.get(date)
+# Paths within the current profile's cache directory
+
+
+def cached_result_path():
+    return cache_dir() / "full_library.json"  # snapshots of older versions
+
+
+def library_dir():
+    return cache_dir() / "library"
+
+
+def snapshot_path():
+    return cache_dir() / "full_library.arrow"
+
+
+def sync_lock_path():
+    return cache_dir() / "sync.lock"
+
+
+def sync_stats_path():
+    return cache_dir() / "sync.json"
+
+
+def library_path(date: str):
+    return library_dir() / f"{date}{LIBRARY_SUFFIX}"
+
 
+def library_snapshot_dates() -> List[str]:
+    """Dates of the stored full library snapshots, oldest first"""
+    dates = set(read_cache_keys(cached_result_path()))
+    if os.path.isdir(library_dir()):
+        dates.update(
+            name[: -len(LIBRARY_SUFFIX)]
+            for name in os.listdir(library_dir())
+            if name.endswith(LIBRARY_SUFFIX)
+        )
+    return sorted(dates)
 
-def get_cache_time(cache: list[dict]) -> datetime | None:
-    t = cache[-1].get("time")
+
+def iter_library(date: str) -> Iterator[dict]:
+    """Stream the serialized documents of the full library snapshot of `date`"""
+    path = library_path(date)
+    if os.path.exists(path):
+        return read_cache_stream(path)
+
+    entry = read_cache_entry(cached_result_path(), date) or [{}]
+    return iter(entry[:-1])
+
+
+def iter_library_rows(date: str, rows: Iterable[int]) -> Iterator[dict]:
+    """Stream the documents at sorted positions `rows` of the snapshot of `date`"""
+    path = library_path(date)
+    if os.path.exists(path):
+        return read_cache_stream_rows(path, rows)
+
+    entry = read_cache_entry(cached_result_path(), date) or [{}]
+    return (entry[row] for row in rows)
+
+
+def library_time(date: str) -> Optional[datetime]:
+    t = read_cache_stream_time(library_path(date))
     if t:
-        return datetime.strptime(t, "%Y-%m-%d %H:%M:%S.%f")
-    return t
+        return datetime.strptime(t, TIME_FORMAT)
+    return None
 
 
 def use_cache(t: datetime) -> bool:
@@ -40,6 +129,375 @@ def use_cache(t: datetime) -> bool:
     return False
 
 
+def _write_library(
+    documents: Iterable[Union[DocumentInfo, Dict]],
+    time: datetime,
+    date: Optional[str] = None,
+) -> int:
+    """Stream documents into the snapshot of `date`, today's by default.
+
+    Each document is written to the snapshot, and added to the highlight index
+    and columnar snapshot, as it arrives, so memory use is bounded by the batch
+    size rather than the size of the library. Documents are either fetched
+    `DocumentInfo` objects or serialized documents of an earlier snapshot.
+
+    Returns:
+        int: The number of documents written
+    """
+    index = LibraryIndexWriter(index_path(), batch_size=_batch_size, time=time)
+    snapshot = None
+    if snapshot_available():
+        os.makedirs(cache_dir(), exist_ok=True)
+        snapshot = LibrarySnapshotWriter(
+            snapshot_path(), batch_size=_batch_size, time=time
+        )
+
+    def serialized() -> Iterator[dict]:
+        for doc in documents:
+            if isinstance(doc, DocumentInfo):
+                doc_json = with_display_fields(doc.model_dump(mode="json"))
+            else:
+                doc_json, doc = doc, DocumentInfo(**doc) if snapshot else None
+            index.add(doc_json)
+            if snapshot:
+                snapshot.add(doc)
+            yield doc_json
+
+    try:
+        count = write_cache_stream(
+            library_path(date or todays_date()), serialized(), time=str(time)
+        )
+    except BaseException:
+        index.abort()
+        if snapshot:
+            snapshot.abort()
+        raise
+
+    index.close()
+    if snapshot:
+        snapshot.close()
+
+    return count
+
+
+def sync_full_library(
+    debug=False, counts: Optional[Counter] = None, fetch: Fetch = iter_documents
+) -> int:
+    """Stream the full library into today's snapshot.
+
+    Args:
+        counts (Counter, optional): Incremented for fetched "pages" and "retries"
+        fetch (callable): Lists documents like `iter_documents`
+
+    Returns:
+        int: The number of documents synced
+    """
+    time = datetime.now()
+    # Syncs always ask the API, a memoized listing could predate `time`
+    documents = fetch(counts=counts, memoize=False, debug=debug)
+    return _write_library(documents, time=time)
+
+
+def sync_library_changes(
+    date: str,
+    debug=False,
+    counts: Optional[Counter] = None,
+    fetch: Fetch = iter_documents,
+) -> int:
+    """Merge the documents changed since the snapshot of `date` into today's.
+
+    Only documents updated since that snapshot was synced are fetched. They're
+    written first, most recently updated first like the API lists them, then
+    the rest are carried over from the older snapshot one at a time. Deleted
+    documents aren't reported by the API, so they're kept until a full sync.
+
+    Args:
+        date (str): Date of the snapshot to update
+        counts (Counter, optional): Incremented for fetched "pages", "retries"
+            and "changed" documents
+        fetch (callable): Lists documents like `iter_documents`
+
+    Returns:
+        int: The number of documents in the library
+    """
+    counts = Counter() if counts is None else counts
+    time = datetime.now()
+    since = library_time(date).astimezone()  # the API reads naive times as UTC
+
+    changed = {
+        doc.id: doc
+        for doc in fetch(
+            updated_after=since - SYNC_OVERLAP,
+            counts=counts,
+            memoize=False,
+            debug=debug,
+        )
+    }
+    counts["changed"] += len(changed)
+
+    def documents() -> Iterator[Union[DocumentInfo, Dict]]:
+        yield from changed.values()
+        for doc in iter_library(date):
+            if doc.get("id") not in changed:
+                yield doc
+
+    return _write_library(documents(), time=time)
+
+
+def sync_library(
+    full=False, scheduled=False, debug=False, fetch: Fetch = iter_documents
+) -> Dict:
+    """Sync the library, only fetching what changed when a recent snapshot exists.
+
+    The library is synced in full if it was last synced in full more than
+    `FULL_SYNC_INTERVAL` days ago, or never by this version. Stats of the sync
+    are stored at `sync_stats_path()`. Callers are expected to hold the sync lock.
+
+    Args:
+        full (bool): Sync the whole library regardless
+        scheduled (bool): Whether the sync was run on its own, e.g. by cron,
+            rather than as part of another command
+        fetch (callable): Lists documents like `iter_documents`, e.g. through
+            another transport
+
+    Returns:
+        Dict: The stats of the sync
+    """
+    dates = library_snapshot_dates()
+    since = library_time(dates[-1]) if dates else None
+    last_full = (read_sync_stats() or {}).get("last_full")
+    full_due = timedelta(days=FULL_SYNC_INTERVAL)
+    if (
+        since is None
+        or last_full is None
+        or datetime.now() - datetime.strptime(last_full, TIME_FORMAT) > full_due
+    ):
+        full = True
+
+    counts: Counter = Counter()
+    started = datetime.now()
+    start = timer.perf_counter()
+
+    # Syncs run on their own yield to commands someone is waiting on
+    job = Job(Priority.SYNC, "sync") if scheduled else current_job()
+    with use_job(job):
+        if full:
+            documents = sync_full_library(debug=debug, counts=counts, fetch=fetch)
+            counts["changed"] = documents
+        else:
+            documents = sync_library_changes(
+                dates[-1], debug=debug, counts=counts, fetch=fetch
+            )
+
+    stats = {
+        "mode": "full" if full else "incremental",
+        "scheduled": scheduled,
+        "started": str(started),
+        "last_full": str(started) if full else last_full,
+        "finished": str(datetime.now()),
+        "duration": round(timer.perf_counter() - start, 3),
+        "pages": counts["pages"],
+        "retries": counts["retries"],
+        "documents": documents,
+        "changed": counts["changed"],
+    }
+
+    tmp_path = f"{sync_stats_path()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stats, f, indent=2)
+    os.replace(tmp_path, sync_stats_path())
+
+    if debug:
+        print(f"Synced library: {stats}")
+
+    return stats
+
+
+def read_sync_stats() -> Optional[Dict]:
+    """Stats of the last sync, or None if the library was never synced"""
+    try:
+        with open(sync_stats_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def run_sync(full=False, wait=True, debug=False) -> Optional[Dict]:
+    """Sync the library on its own, unless another sync is already running.
+
+    Overlapping runs coalesce: while a sync holds the lock, this waits for it
+    to finish, or returns right away without `wait`, and doesn't sync again.
+
+    Returns:
+        Dict: The stats of the sync, or None if another run synced instead
+    """
+    lock = FileLock(sync_lock_path())
+    if not lock.acquire(blocking=False):
+        if wait:
+            with lock:  # wait for the running sync
+                pass
+        return None
+
+    try:
+        return sync_library(full=full, scheduled=True, debug=debug)
+    finally:
+        lock.release()
+
+
+def refresh_library(debug=False) -> str:
+    """Sync what changed since the last sync, however recent it was.
+
+    Returns:
+        str: The date of the current snapshot
+    """
+    with FileLock(sync_lock_path()):
+        sync_library(debug=debug)
+    return todays_date()
+
+
+def update_library(updates: Dict[str, Dict]) -> int:
+    """Apply changes made through the API to the latest snapshot, in place.
+
+    Lets follow-up commands see the changes without a sync. The snapshot keeps
+    its sync time, so the next sync still fetches the changed documents and
+    replaces them with what Reader stored.
+
+    Args:
+        updates (Dict[str, Dict]): Serialized fields to set, by document id
+
+    Returns:
+        int: The number of documents updated
+    """
+    dates = library_snapshot_dates()
+    if not dates or not updates:
+        return 0
+    date = dates[-1]
+    time = library_time(date)
+    if time is None:  # only stored by an older version
+        return 0
+
+    updated = 0
+
+    def documents() -> Iterator[Dict]:
+        nonlocal updated
+        for doc in iter_library(date):
+            changes = updates.get(doc.get("id"))
+            if changes:
+                doc = with_display_fields({**doc, **changes})
+                updated += 1
+            yield doc
+
+    with FileLock(sync_lock_path()):
+        _write_library(documents(), time=time, date=date)
+    return updated
+
+
+def sync_library_if_stale(debug=False) -> str:
+    """Sync the library unless today's snapshot is fresh.
+
+    If another process is syncing, its sync is waited for instead of starting
+    a second one.
+
+    Returns:
+        str: The date of the current snapshot
+    """
+    today = todays_date()
+
+    time = library_time(today)
+    if time and use_cache(t=time):
+        if debug:
+            print("Using cache")
+        return today
+
+    with FileLock(sync_lock_path()):
+        time = library_time(today)
+        if time and use_cache(t=time):  # synced while waiting for the lock
+            if debug:
+                print("Using cache")
+        else:
+            sync_library(debug=debug)
+
+    return today
+
+
+def iter_full_library(debug=False) -> Iterator[DocumentInfo]:
+    """Stream the full library including documents, notes, and highlights.
+
+    Yields:
+        DocumentInfo: A `DocumentInfo` object
+    """
+    for doc_info in iter_library(sync_library_if_stale(debug=debug)):
+        yield DocumentInfo(**doc_info)
+
+
+def iter_profile_libraries(
+    profiles: Iterable[str], debug=False
+) -> Iterator[DocumentInfo]:
+    """Stream the full libraries of several profiles, one after another"""
+    for profile in profiles:
+        with use_profile(profile):
+            yield from iter_full_library(debug=debug)
+
+
+def query_library(query: DocumentQuery, debug=False) -> Optional[Iterator[Dict]]:
+    """Serve a query from the latest synced library, without the API.
+
+    For tag queries, the tag index picks the matching positions and only the
+    documents at those positions are parsed. The query's other filters and
+    limit are applied as usual, but not its projection.
+
+    Returns:
+        Iterator[Dict]: The matching serialized documents, or None if there's
+        no library, or tags are queried and its index was built from another
+        sync
+    """
+    dates = library_snapshot_dates()
+    if not dates:
+        return None
+
+    if query.tag_filtered:
+        index = load_index()
+        if index is None or index.version != INDEX_VERSION:
+            return None
+        if index.time != library_time(dates[-1]):
+            return None
+
+        rows = index.tagged(query.tags, query.any_tags, query.exclude_tags)
+        if debug:
+            print(f"Tag index: {len(rows)} of {index.size} document(s)")
+        library = iter_library_rows(dates[-1], rows)
+    else:
+        library = iter_library(dates[-1])
+
+    def documents() -> Iterator[Dict]:
+        count = 0
+        for doc_info in library:
+            if not query.matches(doc_info, include_time=True):
+                continue
+            yield doc_info
+
+            count += 1
+            if query.limit and count >= query.limit:
+                return
+
+    return documents()
+
+
+def iter_tagged_library(
+    query: DocumentQuery, debug=False
+) -> Optional[Iterator[DocumentInfo]]:
+    """Serve a tag query from the latest synced library through its tag index.
+
+    Returns:
+        Iterator[DocumentInfo]: The matching, projected documents, or None if
+        the index can't serve the query
+    """
+    documents = query_library(query, debug=debug) if query.tag_filtered else None
+    if documents is None:
+        return None
+    return (DocumentInfo(**query.project(doc_info)) for doc_info in documents)
+
+
 def fetch_full_library(debug=False) -> Optional[List[DocumentInfo]]:
     """Fetch the full library including documents, notes, and highlights.
 
@@ -47,45 +505,73 @@ def fetch_full_library(debug=False) -> Optional[List[DocumentInfo]]:
         List[DocumentInfo]: A list of `DocumentInfo` objects.
     """
 
-    tmp_library: Optional[List[DocumentInfo]] = None
+    return [doc for doc in iter_full_library(debug=debug)]
 
-    today = todays_date()
 
-    if os.path.exists(CACHED_RESULT_PATH):
-        result = load_library(date=today)
-        if result:
-            time = get_cache_time(cache=result)
-            if not time:
-                raise ValueError(time)
-            if use_cache(t=time):
-                if debug:
-                    print("Using cache")
-                tmp_library = [DocumentInfo(**doc_info) for doc_info in result[:-1]]
-
-    if tmp_library is None:
-        tmp_library = list_documents(
-            debug=debug
-        )  # fetch full library including all documents, notes, and highlights
-
-        if tmp_library is None or len(tmp_library) == 0:
-            return tmp_library
-        else:
-            tmp_library_json = [doc.model_dump(mode="json") for doc in tmp_library]
+def fetch_library_snapshot(debug=False) -> Optional[LibrarySnapshot]:
+    """Fetch a columnar snapshot of the full library.
 
-            tmp_library_json.append({"time": str(datetime.now())})
-            os.makedirs(CACHE_DIR, exist_ok=True)
+    The snapshot is written while the library syncs, and rebuilt from the
+    stored library if it's missing, so repeated reports only memory-map a file.
 
-        with open(CACHED_RESULT_PATH, "a+") as f:
-            if os.path.getsize(CACHED_RESULT_PATH) == 0:  # file is empty
-                result_dict = {today: tmp_library_json}
-                f.write(json.dumps(result_dict, indent=4))
-            else:
-                f.seek(0)
-                result_dict = json.load(f)
-                result_dict[today] = tmp_library_json
-                f.truncate(0)
-                f.write(json.dumps(result_dict, indent=4))
+    Returns:
+        LibrarySnapshot: A `LibrarySnapshot`, or None if the library is empty.
+    """
+
+    today = sync_library_if_stale(debug=debug)
+    time = library_time(today)
+
+    snapshot = None
+    if os.path.exists(snapshot_path()):
+        snapshot = LibrarySnapshot.read(snapshot_path())
+
+    if snapshot is None or snapshot.time != time:  # built from an older sync
+        with LibrarySnapshotWriter(
+            snapshot_path(), batch_size=_batch_size, time=time
+        ) as writer:
+            for doc_info in iter_library(today):
+                writer.add(DocumentInfo(**doc_info))
+        snapshot = LibrarySnapshot.read(snapshot_path())
+    elif debug:
+        print("Using snapshot")
+
+    return snapshot if len(snapshot) else None
+
+
+def fetch_library_index(debug=False) -> LibraryIndex:
+    """Fetch the highlight index of the full library.
+
+    The index is built while the library syncs, and rebuilt from the stored
+    library if it's missing.
+
+    Returns:
+        LibraryIndex: A `LibraryIndex`
+    """
+
+    return library_index(sync_library_if_stale(debug=debug))
+
+
+def library_index(date: str) -> LibraryIndex:
+    """The highlight index of the library synced on `date`, without the API.
+
+    Rebuilt from the stored library if it's missing, or was built from
+    another sync or by an older version.
+
+    Returns:
+        LibraryIndex: A `LibraryIndex`
+    """
+
+    time = library_time(date)
 
-    full_library = tmp_library
+    index = load_index()
+    if (
+        index is None or index.time != time or index.version != INDEX_VERSION
+    ):  # built from an older sync, or by an older version
+        with LibraryIndexWriter(
+            index_path(), batch_size=_batch_size, time=time
+        ) as writer:
+            for doc_info in iter_library(date):
+                writer.add(doc_info)
+        index = load_index()
 
-    return full_library
+    return index
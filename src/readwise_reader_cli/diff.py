@@ -0,0 +1,140 @@
+"""Provides code to compare two versions of the library."""
+
+from collections import Counter
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+from .models import DocumentInfo
+
+CHANGE_TYPES = ("added", "removed", "moved", "retagged", "progress", "updated")
+CHANGE_FIELDS = ["change", "id", "title", "before", "after"]
+
+STATE_FIELDS = {"id", "url", "title", "location", "tags", "reading_progress"}
+
+
+class DocumentState(NamedTuple):
+    """The parts of a document that a diff reports changes to."""
+
+    title: str
+    location: Optional[str]
+    tags: Tuple[str, ...]
+    reading_progress: Optional[float]
+
+
+def document_state(document: Union[DocumentInfo, Dict]) -> Tuple[str, DocumentState]:
+    """Reduce a document to its id and `DocumentState`"""
+    if isinstance(document, DocumentInfo):
+        document = document.model_dump(mode="json", include=STATE_FIELDS)
+
+    # Tags are a list of names, or a dict keyed by name
+    return document["id"], DocumentState(
+        title=document.get("title") or str(document.get("url")),
+        location=document.get("location"),
+        tags=tuple(sorted(document.get("tags") or ())),
+        reading_progress=document.get("reading_progress"),
+    )
+
+
+def index_states(
+    documents: Iterable[Union[DocumentInfo, Dict]],
+) -> Dict[str, DocumentState]:
+    """Index documents by id, keeping only what a diff compares"""
+    return dict(document_state(document) for document in documents)
+
+
+def _format_tags(tags: Tuple[str, ...]) -> str:
+    return ", ".join(tags)
+
+
+def _format_progress(reading_progress: Optional[float]) -> str:
+    return f"{reading_progress or 0:.0%}"
+
+
+def change_row(
+    change: str, document_id: str, title: str, before=None, after=None
+) -> Dict[str, Optional[str]]:
+    """A `CHANGE_FIELDS` row"""
+    return {
+        "change": change,
+        "id": document_id,
+        "title": title,
+        "before": before,
+        "after": after,
+    }
+
+
+def diff_states(
+    document_id: str, before: DocumentState, after: DocumentState
+) -> Iterator[Dict[str, Optional[str]]]:
+    """Changes between two states of the same document, one row per change"""
+    if before.location != after.location:
+        yield change_row(
+            "moved", document_id, after.title, before.location, after.location
+        )
+    if before.tags != after.tags:
+        yield change_row(
+            "retagged",
+            document_id,
+            after.title,
+            _format_tags(before.tags),
+            _format_tags(after.tags),
+        )
+    if before.reading_progress != after.reading_progress:
+        yield change_row(
+            "progress",
+            document_id,
+            after.title,
+            _format_progress(before.reading_progress),
+            _format_progress(after.reading_progress),
+        )
+
+
+def summarize(counts: Dict[str, int]) -> str:
+    """Describe change counts, e.g. "3 added, 1 moved"."""
+    return ", ".join(
+        f"{counts[change]} {change}" for change in CHANGE_TYPES if counts.get(change)
+    )
+
+
+def diff_library(
+    old: Dict[str, DocumentState],
+    new: Iterable[Union[DocumentInfo, Dict]],
+    counts: Optional[Counter] = None,
+) -> Iterator[Dict[str, Optional[str]]]:
+    """Stream the changes between an indexed library and a newer one.
+
+    `new` is consumed one document at a time and each is looked up in `old` by
+    id, so the comparison is linear and only the old library is held in
+    memory. Documents left in `old` afterwards were removed, and are reported
+    last. `old` is emptied in the process.
+
+    Args:
+        old (Dict[str, DocumentState]): The older library, from `index_states`
+        new (Iterable): The newer library's documents
+        counts (Counter, optional): Incremented per change type as rows are yielded
+
+    Yields:
+        Dict: A `CHANGE_FIELDS` row per change
+    """
+    counts = Counter() if counts is None else counts
+
+    for document in new:
+        document_id, after = document_state(document)
+        before = old.pop(document_id, None)
+
+        if before is None:
+            changes = [
+                change_row("added", document_id, after.title, after=after.location)
+            ]
+        elif before == after:
+            continue
+        else:
+            changes = diff_states(document_id, before, after)
+
+        for change in changes:
+            counts[change["change"]] += 1
+            yield change
+
+    for document_id, before in old.items():
+        counts["removed"] += 1
+        yield change_row("removed", document_id, before.title, before=before.location)
+    old.clear()
@@ -0,0 +1,106 @@
+"""Provides code to format the display values of documents."""
+
+from datetime import datetime
+from typing import Dict, Optional, Union
+
+from dateutil import parser, tz
+
+emoji_mapping_category = {
+    "article": ":newspaper-emoji: article",
+    "email": ":envelope-emoji: email",
+    "rss": ":satellite_antenna-emoji: rss",
+    "highlight": ":crayon-emoji: highlight",
+    "note": ":memo-emoji: note",
+    "pdf": ":page_facing_up-emoji: pdf",
+    "epub": ":book-emoji: epub",
+    "tweet": ":bird-emoji: tweet",
+    "video": ":video_camera-emoji: video",
+    "podcast": ":headphones-emoji: podcast",
+    "audiobook": ":headphones-emoji: audiobook",
+}
+
+emoji_mapping_location = {
+    "new": ":star-emoji: new",
+    "later": ":clock2-emoji: later",
+    "archive": ":file_cabinet-emoji: archive",
+    "feed": ":inbox_tray-emoji: feed",
+}
+
+emoji_mapping = {
+    "category": emoji_mapping_category,
+    "location": emoji_mapping_location,
+}
+
+
+def format_reading_progress(reading_progress: float) -> str:
+    """Format reading progress percentage"""
+
+    percentage_str = f"{round(reading_progress * 100, 2)}%"
+    return percentage_str
+
+
+def format_published_date(timestamp_miliseconds: Union[float, str]) -> str | None:
+    """Format published date of a document"""
+
+    if isinstance(timestamp_miliseconds, float):
+        timestamp_seconds = (
+            timestamp_miliseconds / 1_000
+        )  # Convert microseconds to seconds
+
+        datetime_obj = datetime.fromtimestamp(timestamp_seconds, tz=tz.tzlocal())
+
+        return datetime_obj.strftime("%Y-%m-%d")
+
+    elif isinstance(timestamp_miliseconds, str):
+        return timestamp_miliseconds[:9]
+
+
+def format_updated_at_date(updated_at: str) -> str:
+    """Format updated at date"""
+
+    parsed_time = parser.isoparse(updated_at)
+
+    local_time = parsed_time.astimezone(tz.tzlocal())
+
+    return local_time.strftime("%Y-%m-%d")
+
+
+def display_fields(document: Dict) -> Dict[str, Optional[str]]:
+    """Preformat the display values of a serialized document.
+
+    Computed once when documents are cached and stored under the document's
+    `display` key, so rendering doesn't repeat date parsing and formatting.
+    """
+
+    tags = document.get("tags")
+    reading_progress = document.get("reading_progress")
+
+    return {
+        "category": emoji_mapping_category.get(document.get("category") or ""),
+        "location": emoji_mapping_location.get(document.get("location") or ""),
+        "tags": ", ".join(tags.keys() if isinstance(tags, dict) else tags)
+        if tags
+        else "",
+        "reading_progress": format_reading_progress(reading_progress)
+        if reading_progress is not None
+        else None,
+        "updated_at": format_updated_at_date(document["updated_at"])
+        if document.get("updated_at")
+        else None,
+        "published_date": format_published_date(document["published_date"])
+        if document.get("published_date")
+        else None,
+    }
+
+
+def with_display_fields(document: Dict) -> Dict:
+    """Attach preformatted display values to a serialized document"""
+
+    document["display"] = display_fields(document)
+    return document
+
+
+def get_display_fields(document: Dict) -> Dict[str, Optional[str]]:
+    """Display values of a document, computing them if they weren't cached"""
+
+    return document.get("display") or display_fields(document)
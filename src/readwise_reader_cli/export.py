@@ -0,0 +1,191 @@
+"""Provides code to write documents in machine-readable formats."""
+
+import csv
+import json
+from itertools import islice
+from typing import IO, Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import click
+
+from .models import DocumentInfo
+
+EXPORT_FORMATS = ("jsonl", "csv", "parquet", "arrow")
+BINARY_FORMATS = {"parquet", "arrow"}
+
+# `content`, `summary` and `notes` are left out unless asked for explicitly
+DEFAULT_FIELDS = (
+    "id",
+    "url",
+    "title",
+    "author",
+    "source",
+    "category",
+    "location",
+    "tags",
+    "site_name",
+    "word_count",
+    "created_at",
+    "updated_at",
+    "published_date",
+    "image_url",
+    "source_url",
+    "parent_id",
+    "reading_progress",
+)
+ALL_FIELDS = tuple(DocumentInfo.model_fields)
+
+ARROW_BATCH_SIZE = 10_000
+
+
+def resolve_fields(fields: Optional[Sequence[str]] = None) -> List[str]:
+    """Validate a field projection, defaulting to every field but the heavy ones.
+
+    Raises:
+        click.BadParameter: If a field isn't a `DocumentInfo` field
+    """
+    if not fields:
+        return list(DEFAULT_FIELDS)
+
+    names = [name.strip() for field in fields for name in field.split(",")]
+    unknown = [name for name in names if name not in ALL_FIELDS]
+    if unknown:
+        raise click.BadParameter(
+            f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(ALL_FIELDS)}"
+        )
+    return names
+
+
+def project(document: Union[DocumentInfo, Dict], fields: Sequence[str]) -> Dict:
+    """Reduce a document to `fields`, with tags flattened to a list of names.
+
+    Only the projected fields of a `DocumentInfo` are serialized, so heavy
+    fields cost nothing when they aren't exported.
+    """
+    if isinstance(document, DocumentInfo):
+        data = document.model_dump(mode="json", include=set(fields))
+    else:
+        data = document
+
+    row = {field: data.get(field) for field in fields}
+
+    tags = row.get("tags")
+    if isinstance(tags, dict):
+        row["tags"] = list(tags.keys())
+
+    return row
+
+
+def write_jsonl(rows: Iterable[Dict], out: IO[str]) -> int:
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(rows: Iterable[Dict], fields: Sequence[str], out: IO[str]) -> int:
+    writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+
+    count = 0
+    for row in rows:
+        if isinstance(row.get("tags"), list):
+            row["tags"] = ", ".join(row["tags"])
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def arrow_schema(fields: Sequence[str]) -> Any:
+    import pyarrow as pa
+
+    types = {
+        "tags": pa.list_(pa.string()),
+        "word_count": pa.int64(),
+        "reading_progress": pa.float64(),
+        "count": pa.int64(),
+    }
+    return pa.schema([(field, types.get(field, pa.string())) for field in fields])
+
+
+def write_arrow(
+    rows: Iterable[Dict], fields: Sequence[str], out: IO[bytes], file_format: str
+) -> int:
+    """Write rows as Arrow IPC stream or Parquet in fixed-size record batches."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise click.ClickException(
+            f"The {file_format} format requires pyarrow. "
+            "Install it with: pip install 'readwise-reader-cli[arrow]'"
+        ) from None
+
+    schema = arrow_schema(fields)
+
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(out, schema)
+    else:
+        writer = pa.ipc.new_stream(out, schema)
+
+    count = 0
+    row_iter = iter(rows)
+    with writer:
+        while True:
+            batch = list(islice(row_iter, ARROW_BATCH_SIZE))
+            if not batch:
+                break
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def write_rows(
+    rows: Iterable[Dict], fields: Sequence[str], file_format: str, output: str
+) -> int:
+    """Write rows to a file or stdout using the writer for `file_format`"""
+    if file_format in BINARY_FORMATS:
+        with click.open_file(output, "wb") as out:
+            return write_arrow(rows, fields, out, file_format)
+
+    with click.open_file(output, "w", encoding="utf-8") as out:
+        if file_format == "csv":
+            return write_csv(rows, fields, out)
+        return write_jsonl(rows, out)
+
+
+def export_documents(
+    documents: Iterable[Union[DocumentInfo, Dict]],
+    file_format: str = "jsonl",
+    output: str = "-",
+    fields: Optional[Sequence[str]] = None,
+) -> int:
+    """Stream documents to a file or stdout without building any renderables.
+
+    Args:
+        documents (Iterable): `DocumentInfo` objects or serialized documents
+        file_format (str): One of `EXPORT_FORMATS`
+        output (str): A file path, or "-" for stdout
+        fields (Sequence[str], optional): Fields to keep. Default: `DEFAULT_FIELDS`
+
+    Returns:
+        int: The number of documents written
+    """
+    fields = resolve_fields(fields)
+    rows = (project(document, fields) for document in documents)
+
+    return write_rows(rows, fields, file_format=file_format, output=output)
+
+
+def export_stats(
+    stats: Dict[str, int], file_format: str = "jsonl", output: str = "-"
+) -> int:
+    """Write `lib` counts as name/count rows, largest first."""
+    fields = ["name", "count"]
+    rows = (
+        {"name": name, "count": count}
+        for name, count in sorted(stats.items(), key=lambda item: item[1], reverse=True)
+    )
+
+    return write_rows(rows, fields, file_format=file_format, output=output)
@@ -1,75 +1,197 @@
 """Provides code to print layouts to the command-line."""
 
-from datetime import datetime
-from typing import Dict, List, Union
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-from dateutil import parser, tz
+import click
 from rich.align import Align
 from rich.console import Console, group
 from rich.rule import Rule
 from rich.table import Table
 from rich.text import Text
 
+from .diff import summarize
+from .display import emoji_mapping, emoji_mapping_category, get_display_fields
+from .store import CHILD_CATEGORIES
+
 console = Console()
 
-emoji_mapping_category = {
-    "article": ":newspaper-emoji: article",
-    "email": ":envelope-emoji: email",
-    "rss": ":satellite_antenna-emoji: rss",
-    "highlight": ":crayon-emoji: highlight",
-    "note": ":memo-emoji: note",
-    "pdf": ":page_facing_up-emoji: pdf",
-    "epub": ":book-emoji: epub",
-    "tweet": ":bird-emoji: tweet",
-    "video": ":video_camera-emoji: video",
-    "podcast": ":headphones-emoji: podcast",
-    "audiobook": ":headphones-emoji: audiobook",
-}
+# Fields read by the layouts, including those `display_fields` formats
+DOCUMENT_LAYOUT_FIELDS = (
+    "id",
+    "url",
+    "title",
+    "author",
+    "category",
+    "location",
+    "tags",
+    "summary",
+    "reading_progress",
+    "updated_at",
+    "published_date",
+)
+HIGHLIGHT_LAYOUT_FIELDS = (
+    "id",
+    "url",
+    "category",
+    "location",
+    "tags",
+    "content",
+    "updated_at",
+)
+
+
+def layout_fields(category: str = "") -> Tuple[str, ...]:
+    """Fields a layout shows for documents of `category`"""
+
+    if category in CHILD_CATEGORIES:
+        return HIGHLIGHT_LAYOUT_FIELDS
+    return DOCUMENT_LAYOUT_FIELDS
+
+
+# (header, justify, ratio, width) - ratio and width only apply to fixed tables
+HIGHLIGHT_COLUMNS = [
+    (":link: Highlight Link", "left", None, 6),
+    (":file_folder: Category", "center", None, 14),
+    (":clipboard: Content", "left", 4, None),
+    (":label: Tags", "left", 2, None),
+    (":world_map: Location", "center", None, 12),
+    (":clock1: Last Update", "right", None, 10),
+]
+
+DOCUMENT_COLUMNS = [
+    (":bookmark: Title", "left", 3, None),
+    (":bust_in_silhouette: Author", "left", 1, None),
+    (":file_folder: Category", "center", None, 14),
+    (":clipboard: Summary", "left", 4, None),
+    (":label: Tags", "left", 2, None),
+    (":world_map: Location", "center", None, 12),
+    (":hourglass: Reading Progress", "right", None, 9),
+    (":crayon: Highlights", "right", None, 10),
+    (":clock1: Last Update", "right", None, 10),
+]
+
+
+def add_table_columns(table: Table, category: str = "", fixed: bool = False) -> None:
+    """Add the columns for a category to a table.
+
+    With `fixed`, columns are sized from the console width instead of from
+    their content, so separately printed tables line up with each other.
+    """
+
+    columns = (
+        HIGHLIGHT_COLUMNS if category in ("note", "highlight") else DOCUMENT_COLUMNS
+    )
 
-emoji_mapping_location = {
-    "new": ":star-emoji: new",
-    "later": ":clock2-emoji: later",
-    "archive": ":file_cabinet-emoji: archive",
-    "feed": ":inbox_tray-emoji: feed",
-}
+    for header, justify, ratio, width in columns:
+        if fixed:
+            table.add_column(header, justify=justify, ratio=ratio, width=width)
+        else:
+            table.add_column(header, justify=justify)
 
-emoji_mapping = {
-    "category": emoji_mapping_category,
-    "location": emoji_mapping_location,
-}
 
+def highlight_table_row(document: Dict) -> Tuple:
+    """Build the table cells for a highlight or note"""
 
-def format_reading_progress(reading_progress: float) -> str:
-    """Format reading progress percentage"""
+    display = get_display_fields(document)
 
-    percentage_str = f"{round(reading_progress * 100, 2)}%"
-    return percentage_str
+    ctgry: Union[Text, str] = (
+        display["category"]
+        if document["location"] and display["category"]
+        else ":x: category"
+    )
+    content = Text(document["content"], style="#e4938e")
 
+    title = Text("link", style="#FFE761")
+    title.stylize(f"#FFE761 link {document['url']}")
 
-def format_published_date(timestamp_miliseconds: Union[float, str]) -> str | None:
-    """Format published date of a document"""
+    tags: Union[Text, str] = (
+        Text(display["tags"], style="#5278FE") if display["tags"] else ":x: tags"
+    )
 
-    if isinstance(timestamp_miliseconds, float):
-        timestamp_seconds = (
-            timestamp_miliseconds / 1_000
-        )  # Convert microseconds to seconds
+    location = display["location"] if display["location"] else ":x: None"
 
-        datetime_obj = datetime.fromtimestamp(timestamp_seconds, tz=tz.tzlocal())
+    last_update = Text(display["updated_at"] or "", no_wrap=True)
 
-        return datetime_obj.strftime("%Y-%m-%d")
+    return (
+        title,
+        ctgry,
+        content,
+        tags,
+        location,
+        last_update,
+    )
 
-    elif isinstance(timestamp_miliseconds, str):
-        return timestamp_miliseconds[:9]
 
+def document_table_row(document: Dict) -> Tuple:
+    """Build the table cells for a document"""
 
-def format_updated_at_date(updated_at: str) -> str:
-    """Format updated at date"""
+    display = get_display_fields(document)
 
-    parsed_time = parser.isoparse(updated_at)
+    author = (
+        Text(document["author"])
+        if document["author"]
+        else Text("no author", style="italic #EF476F")
+    )
+    ctgry = (
+        display["category"]
+        if display["category"]
+        else Text("no category", style="italic")
+    )
+    summary: Union[Text, str] = (
+        Text(document["summary"], style="#e4938e")
+        if document["summary"]
+        else ":x: no summary"
+    )
 
-    local_time = parsed_time.astimezone(tz.tzlocal())
+    reading_progress = Text(display["reading_progress"] or "", style="bold #06D6A0")
 
-    return local_time.strftime("%Y-%m-%d")
+    title = (
+        Text(document["title"], style="#FFE761")
+        if document["title"]
+        else Text("no title", style="italic #FFE761")
+    )
+    title.stylize(f"#FFE761 link {document['url']}")
+
+    tags: Union[Text, str] = (
+        Text(display["tags"], style="#5278FE") if display["tags"] else ":x: tags"
+    )
+
+    location = display["location"] if display["location"] else ":x: None"
+
+    highlight_count = document.get("highlight_count")
+    highlights = Text(
+        str(highlight_count) if highlight_count is not None else "", style="#e4938e"
+    )
+
+    last_update = Text(display["updated_at"] or "", no_wrap=True)
+
+    return (
+        title,
+        author,
+        ctgry,
+        summary,
+        tags,
+        location,
+        reading_progress,
+        highlights,
+        last_update,
+    )
+
+
+def table_rows(documents: Iterable[Dict], category: str = "") -> Iterator[Tuple]:
+    """Yield table rows, skipping highlights and notes unless they were asked for"""
+
+    if category in ("note", "highlight"):
+        for document in documents:
+            yield highlight_table_row(document)
+    else:
+        for document in documents:
+            if (
+                document["category"] == "highlight" or document["category"] == "note"
+            ):  # skip highlights and notes
+                continue
+            yield document_table_row(document)
 
 
 def table_layout(documents: List[Dict], category: str = ""):
@@ -77,129 +199,110 @@ def table_layout(documents: List[Dict], category: str = ""):
 
     table = Table(leading=1)
 
-    if category in ("note", "highlight"):
-        table.add_column(":link: Highlight Link")
-        table.add_column(":file_folder: Category", justify="center")
-        table.add_column(":clipboard: Content")
-        table.add_column(":label: Tags")
-        table.add_column(":world_map: Location", justify="center")
-        table.add_column(":clock1: Last Update", justify="right")
+    add_table_columns(table, category=category)
 
-        for document in documents:
-            ctgry: Union[Text, str] = (
-                emoji_mapping_category[document["category"]]
-                if document["location"]
-                else ":x: category"
-            )
-            content = Text(document["content"], style="#e4938e")
+    for row in table_rows(documents, category=category):
+        table.add_row(*row)
 
-            title = Text("link", style="#FFE761")
-            title.stylize(f"#FFE761 link {document['url']}")
-
-            if document["tags"]:
-                doc_tags: List[str] = list(document["tags"].keys())
-                list_of_tags = ", ".join([tag for tag in doc_tags])
+    console.print(table)
 
-                tags: Union[Text, str] = Text(list_of_tags, style="#5278FE")
-            else:
-                tags = ":x: tags"
 
-            location = (
-                emoji_mapping_location[document["location"]]
-                if document["location"]
-                else ":x: None"
-            )
+def stream_table_layout(
+    documents: Iterable[Dict], category: str = "", chunk_size: int = 50
+):
+    """Displays documents in a table, printing rows in chunks as they arrive.
 
-            last_update = Text(
-                format_updated_at_date(document["updated_at"]), no_wrap=True
-            )
+    Each chunk is printed as its own table with ratio sized columns, so rows
+    show up while the rest of the documents are still being fetched.
+    """
 
-            table.add_row(
-                title,
-                ctgry,
-                content,
-                tags,
-                location,
-                last_update,
-            )
+    rows = table_rows(documents, category=category)
+    show_header = True
 
-    else:
-        # make the columns
-        table.add_column(":bookmark: Title")
-        table.add_column(":bust_in_silhouette: Author")
-        table.add_column(":file_folder: Category", justify="center")
-        table.add_column(":clipboard: Summary")
-        table.add_column(":label: Tags")
-        table.add_column(":world_map: Location", justify="center")
-        table.add_column(":hourglass: Reading Progress", justify="right")
-        table.add_column(":clock1: Last Update", justify="right")
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
 
-        for document in documents:
-            if (
-                document["category"] == "highlight" or document["category"] == "note"
-            ):  # skip highlights and notes
-                continue
-            author = (
-                Text(document["author"])
-                if document["author"]
-                else Text("no author", style="italic #EF476F")
-            )
-            ctgry = (
-                emoji_mapping_category[document["category"]]
-                if document["category"]
-                else Text("no category", style="italic")
-            )
-            summary: Union[Text, str] = (
-                Text(document["summary"], style="#e4938e")
-                if document["summary"]
-                else ":x: no summary"
-            )
+        table = Table(leading=1, expand=True, show_header=show_header)
+        add_table_columns(table, category=category, fixed=True)
+        for row in chunk:
+            table.add_row(*row)
 
-            reading_progress = Text(
-                format_reading_progress(document["reading_progress"]),
-                style="bold #06D6A0",
-            )
+        console.print(table)
+        show_header = False
 
-            title = (
-                Text(document["title"], style="#FFE761")
-                if document["title"]
-                else Text("no title", style="italic #FFE761")
-            )
-            title.stylize(f"#FFE761 link {document['url']}")
 
-            if document["tags"]:
-                doc_tags = list(document["tags"].keys())
-                list_of_tags = ", ".join([tag for tag in doc_tags])
+BROWSE_KEYS = {
+    "j": 1,
+    "\x1b[B": 1,  # down arrow
+    "k": -1,
+    "\x1b[A": -1,  # up arrow
+}
+BROWSE_PAGE_KEYS = {
+    " ": 1,
+    "f": 1,
+    "\x1b[6~": 1,  # page down
+    "b": -1,
+    "\x1b[5~": -1,  # page up
+}
 
-                tags = Text(list_of_tags, style="#5278FE")
-            else:
-                tags = ":x: tags"
 
-            location = (
-                emoji_mapping_location[document["location"]]
-                if document["location"]
-                else ":x: None"
-            )
+def browse_layout(documents: Sequence[Dict], category: str = ""):
+    """Browse documents in an interactive, scrollable table.
 
-            last_update = Text(
-                format_updated_at_date(document["updated_at"]), no_wrap=True
-            )
+    Only the rows that fit on the screen are rendered, so scrolling stays fast
+    for libraries with tens of thousands of documents.
 
-            table.add_row(
-                title,
-                author,
-                ctgry,
-                summary,
-                tags,
-                location,
-                reading_progress,
-                last_update,
-            )
+    Keys: j/k or arrows to scroll, space/b to page, g/G for top/bottom, q to quit.
+    """
 
-    console.print(table)
+    if category not in ("note", "highlight"):
+        documents = [
+            document
+            for document in documents
+            if document["category"] not in ("highlight", "note")
+        ]
 
+    build_row = (
+        highlight_table_row if category in ("note", "highlight") else document_table_row
+    )
+    total = len(documents)
+    offset = 0
 
-def list_layout(documents: List[Dict], category: str = ""):
+    def render(height: int) -> Table:
+        table = Table(
+            expand=True,
+            caption=f"{offset + 1}-{min(offset + height, total)} of {total}",
+        )
+        add_table_columns(table, category=category, fixed=True)
+        for column in table.columns:
+            column.no_wrap = True
+        for document in documents[offset : offset + height]:
+            table.add_row(*build_row(document))
+        return table
+
+    with console.screen() as screen:
+        while True:
+            height = max(1, console.size.height - 5)  # borders, header and caption
+            screen.update(render(height))
+
+            key = click.getchar()
+            if key in ("q", "\x1b"):
+                break
+            elif key in BROWSE_KEYS:
+                offset += BROWSE_KEYS[key]
+            elif key in BROWSE_PAGE_KEYS:
+                offset += BROWSE_PAGE_KEYS[key] * height
+            elif key == "g":
+                offset = 0
+            elif key == "G":
+                offset = total - height
+
+            offset = max(0, min(offset, total - height))
+
+
+def list_layout(documents: Iterable[Dict], category: str = ""):
     """Display documents in a list layout using rich"""
 
     width = 88
@@ -215,12 +318,9 @@ def list_layout(documents: List[Dict], category: str = ""):
         title = Text(document["title"], overflow="fold", style="#FFE761")
         title.stylize(f"#FFE761 link {document['url']}")
 
-        reading_progress = format_reading_progress(document["reading_progress"])
-        date_range_col = (
-            format_published_date(document["published_date"])
-            if document["published_date"]
-            else "No Publish Date"
-        )
+        display = get_display_fields(document)
+        reading_progress = display["reading_progress"] or ""
+        date_range_col = display["published_date"] or "No Publish Date"
 
         title_table.add_row(title, Text(reading_progress, style="italic #06D6A0"))
         title_table.columns[1].no_wrap = True
@@ -238,13 +338,22 @@ def list_layout(documents: List[Dict], category: str = ""):
         summary_table.columns[1].justify = "right"
         yield summary_table
         yield ""
-        # tags
-        if document["tags"]:
-            doc_tags = list(document["tags"].keys())
-            list_of_tags = ", ".join([tag for tag in doc_tags])
-            yield Text(list_of_tags, style="#5278FE")
-        else:
-            yield ":x: No tags"
+        # tags, and highlights once the library is indexed
+        tags_table = Table.grid(padding=(0, 1))
+        tags_table.expand = True
+        tags_col = (
+            Text(display["tags"], style="#5278FE") if display["tags"] else ":x: No tags"
+        )
+        highlight_count = document.get("highlight_count")
+        highlights_col = (
+            Text(f"{highlight_count} highlight(s)", style="#e4938e")
+            if highlight_count is not None
+            else ""
+        )
+        tags_table.add_row(tags_col, highlights_col)
+        tags_table.columns[1].no_wrap = True
+        tags_table.columns[1].justify = "right"
+        yield tags_table
         yield ""
 
     def column(renderable):
@@ -261,8 +370,7 @@ def list_layout(documents: List[Dict], category: str = ""):
 
 
 def print_view_results(stats: Dict, view: str = ""):
-    if not view == "tags":
-        emojis = emoji_mapping[view]
+    emojis = emoji_mapping.get(view)
 
     table = Table(title=f"{view.title()} Breakdown")
 
@@ -274,15 +382,68 @@ def print_view_results(stats: Dict, view: str = ""):
     table.add_column("Count", justify="right", style="cyan", no_wrap=True)
 
     for name, value in sorted_tag_counts.items():
-        if view == "tags":
-            table.add_row(name, str(value))
-        else:
+        if emojis:
             table.add_row(emojis[name], str(value))
+        else:
+            table.add_row(name, str(value))
 
     console = Console()
     console.print(table)
 
 
+def print_series_results(series: Dict, title: str = "", value_name: str = "Count"):
+    """Print a time series in chronological order"""
+
+    table = Table(title=title)
+
+    table.add_column("Week", justify="left", no_wrap=True)
+    table.add_column(value_name, justify="right", style="cyan", no_wrap=True)
+
+    for week, value in series.items():
+        table.add_row(week, f"{value:.1%}" if isinstance(value, float) else str(value))
+
+    console.print(table)
+
+
+def print_activity_results(
+    activity: Dict[str, Dict[str, int]], period: str = "week"
+) -> None:
+    """Print saved, archived and read counts per period in chronological order"""
+
+    table = Table(title=f"Reading Activity per {period.title()}")
+
+    table.add_column(period.title(), justify="left", no_wrap=True)
+    table.add_column("Saved", justify="right", style="cyan", no_wrap=True)
+    table.add_column("Archived", justify="right", style="green", no_wrap=True)
+    table.add_column("Words Read", justify="right", style="magenta", no_wrap=True)
+
+    for start, counts in activity.items():
+        table.add_row(
+            start,
+            f"{counts['saved']:,}",
+            f"{counts['archived']:,}",
+            f"{counts['words_read']:,}",
+        )
+
+    console.print(table)
+
+
+def print_progress_results(progress: Dict[str, float]) -> None:
+    """Print the average reading progress per category, highest first"""
+
+    table = Table(title="Reading Progress by Category")
+
+    table.add_column("Category", justify="left", no_wrap=True)
+    table.add_column("Avg. Progress", justify="right", style="cyan", no_wrap=True)
+
+    for category, average in sorted(
+        progress.items(), key=lambda item: item[1], reverse=True
+    ):
+        table.add_row(emoji_mapping_category.get(category, category), f"{average:.1%}")
+
+    console.print(table)
+
+
 def print_results(
     docuemnts: List[Dict], page=False, layout: str = "", category: str = ""
 ) -> None:
@@ -300,3 +461,61 @@ def print_layout(documents: List[Dict], category: str = "", layout: str = "table
         list_layout(documents, category=category)
     else:
         table_layout(documents, category=category)
+
+
+def print_stream_results(
+    documents: Iterable[Dict], layout: str = "", category: str = ""
+) -> None:
+    """Print documents as they arrive instead of after all are fetched"""
+    if layout == "list":
+        list_layout(documents, category=category)  # already prints per document
+    else:
+        stream_table_layout(documents, category=category)
+
+
+CHANGE_STYLES = {  # change: (symbol, style)
+    "added": ("+", "green"),
+    "removed": ("-", "red"),
+    "moved": ("~", "yellow"),
+    "retagged": ("~", "cyan"),
+    "progress": ("~", "blue"),
+    "updated": ("~", "white"),
+}
+
+
+def print_changes(changes: Iterable[Dict], counts: Optional[Dict] = None) -> None:
+    """Print a library diff one line per change as the changes arrive"""
+    for change in changes:
+        symbol, style = CHANGE_STYLES[change["change"]]
+        line = Text(f"{symbol} {change['change']:<8} ", style=style)
+        line.append(change["title"] or change["id"])
+        if change["change"] in ("added", "removed"):
+            line.append(f"  {change['before'] or change['after'] or ''}", style="dim")
+        elif change["before"] or change["after"]:
+            line.append(
+                f"  {change['before'] or '-'} → {change['after'] or '-'}", style="dim"
+            )
+        console.print(line, soft_wrap=True)
+
+    if counts is not None:
+        console.print(summarize(counts) or "No changes", style="bold")
+
+
+PLAN_STYLES = {  # action: (symbol, style)
+    "new": ("+", "green"),
+    "exists": ("=", "dim"),
+    "changed": ("~", "yellow"),
+    "unchanged": ("=", "dim"),
+    "missing": ("?", "red"),
+}
+
+
+def print_plan(plan: Iterable) -> None:
+    """Print the requests of a bulk operation one line each, as they're planned"""
+    for request in plan:
+        symbol, style = PLAN_STYLES[request.action]
+        line = Text(f"{symbol} {request.action:<9} ", style=style)
+        line.append(request.title or request.id or "")
+        if request.detail:
+            line.append(f"  {request.detail}", style="dim")
+        console.print(line, soft_wrap=True)
@@ -0,0 +1,223 @@
+"""Provides an in-process memo of API listings, shared by identical requests."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+
+from .constants import QUERY_MEMO_DOCUMENTS, QUERY_MEMO_SIZE, QUERY_MEMO_TTL
+
+Pages = Iterator[List[dict]]
+
+
+class _Flight:
+    """The pages of one listing, fetched once for every caller reading it.
+
+    Whichever reader first needs a page that hasn't arrived fetches it while
+    the others wait for it, so concurrent identical requests share one fetch
+    and a reader that's ahead never waits on one that's behind.
+
+    Once detached from the memo, pages every reader has passed are dropped, so
+    a listing too large to keep streams in constant memory.
+    """
+
+    def __init__(self, source: Pages, max_documents: int, on_detach: Callable):
+        self.created = time.monotonic()
+        self.done = False  # no pages left to fetch
+        self.complete = False  # every page arrived, without an error
+        self.detached = False
+
+        self._source = source
+        self._max_documents = max_documents
+        self._on_detach = on_detach
+        self._lock = threading.Lock()  # guards the state below
+        self._fetch_lock = threading.Lock()  # held while fetching the next page
+        self._pages: List[List[dict]] = []
+        self._offset = 0  # pages dropped from the front
+        self._documents = 0
+        self._error: Optional[BaseException] = None
+        self._readers: Dict[int, int] = {}  # id of reader: its next page
+
+    def _page(self, position: int) -> Optional[List[dict]]:
+        # Called with the state lock held
+        if position < self._offset + len(self._pages):
+            return self._pages[position - self._offset]
+        if self._error is not None:
+            raise self._error
+        return None
+
+    def _fetch(self, position: int) -> Optional[List[dict]]:
+        with self._fetch_lock:
+            with self._lock:  # fetched by another reader while waiting
+                page = self._page(position)
+                if page is not None or self.done:
+                    return page
+
+            try:
+                page = next(self._source)
+            except StopIteration as e:
+                with self._lock:
+                    self.done = True
+                    # Sources return False when they stopped on an error
+                    self.complete = e.value is not False
+                return None
+            except BaseException as e:
+                with self._lock:
+                    self.done = True
+                    self._error = e
+                raise
+
+            with self._lock:
+                self._pages.append(page)
+                self._documents += len(page)
+                oversized = not self.detached and (
+                    self._documents > self._max_documents
+                )
+        if oversized:
+            self._on_detach(self)
+        return page
+
+    def read(self) -> "_Reader":
+        """A reader of the listing's pages from the first, fetching them as needed"""
+        return _Reader(self)
+
+    def _register(self, reader: "_Reader") -> None:
+        with self._lock:
+            self._readers[id(reader)] = 0
+
+    def _unregister(self, reader: "_Reader") -> None:
+        with self._lock:
+            self._readers.pop(id(reader), None)
+            self._trim()
+
+    def _next(self, reader: "_Reader") -> Optional[List[dict]]:
+        with self._lock:
+            page = self._page(reader.position)
+            done = self.done
+        if page is None and not done:
+            page = self._fetch(reader.position)
+        if page is None:
+            return None
+
+        reader.position += 1
+        with self._lock:
+            self._readers[id(reader)] = reader.position
+            self._trim()
+        return page
+
+    def detach(self) -> None:
+        with self._lock:
+            self.detached = True
+            self._trim()
+
+    def _trim(self) -> None:
+        # Called with the state lock held
+        if not self.detached:
+            return
+        passed = min(self._readers.values(), default=self._offset + len(self._pages))
+        if passed > self._offset:
+            del self._pages[: passed - self._offset]
+            self._offset = passed
+
+
+class _Reader:
+    """Iterates over a flight's pages, and holds the pages it hasn't read yet.
+
+    Registered as soon as it's created, so the pages can't be dropped before
+    it starts reading, and unregistered once exhausted or garbage collected.
+    """
+
+    def __init__(self, flight: _Flight):
+        self.position = 0
+        self._flight: Optional[_Flight] = flight
+        flight._register(self)
+
+    def __iter__(self) -> "_Reader":
+        return self
+
+    def __next__(self) -> List[dict]:
+        if self._flight is None:
+            raise StopIteration
+        page = self._flight._next(self)
+        if page is None:
+            self.close()
+            raise StopIteration
+        return page
+
+    def close(self) -> None:
+        if self._flight is not None:
+            self._flight._unregister(self)
+            self._flight = None
+
+    def __del__(self) -> None:
+        self.close()
+
+
+class QueryMemo:
+    """Recent listings by their normalized parameters, with single-flight fetching.
+
+    A listing requested again within `ttl` seconds is served from memory, and
+    one requested while it's being fetched is read from the same fetch, page
+    by page. The `max_entries` most recently used listings are kept. Listings
+    larger than `max_documents`, or that stopped on an error, aren't kept.
+
+    Args:
+        ttl (float): Seconds a listing is served from memory
+        max_entries (int): Listings kept at once
+        max_documents (int): Documents a kept listing may have
+    """
+
+    def __init__(
+        self,
+        ttl: float = QUERY_MEMO_TTL,
+        max_entries: int = QUERY_MEMO_SIZE,
+        max_documents: int = QUERY_MEMO_DOCUMENTS,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_documents = max_documents
+        self._flights: OrderedDict[Hashable, _Flight] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh(self, flight: _Flight) -> bool:
+        if flight.detached or time.monotonic() - flight.created > self.ttl:
+            return False
+        # Listings still arriving are shared, failed ones are fetched again
+        return flight.complete or not flight.done
+
+    def pages(self, key: Hashable, fetch: Callable[[], Pages]) -> Pages:
+        """Pages of the listing `key`, fetched with `fetch` unless memoized"""
+        evicted = []
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None or not self._fresh(flight):
+                if flight is not None:
+                    evicted.append(flight)
+                flight = _Flight(fetch(), self.max_documents, self._discard)
+                self._flights[key] = flight
+            self._flights.move_to_end(key)
+            while len(self._flights) > self.max_entries:
+                evicted.append(self._flights.popitem(last=False)[1])
+            # Read before the flight can be detached and drop its first pages
+            reader = flight.read()
+
+        # Outside the memo's lock, as flights call back into it
+        for old in evicted:
+            old.detach()
+        return reader
+
+    def _discard(self, flight: _Flight) -> None:
+        with self._lock:
+            for key, kept in self._flights.items():
+                if kept is flight:
+                    del self._flights[key]
+                    break
+        flight.detach()
+
+    def clear(self) -> None:
+        """Forget every listing, e.g. after documents were saved or updated"""
+        with self._lock:
+            flights = [*self._flights.values()]
+            self._flights.clear()
+        for flight in flights:
+            flight.detach()
@@ -46,6 +46,16 @@ class ListParameters(BaseModel):
     category: Optional[CategoryEnum] = None
     location: Optional[LocationEnum] = None
     next_page_cursor: Optional[str] = Field(None, serialization_alias="pageCursor")
+    tag: Optional[List[str]] = Field(None, max_length=5)
+    limit: Optional[int] = Field(None, ge=1, le=100)
+    with_html_content: Optional[bool] = Field(
+        None, serialization_alias="withHtmlContent"
+    )
+
+    @field_serializer("with_html_content")
+    def serialize_flag(self, flag: Optional[bool]):
+        # Sent as a query string flag, which the API reads lowercase
+        return None if flag is None else str(flag).lower()
 
 
 class DocumentInfo(BaseModel):
@@ -65,6 +75,7 @@ class DocumentInfo(BaseModel):
     summary: Optional[str] = None
     image_url: Optional[Union[AnyUrl, str, None]] = None
     content: Optional[str] = None
+    html_content: Optional[str] = None  # only listed when asked for
     source_url: Optional[AnyUrl] = None
     notes: Optional[str] = None
     parent_id: Optional[str] = None
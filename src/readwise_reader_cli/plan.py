@@ -0,0 +1,177 @@
+"""Provides code to plan bulk saves and updates against the synced library."""
+
+from collections import Counter
+from typing import Collection, Dict, Iterable, Iterator, NamedTuple, Optional
+
+from .api import RATE_LIMITS
+from .constants import CREATE_ENDPOINT, MAX_WORKERS, UPDATE_ENDPOINT
+from .models import DocumentInfo
+from .reading_list.enrich import canonicalize_url
+
+REQUEST_LATENCY = 0.5  # Seconds, a typical round trip to Reader
+
+PLAN_ACTIONS = ("new", "exists", "changed", "unchanged", "missing")
+# Actions of requests Reader answers without changing anything, by endpoint
+NO_OP_ACTIONS = {CREATE_ENDPOINT: {"exists", "changed"}, UPDATE_ENDPOINT: {"unchanged"}}
+
+
+class PlannedRequest(NamedTuple):
+    """A request a bulk operation would send, and what it would do."""
+
+    endpoint: str
+    action: str  # new, exists or changed for saves, changed, unchanged or missing for updates
+    id: Optional[str]
+    title: str
+    detail: str = ""
+
+
+def _tag_names(tags) -> tuple:
+    # Tags are a list of names, or a dict keyed by name
+    return tuple(tags.keys() if isinstance(tags, dict) else tags or ())
+
+
+def _planned(document: Dict) -> Dict:
+    # Only what plans compare, so large libraries can be held in memory
+    return {
+        "id": document.get("id"),
+        "title": document.get("title"),
+        "location": document.get("location"),
+        "tags": _tag_names(document.get("tags")),
+    }
+
+
+def library_by_url(documents: Iterable[Dict]) -> Dict[str, Dict]:
+    """The synced library's documents by canonical URL, without highlights and notes"""
+    library = {}
+    for document in documents:
+        url = document.get("source_url") or document.get("url")
+        if not url or document.get("parent_id"):
+            continue
+        try:
+            library[canonicalize_url(url)] = _planned(document)
+        except ValueError:
+            continue
+    return library
+
+
+def library_by_id(documents: Iterable[Dict], ids: Collection[str]) -> Dict[str, Dict]:
+    """The synced library's documents among `ids`, by id"""
+    return {
+        document["id"]: _planned(document)
+        for document in documents
+        if document.get("id") in ids
+    }
+
+
+def plan_saves(
+    documents: Iterable[DocumentInfo], library: Dict[str, Dict]
+) -> Iterator[PlannedRequest]:
+    """Classify each document to save as new, or already saved.
+
+    Saving a URL Reader already has returns the stored document unchanged, so
+    documents that exist with another title or more tags are "changed" only
+    in that their values wouldn't be applied.
+    """
+    for document in documents:
+        url = canonicalize_url(str(document.url))
+        stored = library.get(url)
+        if stored is None:
+            yield PlannedRequest(CREATE_ENDPOINT, "new", None, document.title or url)
+            continue
+
+        differences = []
+        if document.title and stored["title"] and document.title != stored["title"]:
+            differences.append(f"title: {stored['title']} ≠ {document.title}")
+        missing = [
+            tag for tag in _tag_names(document.tags) if tag not in stored["tags"]
+        ]
+        if missing:
+            differences.append(f"tags: +{', +'.join(missing)}")
+
+        yield PlannedRequest(
+            CREATE_ENDPOINT,
+            "changed" if differences else "exists",
+            stored["id"],
+            stored["title"] or url,
+            "; ".join(differences),
+        )
+
+
+def plan_updates(
+    document_ids: Iterable[str], data: Dict, library: Dict[str, Dict]
+) -> Iterator[PlannedRequest]:
+    """Classify each update of `data` as changing its document or not.
+
+    Documents missing from the synced library are still updated, but what
+    Reader would answer isn't known.
+    """
+    for document_id in document_ids:
+        stored = library.get(document_id)
+        if stored is None:
+            yield PlannedRequest(UPDATE_ENDPOINT, "missing", document_id, document_id)
+            continue
+
+        differences = []
+        for field, value in data.items():
+            before = stored.get(field)
+            if field == "tags":
+                # Order doesn't matter, the tags are replaced as a whole
+                before, value = ", ".join(sorted(before)), ", ".join(sorted(value))
+            if before != value:
+                differences.append(f"{field}: {before or '-'} → {value or '-'}")
+
+        yield PlannedRequest(
+            UPDATE_ENDPOINT,
+            "changed" if differences else "unchanged",
+            document_id,
+            stored["title"] or document_id,
+            "; ".join(differences),
+        )
+
+
+def estimate_duration(requests: Dict[str, int], workers: int = MAX_WORKERS) -> float:
+    """Seconds requests to each endpoint take at least, one endpoint after another.
+
+    Rate-limited endpoints start a request every `60 / rate` seconds, however
+    many workers send them. Others are bounded by each worker's round trips.
+    Throttled responses, which pause an endpoint, aren't accounted for.
+
+    Args:
+        requests (Dict[str, int]): Requests by endpoint, e.g. counts of
+            `summarize_plan`. Other keys are ignored
+        workers (int): Number of concurrent requests
+    """
+    seconds = 0.0
+    for endpoint, rate in RATE_LIMITS.items():
+        count = requests.get(endpoint, 0)
+        if not count:
+            continue
+        paced = (count - 1) * 60 / rate if rate else 0.0
+        seconds += max(paced + REQUEST_LATENCY, count * REQUEST_LATENCY / workers)
+    return seconds
+
+
+def format_duration(seconds: float) -> str:
+    """A rough duration, e.g. "about 2 h 5 min" """
+    if seconds < 60:
+        return "under a minute"
+    minutes = round(seconds / 60)
+    if minutes < 60:
+        return f"about {minutes} min"
+    return f"about {minutes // 60} h {minutes % 60} min"
+
+
+def summarize_plan(
+    plan: Iterable[PlannedRequest], counts: Optional[Counter] = None
+) -> Iterator[PlannedRequest]:
+    """Pass planned requests through, counting them per action and endpoint.
+
+    Requests that wouldn't change anything are also counted as "no_op".
+    """
+    counts = Counter() if counts is None else counts
+    for request in plan:
+        counts[request.action] += 1
+        counts[request.endpoint] += 1
+        if request.action in NO_OP_ACTIONS[request.endpoint]:
+            counts["no_op"] += 1
+        yield request
@@ -0,0 +1,84 @@
+"""Provides named profiles, each with its own Reader token, caches and rate limits."""
+
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from xdg_base_dirs import xdg_data_home
+
+DATA_DIR = xdg_data_home() / "reader"
+PROFILES_DIR = DATA_DIR / "profiles"
+
+DEFAULT_PROFILE = "default"
+TOKEN_VARIABLE = "READER_API_TOKEN"
+PROFILE_NAME = re.compile(r"^[a-z0-9_]+$")
+
+_profile = DEFAULT_PROFILE
+_local = threading.local()
+
+
+def get_profile() -> str:
+    return getattr(_local, "profile", None) or _profile
+
+
+def set_profile(profile: str) -> None:
+    """Use the token and caches of `profile` for all following requests"""
+    global _profile
+    _profile = profile
+
+
+@contextmanager
+def use_profile(profile: str) -> Iterator[str]:
+    """Switch the current thread to `profile`, e.g. to sync profiles in parallel.
+
+    Threads started inside the block keep using the profile set with
+    `set_profile`.
+    """
+    previous = getattr(_local, "profile", None)
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+
+
+def token_variable(profile: Optional[str] = None) -> str:
+    """Environment variable holding a profile's token, e.g. READER_API_TOKEN_WORK"""
+    profile = profile or get_profile()
+    if profile == DEFAULT_PROFILE:
+        return TOKEN_VARIABLE
+    return f"{TOKEN_VARIABLE}_{profile.upper()}"
+
+
+def get_token(profile: Optional[str] = None) -> Optional[str]:
+    return os.getenv(token_variable(profile))
+
+
+def cache_dir(profile: Optional[str] = None) -> Path:
+    """Where a profile's caches are stored.
+
+    The default profile keeps the directory caches were stored in before
+    profiles existed, the others get a directory each under it.
+    """
+    profile = profile or get_profile()
+    if profile == DEFAULT_PROFILE:
+        return DATA_DIR
+    return PROFILES_DIR / profile
+
+
+def list_profiles() -> List[str]:
+    """Profiles with a token set, the default one first"""
+    prefix = f"{TOKEN_VARIABLE}_"
+    profiles = sorted(
+        name[len(prefix) :].lower()
+        for name, value in os.environ.items()
+        if name.startswith(prefix)
+        and value
+        and PROFILE_NAME.match(name[len(prefix) :].lower())
+    )
+    if os.getenv(TOKEN_VARIABLE):
+        profiles.insert(0, DEFAULT_PROFILE)
+    return profiles
@@ -0,0 +1,191 @@
+"""Provides code to split a document listing between the Reader API and the client."""
+
+import copy
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Sequence, Union
+
+from dateutil import parser
+
+from .constants import LIST_PAGE_LIMIT, LIST_TAG_LIMIT
+from .models import CategoryEnum, ListParameters, LocationEnum
+
+# Kept by every projection, so results can still be filtered and displayed
+QUERY_FIELDS = frozenset(
+    {"id", "url", "category", "location", "tags", "parent_id", "updated_at"}
+)
+
+
+def _tag_names(tags) -> Iterable[str]:
+    # Tags are a list of names, or a dict keyed by name
+    return tags.keys() if isinstance(tags, dict) else tags or ()
+
+
+class DocumentQuery:
+    """Filters, limit and field projection of a document listing.
+
+    Filters the list endpoint supports are sent with the request. The rest are
+    applied to each raw document as its page arrives, and the projection drops
+    fields nobody reads before documents are validated, so neither costs more
+    than a dict lookup per document.
+
+    Args:
+        id (str, optional): document unique identifier
+        category (str, optional): The category to filter documents by
+        location (str, optional): The location to filter documents by
+        updated_after (datetime, optional): Update after datetime object
+        tags (Sequence[str]): Tags documents must all have
+        any_tags (Sequence[str]): Tags documents must have at least one of
+        exclude_tags (Sequence[str]): Tags documents must have none of
+        limit (int, optional): Stop after this many matching documents
+        fields (Iterable[str], optional): Fields to keep. Default: all
+        exclude_categories (Sequence[str]): Categories to leave out
+        with_html_content (bool): Have the API include each document's HTML
+    """
+
+    def __init__(
+        self,
+        id: Optional[str] = None,
+        category: Optional[Union[CategoryEnum, str]] = None,
+        location: Optional[Union[LocationEnum, str]] = None,
+        updated_after: Optional[datetime] = None,
+        tags: Sequence[str] = (),
+        any_tags: Sequence[str] = (),
+        exclude_tags: Sequence[str] = (),
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+        exclude_categories: Sequence[str] = (),
+        with_html_content: bool = False,
+    ):
+        self.id = id
+        self.category = category
+        self.location = location
+        self.updated_after = updated_after
+        self.tags = tuple(dict.fromkeys(tags))
+        self.any_tags = tuple(dict.fromkeys(any_tags))
+        self.exclude_tags = tuple(dict.fromkeys(exclude_tags))
+        self.limit = limit
+        self.fields = QUERY_FIELDS.union(fields) if fields is not None else None
+        self.exclude_categories = tuple(exclude_categories)
+        self.with_html_content = with_html_content
+
+    @property
+    def tag_filtered(self) -> bool:
+        return bool(self.tags or self.any_tags or self.exclude_tags)
+
+    @property
+    def _pushed_tags(self) -> Sequence[str]:
+        # The API only takes tags documents must all have
+        if not self.tags and len(self.any_tags) == 1:
+            return self.any_tags
+        return self.tags[:LIST_TAG_LIMIT]
+
+    @property
+    def client_filtered(self) -> bool:
+        """Whether `residual` can reject documents the API returns"""
+        return bool(
+            self.exclude_categories
+            or len(self.tags) > LIST_TAG_LIMIT
+            or self.exclude_tags
+            or (self.any_tags and tuple(self._pushed_tags) != self.any_tags)
+        )
+
+    def parameters(self) -> Dict:
+        """List endpoint parameters for the filters the API applies itself"""
+        params = ListParameters(
+            id=self.id,
+            category=self.category,
+            location=self.location,
+            update_after=self.updated_after,
+            tag=list(self._pushed_tags) or None,
+            # Pages as small as the limit would fall short when the client
+            # filters documents out, so those get full pages instead
+            limit=(
+                min(self.limit, LIST_PAGE_LIMIT)
+                if self.limit and not self.client_filtered
+                else None
+            ),
+            next_page_cursor=None,
+            with_html_content=self.with_html_content or None,
+        )
+        return params.model_dump(exclude_unset=True, mode="json", by_alias=True)
+
+    def residual(self, document: Dict) -> bool:
+        """Whether a document fetched with `parameters` passes the other filters"""
+        if document.get("category") in self.exclude_categories:
+            return False
+        if self.client_filtered:
+            return self._matches_tags(document)
+        return True
+
+    def matches(self, document: Dict, include_time: bool = False) -> bool:
+        """Whether a document fetched without `parameters` passes every filter.
+
+        The update time is only checked with `include_time`, as such documents
+        are usually fetched to find what changed since a result set was cached.
+        """
+        if self.id and document.get("id") != self.id:
+            return False
+        if self.category and document.get("category") != self.category:
+            return False
+        if self.location and document.get("location") != self.location:
+            return False
+        if document.get("category") in self.exclude_categories:
+            return False
+        if include_time and self.updated_after and not self._updated(document):
+            return False
+        return self._matches_tags(document)
+
+    def _matches_tags(self, document: Dict) -> bool:
+        names = set(_tag_names(document.get("tags")))
+        return (
+            all(tag in names for tag in self.tags)
+            and (not self.any_tags or any(tag in names for tag in self.any_tags))
+            and not any(tag in names for tag in self.exclude_tags)
+        )
+
+    def _updated(self, document: Dict) -> bool:
+        if not document.get("updated_at"):
+            return False
+        # Naive times are read as UTC, like the API does
+        updated_after = self.updated_after
+        if updated_after.tzinfo is None:
+            updated_after = updated_after.replace(tzinfo=timezone.utc)
+        updated_at = parser.isoparse(document["updated_at"])
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return updated_at > updated_after
+
+    def project(self, document: Dict) -> Dict:
+        """Drop the fields a raw document doesn't need to keep"""
+        if self.fields is None:
+            return document
+        return {key: value for key, value in document.items() if key in self.fields}
+
+    def unfiltered(self, updated_after: Optional[datetime] = None) -> "DocumentQuery":
+        """The same projection over every document updated after `updated_after`"""
+        return DocumentQuery(updated_after=updated_after, fields=self.fields)
+
+    def updated_since(self, updated_after: datetime) -> "DocumentQuery":
+        """This query, unlimited, over the documents updated after `updated_after`"""
+        query = copy.copy(self)
+        query.updated_after = updated_after
+        query.limit = None
+        return query
+
+    @property
+    def variant(self) -> str:
+        """Tells apart cached result sets of the same category, location and date"""
+        variant = ""
+        if self.tags:
+            variant += f"_tag={'+'.join(self.tags)}"
+        if self.any_tags:
+            variant += f"_anytag={'+'.join(self.any_tags)}"
+        if self.exclude_tags:
+            variant += f"_nottag={'+'.join(self.exclude_tags)}"
+        if self.exclude_categories:
+            variant += f"_not={'+'.join(self.exclude_categories)}"
+        if self.fields is not None:
+            digest = hashlib.sha1(",".join(sorted(self.fields)).encode()).hexdigest()
+            variant += f"_fields={digest[:8]}"
+        return variant
@@ -1,3 +1,12 @@
-from .extractors import build_reading_list
+from .enrich import RejectedEntry, TitleCache, enrich_reading_list, write_rejects
+from .extractors import ReadingListEntry, build_reading_list, iter_reading_list
 
-__all__ = ["build_reading_list"]
+__all__ = [
+    "ReadingListEntry",
+    "RejectedEntry",
+    "TitleCache",
+    "build_reading_list",
+    "enrich_reading_list",
+    "iter_reading_list",
+    "write_rejects",
+]
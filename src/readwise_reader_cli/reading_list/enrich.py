@@ -0,0 +1,249 @@
+"""Provides code to validate, canonicalize and enrich reading list rows before upload."""
+
+import csv
+import multiprocessing
+import os
+import sqlite3
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Union
+from urllib.parse import urlsplit, urlunsplit
+
+from pydantic import ValidationError
+
+from ..models import DocumentInfo
+from ..profiles import cache_dir
+from .extractors import ReadingListEntry
+
+CHUNK_SIZE = 1_000  # Rows validated per task
+PARALLEL_THRESHOLD = 20  # Chunks needed before starting a process pool
+LOOKUP_SIZE = 500  # URLs per title lookup query
+
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref_src"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class RejectedEntry(NamedTuple):
+    row: int
+    url: Optional[str]
+    title: Optional[str]
+    reason: str
+
+
+def _is_tracking(param: str) -> bool:
+    name = param.split("=", 1)[0].lower()
+    return name.startswith("utm_") or name in TRACKING_PARAMS
+
+
+def canonicalize_url(url: str) -> str:
+    """Canonical form of a URL, so the same page is recognized however it's written.
+
+    The scheme and host are lower-cased, default ports, tracking parameters and
+    fragments are dropped, and `https://` is assumed when there's no scheme.
+    Fragments that look like client-side routes (`#/...`, `#!...`) are kept.
+
+    Raises:
+        ValueError: If the URL has no host or an invalid port
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = f"https://{url}"
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if not host:
+        raise ValueError("URL has no host")
+    if ":" in host:  # IPv6
+        host = f"[{host}]"
+
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+
+    query = "&".join(
+        param for param in parts.query.split("&") if param and not _is_tracking(param)
+    )
+    fragment = parts.fragment if parts.fragment[:1] in ("/", "!") else ""
+
+    return urlunsplit((scheme, netloc, parts.path or "/", query, fragment))
+
+
+def _reason(error: ValueError) -> str:
+    if isinstance(error, ValidationError):
+        return error.errors()[0]["msg"]
+    return str(error)
+
+
+def normalize_entries(
+    entries: Sequence[ReadingListEntry],
+) -> List[Union[DocumentInfo, RejectedEntry]]:
+    """Validate and canonicalize a chunk of rows; runs in a worker process"""
+    results: List[Union[DocumentInfo, RejectedEntry]] = []
+    for entry in entries:
+        title = (entry.title or "").strip() or None
+        if not entry.url or not entry.url.strip():
+            results.append(RejectedEntry(entry.row, entry.url, title, "Missing URL"))
+            continue
+
+        try:
+            results.append(DocumentInfo(url=canonicalize_url(entry.url), title=title))
+        except ValueError as e:  # includes ValidationError
+            results.append(RejectedEntry(entry.row, entry.url, title, _reason(e)))
+
+    return results
+
+
+def _normalize_chunks(
+    entries: Iterable[ReadingListEntry], processes: Optional[int] = None
+) -> Iterator[List[Union[DocumentInfo, RejectedEntry]]]:
+    """Normalize rows chunk by chunk, in order.
+
+    Small inputs are handled in-process. Larger ones are spread over a process
+    pool with a bounded number of chunks in flight, so memory use doesn't grow
+    with the input.
+    """
+    entries = iter(entries)
+    chunks = iter(lambda: list(islice(entries, CHUNK_SIZE)), [])
+
+    head = list(islice(chunks, PARALLEL_THRESHOLD))
+    if len(head) < PARALLEL_THRESHOLD:
+        for chunk in head:
+            yield normalize_entries(chunk)
+        return
+
+    processes = processes or os.cpu_count() or 1
+    # Spawned workers don't inherit the upload's threads and connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+        pending: deque = deque()
+        for chunk in chain(head, chunks):
+            if len(pending) >= processes * 2:
+                yield pending.popleft().result()
+            pending.append(pool.submit(normalize_entries, chunk))
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def url_cache_path():
+    return cache_dir() / "urls.sqlite"
+
+
+class TitleCache:
+    """Titles of previously seen URLs, keyed by canonical URL.
+
+    Filled from the synced library and from every titled reading list row, so
+    rows without a title can be given one without fetching the page.
+    """
+
+    def __init__(self, path=None):
+        path = path or url_cache_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS titles (url TEXT PRIMARY KEY, title TEXT);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        )
+
+    def lookup(self, urls: Sequence[str]) -> Dict[str, str]:
+        titles = {}
+        for start in range(0, len(urls), LOOKUP_SIZE):
+            batch = urls[start : start + LOOKUP_SIZE]
+            rows = self.connection.execute(
+                f"SELECT url, title FROM titles WHERE url IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            titles.update(rows)
+        return titles
+
+    def remember(self, titles: Iterable[tuple]) -> None:
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO titles VALUES (?, ?)", titles
+        )
+        self.connection.commit()
+
+    def seed(self, documents: Iterable[dict], version: str) -> None:
+        """Add the titles of a synced library, once per library `version`"""
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'library'"
+        ).fetchone()
+        if row and row[0] == version:
+            return
+
+        def titles():
+            for document in documents:
+                url, title = document.get("source_url"), document.get("title")
+                if url and title and not document.get("parent_id"):
+                    try:
+                        yield canonicalize_url(url), title
+                    except ValueError:
+                        continue
+
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO titles VALUES (?, ?)", titles()
+        )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('library', ?)", (version,)
+        )
+        self.connection.commit()
+
+
+def enrich_reading_list(
+    entries: Iterable[ReadingListEntry],
+    titles: TitleCache,
+    rejected: Optional[List[RejectedEntry]] = None,
+    counts: Optional[Counter] = None,
+    processes: Optional[int] = None,
+) -> Iterator[DocumentInfo]:
+    """Turn reading list rows into documents ready to upload.
+
+    URLs are validated and canonicalized in bulk, repeated URLs are dropped,
+    and missing titles are filled from `titles`. Invalid rows are appended to
+    `rejected` instead of stopping the upload.
+
+    Args:
+        entries (Iterable[ReadingListEntry]): Rows from `iter_reading_list`
+        titles (TitleCache): Titles of previously seen URLs
+        rejected (List[RejectedEntry], optional): Collects the invalid rows
+        counts (Counter, optional): Incremented for "duplicates" and "titled" rows
+        processes (int, optional): Size of the process pool for large inputs
+
+    Yields:
+        DocumentInfo: A `DocumentInfo` object per unique, valid URL
+    """
+    counts = Counter() if counts is None else counts
+    seen = set()
+
+    for results in _normalize_chunks(entries, processes=processes):
+        documents = []
+        for result in results:
+            if isinstance(result, RejectedEntry):
+                if rejected is not None:
+                    rejected.append(result)
+                continue
+
+            url = str(result.url)
+            if url in seen:
+                counts["duplicates"] += 1
+                continue
+            seen.add(url)
+            documents.append(result)
+
+        known = titles.lookup([str(doc.url) for doc in documents if not doc.title])
+        titles.remember((str(doc.url), doc.title) for doc in documents if doc.title)
+
+        for doc in documents:
+            if not doc.title and str(doc.url) in known:
+                doc.title = known[str(doc.url)]
+                counts["titled"] += 1
+            yield doc
+
+
+def write_rejects(path: str, rejected: Iterable[RejectedEntry]) -> None:
+    """Write rejected rows as CSV, with the reason each was rejected"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(RejectedEntry._fields)
+        writer.writerows(rejected)
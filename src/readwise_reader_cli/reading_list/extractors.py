@@ -1,19 +1,33 @@
 import csv
 from abc import ABC, abstractmethod
-from typing import Any, List
+from typing import Any, Iterator, List, NamedTuple, Optional
 
 from bs4 import BeautifulSoup
 
 from ..models import DocumentInfo
 
 
+class ReadingListEntry(NamedTuple):
+    """A reading list row, before its URL is validated"""
+
+    row: int
+    url: Optional[str]
+    title: Optional[str]
+
+
 class ReadingListExtractor(ABC):
     """Abstract class for ReadingListExtractors"""
 
     @abstractmethod
-    def extract_document_info(self, input_file: str) -> List[DocumentInfo]:
+    def extract_entries(self, input_file: str) -> Iterator[ReadingListEntry]:
         pass
 
+    def extract_document_info(self, input_file: str) -> List[DocumentInfo]:
+        return [
+            DocumentInfo(title=entry.title, url=entry.url)
+            for entry in self.extract_entries(input_file)
+        ]
+
 
 class HTMLReadingListExtractor(ReadingListExtractor):
     """
@@ -28,22 +42,17 @@ class HTMLReadingListExtractor(ReadingListExtractor):
             </DL><p>
     """
 
-    def extract_document_info(self, input_file: str) -> List[DocumentInfo]:
-        documents = []
-
+    def extract_entries(self, input_file: str) -> Iterator[ReadingListEntry]:
         with open(input_file, "r") as f:
             content = f.read()
 
-            soup = BeautifulSoup(content, "html.parser")
-
-            for link in soup.find_all("a"):
-                url = link.get("href")
-                title = link.get_text()
+        soup = BeautifulSoup(content, "html.parser")
 
-                document = DocumentInfo(title=title, url=url)
-                documents.append(document)
+        for row, link in enumerate(soup.find_all("a"), start=1):
+            url = link.get("href")
+            title = link.get_text()
 
-        return documents
+            yield ReadingListEntry(row=row, url=url, title=title)
 
 
 class CSVReadingListExtractor(ReadingListExtractor):
@@ -56,21 +65,18 @@ class CSVReadingListExtractor(ReadingListExtractor):
             https://www.example.com,Example Domain
     """
 
-    def extract_document_info(self, input_file: str) -> List[DocumentInfo]:
-        documents = []
-
-        with open(input_file, "r") as f:
+    def extract_entries(self, input_file: str) -> Iterator[ReadingListEntry]:
+        with open(input_file, "r", newline="") as f:
             reader = csv.reader(f)
             next(reader, None)  # skip header row
 
             for row in reader:
+                if not row:
+                    continue
                 url: Any = row[0]
                 title = row[1] if len(row) >= 2 else None
 
-                document = DocumentInfo(title=title, url=url)
-                documents.append(document)
-
-        return documents
+                yield ReadingListEntry(row=reader.line_num, url=url, title=title)
 
 
 def create_extractor(file_type: str) -> ReadingListExtractor:
@@ -80,6 +86,24 @@ def create_extractor(file_type: str) -> ReadingListExtractor:
     return extractor_map[file_type]()
 
 
+def iter_reading_list(input_file: str, file_type: str) -> Iterator[ReadingListEntry]:
+    """Yields the rows of a reading list file without validating them.
+
+    Args:
+        input_file (str): a file path
+        file_type (str): file type (ex. .csv)
+
+    Raises:
+        ValueError: If file type is not supported
+
+    Yields:
+        ReadingListEntry: A `ReadingListEntry` per link or row
+    """
+    extractor = create_extractor(file_type)
+
+    return extractor.extract_entries(input_file)
+
+
 def build_reading_list(input_file: str, file_type: str) -> List[DocumentInfo]:
     """Builds a reading list from a given file.
 
@@ -0,0 +1,79 @@
+"""Provides code to plan bulk tag changes against the synced library."""
+
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+RETAG_FIELDS = ["id", "title", "before", "after"]
+
+
+class TagChange(NamedTuple):
+    """The tags a document has, and the tags it should end up with."""
+
+    id: str
+    title: str
+    before: Tuple[str, ...]
+    after: Tuple[str, ...]
+
+
+def _tag_names(tags) -> Tuple[str, ...]:
+    # Tags are a list of names, or a dict keyed by name
+    return tuple(tags.keys() if isinstance(tags, dict) else tags or ())
+
+
+def retagged(
+    tags: Sequence[str],
+    add: Sequence[str] = (),
+    remove: Sequence[str] = (),
+    rename: Optional[Tuple[str, str]] = None,
+) -> Tuple[str, ...]:
+    """Apply a rename, removals and additions to a document's tags, in that order.
+
+    Tags keep their order, and new ones are appended, so a document whose tags
+    don't change comes back equal to its input.
+    """
+    names = list(tags)
+    if rename and rename[0] in names:
+        old, new = rename
+        names = [new if name == old else name for name in names]
+    names = [name for name in names if name not in remove]
+    names.extend(tag for tag in add if tag not in names)
+    return tuple(dict.fromkeys(names))
+
+
+def plan_retag(
+    documents: Iterable[Dict],
+    add: Sequence[str] = (),
+    remove: Sequence[str] = (),
+    rename: Optional[Tuple[str, str]] = None,
+    skipped: Optional[List[str]] = None,
+) -> Iterator[TagChange]:
+    """Yield a `TagChange` per serialized document whose tags would change.
+
+    Documents left as they are aren't yielded, their ids are appended to
+    `skipped` instead, so no request is spent on them.
+    """
+    for document in documents:
+        before = _tag_names(document.get("tags"))
+        after = retagged(before, add=add, remove=remove, rename=rename)
+        if after == before:
+            if skipped is not None:
+                skipped.append(document["id"])
+            continue
+
+        yield TagChange(
+            id=document["id"],
+            title=document.get("title") or str(document.get("url")),
+            before=before,
+            after=after,
+        )
+
+
+def stored_tags(document: Dict, tags: Sequence[str]) -> Dict[str, Dict]:
+    """Tags as stored in the library, keeping what's known about existing ones"""
+    existing = document.get("tags")
+    existing = existing if isinstance(existing, dict) else {}
+    created = int(time.time() * 1000)
+    return {
+        tag: existing.get(tag) or {"name": tag, "type": "manual", "created": created}
+        for tag in tags
+    }
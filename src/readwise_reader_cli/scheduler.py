@@ -0,0 +1,153 @@
+"""Provides code to share each endpoint's rate limit between jobs, by priority."""
+
+import itertools
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Callable, Iterator, List, Optional, Tuple, TypeVar
+
+CANCEL_POLL = 0.1  # Seconds between checks for cancelled jobs while waiting
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """Which requests are sent first when several wait for an endpoint."""
+
+    INTERACTIVE = 0  # commands someone is waiting on, e.g. `list`
+    SYNC = 1  # syncs and archives run on their own
+    BULK = 2  # uploads and batch updates
+
+
+class RequestCancelled(Exception):
+    """Raised by requests of a job cancelled while they waited for their turn."""
+
+
+class Job:
+    """The requests made for one task, e.g. an upload, at one priority.
+
+    Jobs of the same priority take turns at each endpoint, so a large upload
+    doesn't hold back a smaller one started after it.
+
+    Args:
+        priority (Priority): Priority of the job's requests
+        name (str, optional): Name the job is reported by. Default: its priority's
+    """
+
+    def __init__(self, priority: Priority = Priority.INTERACTIVE, name=None):
+        self.priority = Priority(priority)
+        self.name = name or self.priority.name.lower()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        """Stop the job's waiting and later requests, which raise `RequestCancelled`"""
+        self._cancelled.set()
+
+    def run(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """Call `function` as part of the job, e.g. from a pool's thread"""
+        with use_job(self):
+            return function(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"Job({self.name!r}, {self.priority.name})"
+
+
+_default_job = Job(Priority.INTERACTIVE)
+# A context variable rather than a thread local, so asyncio tasks and the
+# threads they start with `asyncio.to_thread` keep their job
+_job: ContextVar[Optional[Job]] = ContextVar("job", default=None)
+
+
+def current_job() -> Job:
+    """The current job, interactive unless set with `use_job`"""
+    return _job.get() or _default_job
+
+
+@contextmanager
+def use_job(job: Job) -> Iterator[Job]:
+    """Make the requests sent inside the block part of `job`.
+
+    Threads of a pool started inside the block aren't, use `Job.run` to call
+    code from them as part of the job.
+    """
+    token = _job.set(job)
+    try:
+        yield job
+    finally:
+        _job.reset(token)
+
+
+class RateLimiter:
+    """Lets at most `rate` requests per minute start, highest priority first.
+
+    Requests waiting for a slot are granted by their job's priority, then in
+    turn between jobs of the same priority, then in order of arrival. So an
+    interactive command isn't queued behind a bulk upload, and a sync and an
+    upload of the same priority share the endpoint. A throttled response
+    pauses the endpoint for every job, instead of each thread sleeping on its
+    own and retrying at once.
+
+    Args:
+        rate (int, optional): Requests per minute. Default: requests are only
+            held back while the endpoint is paused
+    """
+
+    def __init__(self, rate: Optional[int] = None):
+        self.interval = 60.0 / rate if rate else 0.0
+        self._condition = threading.Condition()
+        self._next_slot = 0.0
+        self._waiting: List[Tuple[Job, int]] = []
+        self._arrivals = itertools.count()
+        self._grants = itertools.count()
+        # When each job was last granted a slot, so jobs take turns
+        self._turns: weakref.WeakKeyDictionary[Job, int] = weakref.WeakKeyDictionary()
+
+    def _rank(self, waiter: Tuple[Job, int]) -> Tuple[int, int, int]:
+        job, arrival = waiter
+        return job.priority, self._turns.get(job, -1), arrival
+
+    def wait(self, job: Optional[Job] = None) -> None:
+        """Wait for a request's turn.
+
+        Args:
+            job (Job, optional): The job sending the request. Default: the
+                current thread's
+
+        Raises:
+            RequestCancelled: If the job is cancelled while waiting
+        """
+        job = job or current_job()
+        waiter = (job, next(self._arrivals))
+
+        with self._condition:
+            self._waiting.append(waiter)
+            try:
+                while True:
+                    if job.cancelled:
+                        raise RequestCancelled(f"The {job.name} job was cancelled")
+
+                    now = time.monotonic()
+                    if now >= self._next_slot:
+                        if min(self._waiting, key=self._rank) is waiter:
+                            self._next_slot = now + self.interval
+                            self._turns[job] = next(self._grants)
+                            return
+                        timeout = CANCEL_POLL  # notified once the first goes
+                    else:
+                        timeout = min(self._next_slot - now, CANCEL_POLL)
+                    self._condition.wait(timeout)
+            finally:
+                self._waiting.remove(waiter)
+                self._condition.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request back for `seconds`, e.g. after a throttled response"""
+        with self._condition:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
@@ -0,0 +1,343 @@
+"""Provides a columnar snapshot of the library for fast aggregate queries."""
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import click
+
+from .constants import STREAM_BATCH_SIZE
+from .models import DocumentInfo
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pc = None
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def snapshot_available() -> bool:
+    return pa is not None
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise click.ClickException(
+            "This report requires pyarrow. "
+            "Install it with: pip install 'readwise-reader-cli[arrow]'"
+        )
+
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _value(enum_or_str: Any) -> Optional[str]:
+    return getattr(enum_or_str, "value", enum_or_str)
+
+
+def snapshot_schema() -> Any:
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    timestamp = pa.timestamp("us", tz="UTC")
+    return pa.schema(
+        [
+            ("id", pa.string()),
+            ("category", dictionary),
+            ("location", dictionary),
+            ("site_name", dictionary),
+            ("tags", pa.list_(dictionary)),
+            ("word_count", pa.int64()),
+            ("reading_progress", pa.float64()),
+            ("created_at", timestamp),
+            ("updated_at", timestamp),
+        ]
+    )
+
+
+class _Dictionary:
+    """Values of a dictionary-encoded column, in order of first appearance.
+
+    The dictionary only grows, so every batch's dictionary extends the previous
+    one and can be written as a delta.
+    """
+
+    def __init__(self):
+        self.positions: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: Optional[str]) -> Optional[int]:
+        if value is None:
+            return None
+        position = self.positions.get(value)
+        if position is None:
+            position = self.positions[value] = len(self.values)
+            self.values.append(value)
+        return position
+
+    def to_array(self) -> Any:
+        return pa.array(self.values, pa.string())
+
+
+class _SnapshotColumns:
+    """Buffers documents as column values until they're turned into a batch."""
+
+    def __init__(self):
+        self.dictionaries = {
+            name: _Dictionary()
+            for name in ("category", "location", "site_name", "tags")
+        }
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def clear(self) -> None:
+        self.ids, self.categories, self.locations, self.sites = [], [], [], []
+        self.word_counts, self.progress, self.created, self.updated = [], [], [], []
+        self.tag_offsets, self.tags = [0], []
+
+    def add(self, doc: DocumentInfo) -> None:
+        dictionaries = self.dictionaries
+        self.ids.append(doc.id)
+        self.categories.append(dictionaries["category"].encode(_value(doc.category)))
+        self.locations.append(dictionaries["location"].encode(_value(doc.location)))
+        self.sites.append(dictionaries["site_name"].encode(doc.site_name))
+        self.word_counts.append(doc.word_count)
+        self.progress.append(doc.reading_progress)
+        self.created.append(_utc(doc.created_at))
+        self.updated.append(_utc(doc.updated_at))
+        if doc.tags:
+            # list of names, or dict keyed by name
+            self.tags.extend(dictionaries["tags"].encode(name) for name in doc.tags)
+        self.tag_offsets.append(len(self.tags))
+
+    def _encoded(self, name: str, indices: list) -> Any:
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, pa.int32()), self.dictionaries[name].to_array()
+        )
+
+    def to_batch(self) -> Any:
+        """The buffered documents as a record batch, emptying the buffer."""
+        schema = snapshot_schema()
+        timestamp = schema.field("created_at").type
+
+        batch = pa.record_batch(
+            [
+                pa.array(self.ids, pa.string()),
+                self._encoded("category", self.categories),
+                self._encoded("location", self.locations),
+                self._encoded("site_name", self.sites),
+                pa.ListArray.from_arrays(
+                    pa.array(self.tag_offsets, pa.int32()),
+                    self._encoded("tags", self.tags),
+                ),
+                pa.array(self.word_counts, pa.int64()),
+                pa.array(self.progress, pa.float64()),
+                pa.array(self.created, timestamp),
+                pa.array(self.updated, timestamp),
+            ],
+            schema=schema,
+        )
+        self.clear()
+        return batch
+
+
+class LibrarySnapshotWriter:
+    """Writes a snapshot file batch by batch as documents arrive.
+
+    At most `batch_size` documents are buffered, and the dictionary-encoded
+    columns are written as dictionary deltas, so memory use doesn't grow with
+    the library. The file replaces `path` once the writer is closed.
+
+    Args:
+        path: Where to write the snapshot
+        batch_size (int): Documents per record batch
+        time (datetime, optional): Build time stamped on the snapshot
+    """
+
+    def __init__(
+        self, path, batch_size: int = STREAM_BATCH_SIZE, time: Optional[datetime] = None
+    ):
+        require_pyarrow()
+
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.time = time or datetime.now()
+
+        self._columns = _SnapshotColumns()
+        self._tmp_path = f"{self.path}.tmp"
+        self._sink = pa.OSFile(self._tmp_path, "wb")
+        self._writer = pa.ipc.new_file(
+            self._sink,
+            snapshot_schema().with_metadata({"time": str(self.time)}),
+            options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True),
+        )
+
+    def add(self, doc: DocumentInfo) -> None:
+        self._columns.add(doc)
+        if len(self._columns) >= self.batch_size:
+            self._writer.write_batch(self._columns.to_batch())
+
+    def close(self) -> None:
+        if len(self._columns):
+            self._writer.write_batch(self._columns.to_batch())
+        self._writer.close()
+        self._sink.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard the partly written snapshot, keeping the previous one."""
+        self._sink.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class LibrarySnapshot:
+    """Columnar view of a library backed by an Arrow table.
+
+    Category, location, site and tag values are dictionary-encoded, so counts
+    and group-bys run as vectorized operations instead of Python loops over
+    `DocumentInfo` objects. Requires the optional `pyarrow` dependency.
+    """
+
+    def __init__(self, table: Any, time: Optional[datetime] = None):
+        self.table = table
+        self.time = time or datetime.now()
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    @classmethod
+    def from_documents(
+        cls, documents: Iterable[DocumentInfo], time: Optional[datetime] = None
+    ) -> "LibrarySnapshot":
+        """Build a snapshot in a single pass over `documents`."""
+        require_pyarrow()
+
+        columns = _SnapshotColumns()
+        for doc in documents:
+            columns.add(doc)
+
+        table = pa.Table.from_batches([columns.to_batch()], schema=snapshot_schema())
+        return cls(table, time=time)
+
+    @classmethod
+    def read(cls, path) -> "LibrarySnapshot":
+        """Memory-map a snapshot written by `write`."""
+        require_pyarrow()
+
+        # The table's buffers point into the map, so it stays open with them
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+
+        metadata = table.schema.metadata or {}
+        time = metadata.get(b"time")
+        return cls(
+            table,
+            time=datetime.strptime(time.decode(), TIME_FORMAT) if time else None,
+        )
+
+    @classmethod
+    def concat(cls, snapshots: Iterable["LibrarySnapshot"]) -> "LibrarySnapshot":
+        """Combine snapshots, e.g. of several profiles, into one.
+
+        Columns are concatenated without copying, only the dictionary-encoded
+        ones are re-encoded against a shared dictionary.
+        """
+        snapshots = [snapshot for snapshot in snapshots]
+        if len(snapshots) == 1:
+            return snapshots[0]
+
+        table = pa.concat_tables([snapshot.table for snapshot in snapshots])
+        return cls(
+            table.unify_dictionaries(),
+            time=min(snapshot.time for snapshot in snapshots),
+        )
+
+    def write(self, path) -> None:
+        """Write the snapshot as an Arrow IPC file, stamped with its build time."""
+        table = self.table.replace_schema_metadata({"time": str(self.time)})
+
+        with (
+            pa.OSFile(str(path), "wb") as sink,
+            pa.ipc.new_file(sink, table.schema) as writer,
+        ):
+            writer.write_table(table)
+
+    def count_values(self, column: str) -> Dict[str, int]:
+        """Count documents per value of a dictionary-encoded column."""
+        counts = pc.value_counts(self.table[column])
+        return {
+            str(value): count
+            for value, count in zip(
+                counts.field("values").to_pylist(), counts.field("counts").to_pylist()
+            )
+            if value is not None
+        }
+
+    def count_tags(self) -> Dict[str, int]:
+        """Count documents per tag, most used first."""
+        counts = pc.value_counts(pc.list_flatten(self.table["tags"]))
+        tag_counts = dict(
+            zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist())
+        )
+        return dict(sorted(tag_counts.items(), key=lambda item: item[1], reverse=True))
+
+    def _by_week(self, column: str, aggregations: list) -> Any:
+        # Only the columns the aggregation needs are filtered, not the table
+        table = self.table.select([name for name, _ in aggregations])
+        weeks = pc.floor_temporal(
+            self.table[column], unit="week", week_starts_monday=True
+        )
+        table = table.append_column("week", weeks).filter(pc.is_valid(pc.field("week")))
+        return table.group_by("week").aggregate(aggregations).sort_by("week")
+
+    def saved_per_week(self) -> Dict[str, int]:
+        """Documents saved per week, keyed by the week's Monday."""
+        result = self._by_week("created_at", [("id", "count")])
+        return {
+            week.strftime("%Y-%m-%d"): count
+            for week, count in zip(
+                result["week"].to_pylist(), result["id_count"].to_pylist()
+            )
+        }
+
+    def progress_per_week(self) -> Dict[str, float]:
+        """Average reading progress of documents by the week they were last updated."""
+        result = self._by_week("updated_at", [("reading_progress", "mean")])
+        return {
+            week.strftime("%Y-%m-%d"): mean
+            for week, mean in zip(
+                result["week"].to_pylist(), result["reading_progress_mean"].to_pylist()
+            )
+        }
+
+    def words_per_site(self) -> Dict[str, int]:
+        """Total word count per site, largest first."""
+        result = (
+            self.table.select(["site_name", "word_count"])
+            .filter(pc.is_valid(pc.field("site_name")))
+            .group_by("site_name")
+            .aggregate([("word_count", "sum")])
+            .sort_by([("word_count_sum", "descending")])
+        )
+        return {
+            str(site): total or 0
+            for site, total in zip(
+                result["site_name"].to_pylist(), result["word_count_sum"].to_pylist()
+            )
+        }
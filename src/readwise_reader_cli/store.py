@@ -0,0 +1,434 @@
+"""Provides indexes over the cached library that are rebuilt when it syncs."""
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .constants import LIST_PAGE_LIMIT, STREAM_BATCH_SIZE
+from .profiles import cache_dir
+
+CHILD_CATEGORIES = ("highlight", "note")
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+INDEX_VERSION = "3"  # indexes of other versions are rebuilt
+
+# SQLite expressions turning a day into the first day of its period
+ROLLUP_PERIODS = {
+    "day": "day",
+    "week": "date(day, 'weekday 0', '-6 days')",  # weeks start on Monday
+    "month": "strftime('%Y-%m-01', day)",
+    "year": "strftime('%Y-01-01', day)",
+}
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE children (parent_id TEXT NOT NULL, document TEXT NOT NULL);
+CREATE TABLE titles (id TEXT PRIMARY KEY, title TEXT);
+CREATE TABLE document_tags (tag TEXT NOT NULL, position INTEGER NOT NULL);
+CREATE TABLE tag_counts (tag TEXT PRIMARY KEY, count INTEGER NOT NULL);
+CREATE TABLE rollups (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    saved INTEGER NOT NULL,
+    progress REAL NOT NULL,
+    archived INTEGER NOT NULL,
+    words_read INTEGER NOT NULL,
+    PRIMARY KEY (day, category)
+);
+"""
+
+TAGGED_QUERY = "SELECT position FROM document_tags WHERE tag = ?"
+IN_QUERY_SIZE = 500  # ids per `IN (...)` lookup, within SQLite's variable limit
+
+
+def _tag_names(tags) -> Iterable[str]:
+    # Tags are a list of names, or a dict keyed by name
+    return tags.keys() if isinstance(tags, dict) else tags or ()
+
+
+def _day(timestamp: Optional[str]) -> Optional[str]:
+    # Serialized times are ISO 8601 in UTC, so their date is their UTC day
+    return timestamp[:10] if timestamp else None
+
+
+class LibraryIndex:
+    """Highlights and notes keyed by the id of the document they belong to,
+    and documents keyed by their tags.
+
+    The index is an SQLite database, so looking up a document's highlights
+    reads only that document's rows instead of scanning, or loading, the
+    library. Children are stored serialized. Tagged documents are stored by
+    their position in the library, sorted per tag, with a count per tag.
+    Reading activity is rolled up per day and category, so statistics over
+    any period read a few rows per day instead of the library.
+    """
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        time: datetime,
+        version: str = INDEX_VERSION,
+        size: int = 0,
+    ):
+        self.connection = connection
+        self.time = time
+        self.version = version
+        self.size = size
+
+    @classmethod
+    def read(cls, path) -> "LibraryIndex":
+        connection = sqlite3.connect(f"{Path(path).as_uri()}?mode=ro", uri=True)
+        meta = dict(connection.execute("SELECT key, value FROM meta"))
+        return cls(
+            connection,
+            time=datetime.strptime(meta["time"], TIME_FORMAT),
+            version=meta.get("version", "1"),
+            size=int(meta.get("size", 0)),
+        )
+
+    def highlights(self, document_id: str) -> List[dict]:
+        """Highlights and notes of a document."""
+        rows = self.connection.execute(
+            "SELECT document FROM children WHERE parent_id = ? ORDER BY rowid",
+            (document_id,),
+        )
+        return [json.loads(document) for (document,) in rows]
+
+    def highlight_count(self, document_id: str) -> int:
+        (count,) = self.connection.execute(
+            "SELECT count(*) FROM children WHERE parent_id = ?", (document_id,)
+        ).fetchone()
+        return count
+
+    def _rows_of(self, query: str, ids: Iterable[str]) -> Iterator[tuple]:
+        # Runs `query` over ids a batch at a time, in place of its `{ids}`
+        ids = iter(ids)
+        while True:
+            batch = [*islice(ids, IN_QUERY_SIZE)]
+            if not batch:
+                return
+            yield from self.connection.execute(
+                query.format(ids=",".join("?" * len(batch))), batch
+            )
+
+    def highlight_counts(
+        self, document_ids: Optional[Iterable[str]] = None
+    ) -> Dict[str, int]:
+        """Highlight and note counts per document id, of every document with some
+        or of `document_ids`. Documents without any are left out."""
+        if document_ids is None:
+            rows = self.connection.execute(
+                "SELECT parent_id, count(*) FROM children GROUP BY parent_id"
+            )
+        else:
+            rows = self._rows_of(
+                "SELECT parent_id, count(*) FROM children"
+                " WHERE parent_id IN ({ids}) GROUP BY parent_id",
+                document_ids,
+            )
+        return {document_id: count for document_id, count in rows}
+
+    def title(self, document_id: str) -> Optional[str]:
+        row = self.connection.execute(
+            "SELECT title FROM titles WHERE id = ?", (document_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def titles(self, document_ids: Iterable[str]) -> Dict[str, str]:
+        """Titles of the documents among `document_ids` that have one."""
+        return dict(
+            self._rows_of(
+                "SELECT id, title FROM titles WHERE id IN ({ids})", document_ids
+            )
+        )
+
+    def tag_counts(self) -> Dict[str, int]:
+        """Documents per tag, most used first."""
+        rows = self.connection.execute(
+            "SELECT tag, count FROM tag_counts ORDER BY count DESC, tag"
+        )
+        return {tag: count for tag, count in rows}
+
+    def tag_names(self, prefix: str = "") -> List[str]:
+        """Tags starting with `prefix`, most used first."""
+        rows = self.connection.execute(
+            "SELECT tag FROM tag_counts WHERE substr(tag, 1, ?) = ?"
+            " ORDER BY count DESC, tag",
+            (len(prefix), prefix),
+        )
+        return [tag for (tag,) in rows]
+
+    def tagged(
+        self,
+        all_of: Sequence[str] = (),
+        any_of: Sequence[str] = (),
+        none_of: Sequence[str] = (),
+    ) -> List[int]:
+        """Positions in the library of the documents matching a tag expression.
+
+        Documents must have every tag in `all_of`, at least one in `any_of`,
+        and none in `none_of`. The per-tag position lists are intersected,
+        merged and subtracted by SQLite, and come back in library order.
+        """
+        parts = [TAGGED_QUERY] * len(all_of)
+        params = [*all_of]
+        if any_of:
+            # A document with several of the tags is listed once
+            parts.append(
+                "SELECT DISTINCT position FROM document_tags"
+                f" WHERE tag IN ({','.join('?' * len(any_of))})"
+            )
+            params.extend(any_of)
+
+        if not parts:  # only exclusions, every other document matches
+            rows = self.connection.execute(
+                "SELECT DISTINCT position FROM document_tags"
+                f" WHERE tag IN ({','.join('?' * len(none_of))})",
+                [*none_of],
+            )
+            excluded = {position for (position,) in rows}
+            return [
+                position for position in range(self.size) if position not in excluded
+            ]
+
+        query = " INTERSECT ".join(parts)
+        for tag in none_of:
+            query += f" EXCEPT {TAGGED_QUERY}"
+            params.append(tag)
+
+        rows = self.connection.execute(f"{query} ORDER BY 1", params)
+        return [position for (position,) in rows]
+
+    def _rollup_filter(
+        self, since: Optional[datetime], category: Optional[str]
+    ) -> tuple:
+        conditions, params = [], []
+        if since:
+            conditions.append("day >= ?")
+            params.append(since.strftime("%Y-%m-%d"))
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    def activity(
+        self,
+        period: str = "week",
+        since: Optional[datetime] = None,
+        category: Optional[str] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """Documents saved and archived, and words read, per period.
+
+        Documents count as saved on the day they were created, and as archived
+        or read on the day they were last updated, the closest the API tells.
+        Words read are a document's word count times its reading progress.
+
+        Args:
+            period (str): One of `ROLLUP_PERIODS`
+            since (datetime, optional): Leave out days before this one
+            category (str, optional): Only documents of this category
+
+        Returns:
+            Dict[str, Dict[str, int]]: Counts keyed by the first day of each
+            period, in chronological order
+        """
+        where, params = self._rollup_filter(since, category)
+        rows = self.connection.execute(
+            f"SELECT {ROLLUP_PERIODS[period]} AS period, sum(saved), sum(archived),"
+            f" sum(words_read) FROM rollups{where} GROUP BY period ORDER BY period",
+            params,
+        )
+        return {
+            period: {"saved": saved, "archived": archived, "words_read": words_read}
+            for period, saved, archived, words_read in rows
+        }
+
+    def progress_totals(
+        self, since: Optional[datetime] = None, category: Optional[str] = None
+    ) -> Dict[str, tuple]:
+        """Summed reading progress and documents per category.
+
+        Kept as totals so the averages of several libraries can be combined.
+        Documents are filtered by the day they were saved.
+        """
+        where, params = self._rollup_filter(since, category)
+        rows = self.connection.execute(
+            f"SELECT category, sum(progress), sum(saved) FROM rollups{where}"
+            " GROUP BY category",
+            params,
+        )
+        return {category: (progress, saved) for category, progress, saved in rows}
+
+
+class LibraryIndexWriter:
+    """Builds the index in a single pass as documents arrive.
+
+    Rows are inserted `batch_size` at a time, so memory use doesn't grow with
+    the library. The index replaces `path` once the writer is closed.
+
+    Args:
+        path: Where to write the index
+        batch_size (int): Documents buffered between inserts
+        time (datetime, optional): Build time stamped on the index
+    """
+
+    def __init__(
+        self,
+        path,
+        batch_size: int = STREAM_BATCH_SIZE,
+        time: Optional[datetime] = None,
+    ):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.time = time or datetime.now()
+
+        self._children: List[tuple] = []
+        self._titles: List[tuple] = []
+        self._tags: List[tuple] = []
+        self._position = 0
+        # [saved, progress, archived, words read] by (day, category), a few
+        # thousand entries for years of history
+        self._rollups: Dict[tuple, list] = {}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._tmp_path = f"{self.path}.tmp"
+        if os.path.exists(self._tmp_path):  # left by an interrupted sync
+            os.remove(self._tmp_path)
+        self._connection = sqlite3.connect(self._tmp_path)
+        self._connection.executescript(SCHEMA)
+        self._connection.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [("time", str(self.time)), ("version", INDEX_VERSION)],
+        )
+
+    def add(self, document: Dict) -> None:
+        """Add a serialized document of the library, in library order."""
+        self._tags.extend(
+            (tag, self._position)
+            for tag in dict.fromkeys(_tag_names(document.get("tags")))
+        )
+        self._position += 1
+
+        if document.get("parent_id") and document.get("category") in CHILD_CATEGORIES:
+            self._children.append(
+                (document["parent_id"], json.dumps(document, separators=(",", ":")))
+            )
+        elif document.get("id"):
+            self._titles.append(
+                (document["id"], document.get("title") or str(document.get("url")))
+            )
+            self._roll_up(document)
+
+        if len(self._children) + len(self._titles) + len(self._tags) >= self.batch_size:
+            self._flush()
+
+    def _roll_up(self, document: Dict) -> None:
+        category = document.get("category") or "unknown"
+        progress = document.get("reading_progress") or 0.0
+
+        saved = _day(document.get("created_at"))
+        if saved:
+            totals = self._rollups.setdefault((saved, category), [0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += progress
+
+        updated = _day(document.get("updated_at"))
+        if updated:
+            totals = self._rollups.setdefault((updated, category), [0, 0.0, 0, 0])
+            if document.get("location") == "archive":
+                totals[2] += 1
+            totals[3] += round((document.get("word_count") or 0) * progress)
+
+    def _flush(self) -> None:
+        self._connection.executemany(
+            "INSERT INTO children VALUES (?, ?)", self._children
+        )
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO titles VALUES (?, ?)", self._titles
+        )
+        self._connection.executemany(
+            "INSERT INTO document_tags VALUES (?, ?)", self._tags
+        )
+        self._children.clear()
+        self._titles.clear()
+        self._tags.clear()
+
+    def close(self) -> None:
+        self._flush()
+        # Parents can come before or after their children, so the titles of
+        # documents without any are only dropped once all have been added
+        self._connection.execute(
+            "DELETE FROM titles WHERE id NOT IN (SELECT parent_id FROM children)"
+        )
+        self._connection.execute("CREATE INDEX children_parent ON children (parent_id)")
+        self._connection.execute(
+            "CREATE INDEX document_tags_tag ON document_tags (tag, position)"
+        )
+        self._connection.execute(
+            "INSERT INTO tag_counts"
+            " SELECT tag, count(*) FROM document_tags GROUP BY tag"
+        )
+        self._connection.executemany(
+            "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (day, category, *totals)
+                for (day, category), totals in self._rollups.items()
+            ),
+        )
+        self._connection.execute(
+            "INSERT INTO meta VALUES ('size', ?)", (str(self._position),)
+        )
+        self._connection.commit()
+        self._connection.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard the partly built index, keeping the previous one."""
+        self._connection.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def with_highlight_counts(
+    documents: Iterable[dict], index: Optional[LibraryIndex]
+) -> Iterator[dict]:
+    """Yield copies of serialized documents with their highlight count added.
+
+    Counts are looked up a page of documents at a time.
+    """
+    if index is None:
+        yield from documents
+        return
+
+    documents = iter(documents)
+    while True:
+        page = [*islice(documents, LIST_PAGE_LIMIT)]
+        if not page:
+            return
+        counts = index.highlight_counts(document["id"] for document in page)
+        for document in page:
+            yield {**document, "highlight_count": counts.get(document["id"], 0)}
+
+
+def index_path():
+    return cache_dir() / "index.sqlite"
+
+
+def load_index() -> Optional[LibraryIndex]:
+    if not os.path.exists(index_path()):
+        return None
+
+    return LibraryIndex.read(index_path())
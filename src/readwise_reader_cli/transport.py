@@ -0,0 +1,421 @@
+"""Provides the transports that carry Reader API requests.
+
+`HTTPTransport` talks to the Reader API. `LocalTransport` emulates it from a
+local library, so every command can run, and be load tested, offline.
+"""
+
+import html
+import json
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Union
+from urllib.parse import urlparse
+
+import requests
+from dateutil import parser
+from requests import Response
+from urllib3.util.request import ACCEPT_ENCODING
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+from .constants import (
+    AUTH_TOKEN_URL,
+    CREATE_ENDPOINT,
+    LIST_ENDPOINT,
+    MAX_WORKERS,
+    UPDATE_ENDPOINT,
+)
+
+PAGE_SIZE = 100  # Documents per list page, as served by Reader
+
+
+def decode_json(content: bytes):
+    """Decode a response body, with orjson when it's installed"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class Transport(ABC):
+    """Sends a request and returns the response, like `requests.Session.request`"""
+
+    @abstractmethod
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        pass
+
+
+class HTTPTransport(Transport):
+    """Sends requests to the Reader API over one pooled session."""
+
+    def __init__(self, pool_size: int = MAX_WORKERS):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=4, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        # Every encoding urllib3 can decode here: gzip and deflate, plus br and
+        # zstd when brotli and zstandard are installed
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        return self.session.request(method, url, **kwargs)
+
+
+def make_response(
+    status_code: int, body: Optional[dict] = None, headers: Optional[Dict] = None
+) -> Response:
+    resp = Response()
+    resp.status_code = status_code
+    resp._content = json.dumps(body).encode("utf-8") if body is not None else b""
+    resp.headers.update(headers or {})
+    resp.headers["Content-Type"] = "application/json"
+    return resp
+
+
+def _parse_time(value) -> Optional[datetime]:
+    """Parse an API timestamp, reading naive times as UTC like the API does"""
+    if not value:
+        return None
+    dt = value if isinstance(value, datetime) else parser.isoparse(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _html_content(document: dict) -> Optional[str]:
+    """A document's recorded HTML, or one made up from its text"""
+    if document.get("html_content"):
+        return document["html_content"]
+    text = document.get("content") or document.get("summary")
+    if not text:
+        return None
+    title = html.escape(document.get("title") or "")
+    return f"<article><h1>{title}</h1><p>{html.escape(text)}</p></article>"
+
+
+class LocalTransport(Transport):
+    """Emulates the Reader API from an in-memory library.
+
+    Serves paginated, filtered list requests, tag filters and page sizes
+    included, and accepts saves and updates, which last for the life of the
+    process. `latency` adds a delay to every request and `rate_limit_ratio`
+    answers that share of requests with a 429.
+
+    Args:
+        documents (List[dict]): Serialized documents, newest first, or a
+            function returning them, called on the first request
+        latency (float): Seconds to wait before answering
+        rate_limit_ratio (float): Share of requests, 0 to 1, answered with a 429
+        retry_after (int): Retry-After header of injected 429s
+        seed (int, optional): Seed for the 429 injection
+    """
+
+    def __init__(
+        self,
+        documents: Union[List[dict], Callable[[], List[dict]]],
+        latency: float = 0.0,
+        rate_limit_ratio: float = 0.0,
+        retry_after: int = 1,
+        seed: Optional[int] = None,
+    ):
+        self._documents = documents
+        self._by_id: Optional[Dict[str, dict]] = None
+        self._by_url: Optional[Dict[str, dict]] = None
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.requests: Dict[str, int] = {}  # request counts per endpoint
+
+        self._queries: Dict[tuple, List[dict]] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def documents(self) -> List[dict]:
+        if callable(self._documents):
+            self._documents = self._documents()
+        return self._documents
+
+    @property
+    def by_id(self) -> Dict[str, dict]:
+        if self._by_id is None:
+            self._by_id = {doc["id"]: doc for doc in self.documents if doc.get("id")}
+        return self._by_id
+
+    @property
+    def by_url(self) -> Dict[str, dict]:
+        if self._by_url is None:
+            self._by_url = {doc["url"]: doc for doc in self.documents if doc.get("url")}
+        return self._by_url
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "LocalTransport":
+        """Serve documents recorded in a JSON lines file or a JSON list"""
+        with open(path, "r") as f:
+            if path.endswith(".jsonl"):
+                documents = [json.loads(line) for line in f if line.strip()]
+            else:
+                documents = json.load(f)
+        return cls(documents, **kwargs)
+
+    @classmethod
+    def from_cache(cls, **kwargs) -> "LocalTransport":
+        """Serve the most recently synced full library, read on the first request"""
+        from .data import iter_library, library_snapshot_dates
+
+        dates = library_snapshot_dates()
+        if not dates:
+            raise FileNotFoundError("No synced library found")
+        return cls(lambda: list(iter_library(dates[-1])), **kwargs)
+
+    @classmethod
+    def from_spec(cls, spec: str, **kwargs) -> "LocalTransport":
+        """Build from 'synthetic:N', 'cache', or a path to a recorded library"""
+        if spec.startswith("synthetic:"):
+            return cls(synthetic_library(int(spec.split(":", 1)[1])), **kwargs)
+        if spec == "cache":
+            return cls.from_cache(**kwargs)
+        return cls.from_file(spec, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = urlparse(url).path.strip("/")
+        endpoint = "auth" if url == AUTH_TOKEN_URL else path.split("/")[2]
+
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+            if self.rate_limit_ratio and self._random.random() < self.rate_limit_ratio:
+                return make_response(
+                    429,
+                    {"detail": "Request was throttled."},
+                    {"Retry-After": str(self.retry_after)},
+                )
+
+            if endpoint == "auth":
+                return make_response(204)
+            if endpoint == LIST_ENDPOINT and method == "GET":
+                return self._list(kwargs.get("params") or {})
+            if endpoint == CREATE_ENDPOINT and method == "POST":
+                return self._save(kwargs.get("json") or {})
+            if endpoint == UPDATE_ENDPOINT and method == "PATCH":
+                return self._update(path.split("/")[3], kwargs.get("json") or {})
+
+        return make_response(404, {"detail": "Not found."})
+
+    def _query(self, params: dict) -> List[dict]:
+        """Documents matching the list filters, memoized until the next write"""
+        tags = params.get("tag") or ()
+        tags = (tags,) if isinstance(tags, str) else tuple(tags)
+        key = tuple(
+            params.get(name) for name in ("id", "category", "location", "updatedAfter")
+        ) + (tags,)
+        if key in self._queries:
+            return self._queries[key]
+
+        doc_id, category, location, updated_after, tags = key
+        updated_after = _parse_time(updated_after)
+
+        results = []
+        for doc in self.documents:
+            if doc_id and doc.get("id") != doc_id:
+                continue
+            if category and doc.get("category") != category:
+                continue
+            if location and doc.get("location") != location:
+                continue
+            if updated_after:
+                updated_at = _parse_time(doc.get("updated_at"))
+                if not updated_at or updated_at <= updated_after:
+                    continue
+            if tags and not all(tag in (doc.get("tags") or ()) for tag in tags):
+                continue
+            results.append(doc)
+
+        self._queries[key] = results
+        return results
+
+    def _list(self, params: dict) -> Response:
+        results = self._query(params)
+
+        start = int(params.get("pageCursor") or 0)
+        end = start + int(params.get("limit") or PAGE_SIZE)
+        page = results[start:end]
+        if str(params.get("withHtmlContent")).lower() == "true":
+            page = [{**doc, "html_content": _html_content(doc)} for doc in page]
+        else:
+            page = [
+                {key: value for key, value in doc.items() if key != "html_content"}
+                if "html_content" in doc
+                else doc
+                for doc in page
+            ]
+        return make_response(
+            200,
+            {
+                "count": len(results),
+                "nextPageCursor": str(end) if end < len(results) else None,
+                "results": page,
+            },
+        )
+
+    def _save(self, data: dict) -> Response:
+        url = data.get("url")
+        if not url:
+            return make_response(400, {"url": ["This field is required."]})
+
+        if url in self.by_url:
+            doc = self.by_url[url]
+            return make_response(200, {"id": doc["id"], "url": doc["url"]})
+
+        now = datetime.now(timezone.utc).isoformat()
+        tags = data.get("tags") or []
+        doc = {
+            "id": uuid.uuid4().hex[:26],
+            "url": url,
+            "title": data.get("title"),
+            "author": data.get("author"),
+            "source": "local",
+            "category": data.get("category") or "article",
+            "location": data.get("location") or "new",
+            "tags": {
+                tag: {"name": tag, "type": "manual", "created": 0} for tag in tags
+            },
+            "site_name": urlparse(url).netloc,
+            "word_count": None,
+            "created_at": now,
+            "updated_at": now,
+            "published_date": data.get("published_date"),
+            "summary": data.get("summary"),
+            "image_url": data.get("image_url"),
+            "content": None,
+            "source_url": url,
+            "notes": data.get("notes") or "",
+            "parent_id": None,
+            "reading_progress": 0.0,
+        }
+        self.documents.insert(0, doc)
+        self.by_id[doc["id"]] = doc
+        self.by_url[url] = doc
+        self._queries.clear()
+        return make_response(201, {"id": doc["id"], "url": url})
+
+    def _update(self, document_id: str, data: dict) -> Response:
+        doc = self.by_id.get(document_id)
+        if doc is None:
+            return make_response(404, {"detail": "Not found."})
+
+        for field, value in data.items():
+            if field == "tags":
+                value = {
+                    tag: {"name": tag, "type": "manual", "created": 0} for tag in value
+                }
+            doc[field] = value
+        doc["updated_at"] = datetime.now(timezone.utc).isoformat()
+
+        # Most recently updated documents come first, as with the API
+        self.documents.remove(doc)
+        self.documents.insert(0, doc)
+        self._queries.clear()
+        return make_response(200, doc)
+
+
+SYNTHETIC_CATEGORIES = (
+    ["article"] * 8 + ["rss"] * 5 + ["email"] * 4 + ["pdf", "tweet", "video", "epub"]
+)
+SYNTHETIC_LOCATIONS = ["archive"] * 6 + ["later"] * 3 + ["new", "feed"]
+SYNTHETIC_TAGS = ["python", "ai", "design", "history", "science", "productivity"]
+SYNTHETIC_WORDS = [
+    "the",
+    "of",
+    "reader",
+    "library",
+    "note",
+    "idea",
+    "system",
+    "data",
+    "read",
+    "time",
+    "work",
+]
+
+
+def synthetic_library(size: int, seed: int = 0) -> List[dict]:
+    """Generate a reproducible library of `size` documents and highlights.
+
+    Roughly one in four entries is a highlight or note of an earlier document.
+    Documents are returned most recently updated first.
+    """
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    span = (datetime(2025, 1, 1, tzinfo=timezone.utc) - start).total_seconds()
+
+    documents: List[dict] = []
+    parents: List[dict] = []
+    for i in range(size):
+        created = start + timedelta(seconds=rng.random() * span)
+        updated = created + timedelta(days=rng.random() * 60)
+        doc_id = f"{i:026d}"
+
+        if parents and rng.random() < 0.25:
+            parent = rng.choice(parents)
+            category = rng.choice(["highlight", "highlight", "note"])
+            doc = {
+                "id": doc_id,
+                "url": f"https://read.readwise.io/read/{doc_id}",
+                "title": None,
+                "author": parent["author"],
+                "category": category,
+                "location": parent["location"],
+                "tags": {},
+                "site_name": parent["site_name"],
+                "word_count": None,
+                "summary": None,
+                "content": " ".join(rng.choices(SYNTHETIC_WORDS, k=30)),
+                "parent_id": parent["id"],
+                "reading_progress": 0.0,
+            }
+        else:
+            site = f"site{rng.randrange(200)}.example.com"
+            doc = {
+                "id": doc_id,
+                "url": f"https://{site}/{doc_id}",
+                "title": " ".join(rng.choices(SYNTHETIC_WORDS, k=6)).capitalize(),
+                "author": f"Author {rng.randrange(500)}",
+                "category": rng.choice(SYNTHETIC_CATEGORIES),
+                "location": rng.choice(SYNTHETIC_LOCATIONS),
+                "tags": {
+                    tag: {"name": tag, "type": "manual", "created": 0}
+                    for tag in rng.sample(SYNTHETIC_TAGS, k=rng.randrange(3))
+                },
+                "site_name": site,
+                "word_count": rng.randrange(100, 8000),
+                "summary": " ".join(rng.choices(SYNTHETIC_WORDS, k=25)),
+                "content": None,
+                "parent_id": None,
+                "reading_progress": round(rng.random(), 2),
+            }
+            parents.append(doc)
+
+        doc.update(
+            {
+                "source": "synthetic",
+                "created_at": created.isoformat(),
+                "updated_at": updated.isoformat(),
+                "published_date": None,
+                "image_url": None,
+                "source_url": None,
+                "notes": "",
+            }
+        )
+        documents.append(doc)
+
+    documents.sort(key=lambda doc: doc["updated_at"], reverse=True)
+    return documents
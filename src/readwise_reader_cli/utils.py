@@ -1,14 +1,20 @@
 """Utility functions."""
 
+from collections.abc import Sized
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
 
+import requests
 from click import secho
+from pydantic import ValidationError
 from rich.progress import Progress
 
-from .api import add_document
-from .constants import VALID_CATEGORY_OPTIONS, VALID_LOCATION_OPTIONS
+from .api import add_document, update_document
+from .constants import MAX_WORKERS, VALID_CATEGORY_OPTIONS, VALID_LOCATION_OPTIONS
 from .models import DocumentInfo
+from .scheduler import Job, Priority
+from .snapshot import LibrarySnapshot
 
 DATE_RANGE_MAP = {"today": {"days": 1}, "week": {"weeks": 1}, "month": {"days": 30}}
 
@@ -17,7 +23,7 @@ def convert_date_range(date_range: str) -> datetime:
     return datetime.now() - timedelta(**DATE_RANGE_MAP[date_range])
 
 
-def count_category_values(documents: List[DocumentInfo]) -> Dict[str, int]:
+def count_category_values(documents: Iterable[DocumentInfo]) -> Dict[str, int]:
     category_counts = {category: 0 for category in VALID_CATEGORY_OPTIONS}
 
     for doc in documents:
@@ -30,7 +36,7 @@ def count_category_values(documents: List[DocumentInfo]) -> Dict[str, int]:
     return category_counts
 
 
-def count_location_values(documents: List[DocumentInfo]) -> Dict[str, int]:
+def count_location_values(documents: Iterable[DocumentInfo]) -> Dict[str, int]:
     location_counts = {location: 0 for location in VALID_LOCATION_OPTIONS}
 
     for document in documents:
@@ -43,7 +49,7 @@ def count_location_values(documents: List[DocumentInfo]) -> Dict[str, int]:
     return location_counts
 
 
-def count_tag_values(documents: List[DocumentInfo]) -> Dict[str, int]:
+def count_tag_values(documents: Iterable[DocumentInfo]) -> Dict[str, int]:
     tag_counts: Dict[str, int] = {}
 
     for doc in documents:
@@ -63,6 +69,22 @@ def count_tag_values(documents: List[DocumentInfo]) -> Dict[str, int]:
     return sorted_tag_counts
 
 
+def count_snapshot_values(snapshot: LibrarySnapshot, view: str) -> Dict[str, int]:
+    """Same counts as the `count_*_values` functions, computed on a snapshot"""
+    if view == "tags":
+        return snapshot.count_tags()
+
+    valid_options = (
+        VALID_LOCATION_OPTIONS if view == "location" else VALID_CATEGORY_OPTIONS
+    )
+    counts = {option: 0 for option in valid_options}
+    for name, count in snapshot.count_values(view).items():
+        if name in counts:
+            counts[name] = count
+
+    return counts
+
+
 def print_report(adds: int, exists: int, failures: int, total: int) -> None:
     secho("Report:")
     secho(f"Additions: {adds} out of {total}", fg="bright_green")
@@ -70,34 +92,160 @@ def print_report(adds: int, exists: int, failures: int, total: int) -> None:
     secho(f"Failures: {failures}", fg="bright_red")
 
 
-def batch_add_documents(documents: List[DocumentInfo], debug=False) -> None:
+def documents_from_urls(
+    entries: Iterable[str],
+    tags: Sequence[str] = (),
+    rejected: Optional[List[str]] = None,
+) -> Iterator[DocumentInfo]:
+    """Build documents from `URL [TAG ...]` entries, one per line.
+
+    Per-URL tags may be separated by spaces or commas and are added to `tags`.
+    Blank lines and lines starting with `#` are skipped. Invalid URLs are
+    appended to `rejected` instead of stopping the batch.
+    """
+    for entry in entries:
+        url, _, url_tags = entry.strip().partition(" ")
+        if not url or url.startswith("#"):
+            continue
+
+        doc_tags = [*tags, *(t for t in url_tags.replace(",", " ").split())]
+
+        try:
+            yield DocumentInfo(url=url, tags=doc_tags or None)
+        except ValidationError:
+            if rejected is not None:
+                rejected.append(url)
+
+
+def batch_add_documents(
+    documents: Iterable[DocumentInfo],
+    debug=False,
+    rejected: Optional[List[str]] = None,
+    workers: int = MAX_WORKERS,
+) -> None:
     """Batch documents to add to Reader Library.
 
+    Documents are consumed lazily and submitted by a pool of `workers`
+    threads, which share the API's connection pool and rate limit. They're
+    sent as a bulk job, so interactive requests made meanwhile go first.
+
     Args:
-        documents (List[DocumentInfo]): A list of `DocumentInfo` objects
+        documents (Iterable[DocumentInfo]): `DocumentInfo` objects
+        rejected (List[str], optional): URLs that failed validation, reported as failures
+        workers (int): Number of concurrent requests
     """
-    number_of_documents = len(documents)
+    total = len(documents) if isinstance(documents, Sized) else None
+
+    job = Job(Priority.BULK, "upload")
 
     # track counts
     adds = 0
     exists = 0
     failures = 0
+    submitted = 0
+
+    with Progress() as progress, ThreadPoolExecutor(max_workers=workers) as executor:
+        task = progress.add_task("Uploading...", total=total)
+        pending = set()
+
+        def track(futures):
+            nonlocal adds, exists, failures
+            for future in futures:
+                try:
+                    response = future.result()
+                except requests.RequestException:  # e.g. a dropped connection
+                    failures += 1
+                    progress.update(task, advance=1, description="Failure")
+                    continue
+
+                if response.status_code == 201:
+                    adds += 1
+                    progress.update(task, advance=1, description="Success")
+                elif response.status_code == 200:
+                    adds += 1
+                    exists += 1
+                    progress.update(task, advance=1, description="Already Exists")
+                else:
+                    failures += 1
+                    progress.update(task, advance=1, description="Failure")
+
+        try:
+            for document in documents:
+                if len(pending) >= workers * 2:  # bound the documents held in memory
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    track(done)
+                pending.add(
+                    executor.submit(
+                        job.run, add_document, doc_info=document, debug=debug
+                    )
+                )
+                submitted += 1
+
+            track(as_completed(pending))
+        except BaseException:
+            job.cancel()  # queued uploads give up instead of being sent
+            raise
+
+    rejected = rejected or []
+    for url in rejected:
+        secho(f"Invalid URL: {url}", fg="bright_red")
+
+    print_report(adds, exists, failures + len(rejected), submitted + len(rejected))
+
+
+def batch_update_documents(
+    updates: Iterable[tuple],
+    debug=False,
+    workers: int = MAX_WORKERS,
+    total: Optional[int] = None,
+) -> List[str]:
+    """Send document updates concurrently, as a bulk job under the update rate limit.
 
-    with Progress() as progress:
-        task = progress.add_task("Uploading...", total=number_of_documents)
-
-        for document in documents:
-            response = add_document(doc_info=document, debug=debug)
-
-            if response.status_code == 201:
-                adds += 1
-                progress.update(task, advance=1, description="Success")
-            elif response.status_code == 200:
-                adds += 1
-                exists += 1
-                progress.update(task, advance=1, description="Already Exists")
-            else:
-                failures += 1
-                progress.update(task, advance=1, description="Failure")
+    Args:
+        updates (Iterable[tuple]): `(document_id, data)` pairs, one PATCH each
+        workers (int): Number of concurrent requests
+        total (int, optional): Number of updates, for the progress bar
 
-    print_report(adds, exists, failures, number_of_documents)
+    Returns:
+        List[str]: The ids of the documents that were updated
+    """
+    updated: List[str] = []
+    job = Job(Priority.BULK, "update")
+
+    with Progress() as progress, ThreadPoolExecutor(max_workers=workers) as executor:
+        task = progress.add_task("Updating...", total=total)
+        pending = {}
+
+        def track(futures):
+            for future in futures:
+                document_id = pending.pop(future)
+                try:
+                    response = future.result()
+                except requests.RequestException:  # e.g. a dropped connection
+                    response = None
+                if response is not None and response.status_code == 200:
+                    updated.append(document_id)
+                    progress.update(task, advance=1, description="Success")
+                else:
+                    progress.update(task, advance=1, description="Failure")
+
+        try:
+            for document_id, data in updates:
+                if len(pending) >= workers * 2:  # bound the updates held in memory
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    track(done)
+                future = executor.submit(
+                    job.run,
+                    update_document,
+                    document_id=document_id,
+                    data=data,
+                    debug=debug,
+                )
+                pending[future] = document_id
+
+            track(as_completed(list(pending)))
+        except BaseException:
+            job.cancel()  # queued updates give up instead of being sent
+            raise
+
+    return updated
@@ -0,0 +1,122 @@
+"""Provides code to follow changes to the library as they happen."""
+
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from .api import iter_query
+from .constants import WATCH_BACKOFF, WATCH_INTERVAL, WATCH_MAX_INTERVAL
+from .diff import DocumentState, change_row, diff_states, document_state
+from .models import DocumentInfo
+from .query import DocumentQuery
+
+WATCH_OVERLAP = timedelta(seconds=5)  # Polled again, in case of clock skew
+
+Change = Tuple[Dict[str, Optional[str]], DocumentInfo]
+
+
+def _changes(
+    document: DocumentInfo,
+    states: Dict[str, DocumentState],
+    since: datetime,
+    synced: Optional[datetime] = None,
+) -> List[Dict[str, Optional[str]]]:
+    document_id, after = document_state(document)
+    before = states.get(document_id)
+    states[document_id] = after
+
+    if before == after and synced and document.updated_at <= synced:
+        return []  # as synced, only listed again within the overlap
+
+    if before is None:
+        # Not seen yet: saved since the watch started, or changed before
+        if document.created_at is None or document.created_at > since:
+            return [change_row("added", document_id, after.title, after=after.location)]
+    else:
+        changes = [*diff_states(document_id, before, after)]
+        if changes:
+            return changes
+    # e.g. its title or notes changed, which a diff doesn't report
+    return [change_row("updated", document_id, after.title)]
+
+
+def watch_library(
+    query: DocumentQuery,
+    since: Optional[datetime] = None,
+    states: Optional[Dict[str, DocumentState]] = None,
+    synced: Optional[datetime] = None,
+    interval: float = WATCH_INTERVAL,
+    max_interval: float = WATCH_MAX_INTERVAL,
+    polls: Optional[int] = None,
+    counts: Optional[Counter] = None,
+    sleep: Callable[[float], None] = time.sleep,
+    debug: bool = False,
+) -> Iterator[Change]:
+    """Poll Reader for changes to the documents of `query`, and yield them.
+
+    Each poll only lists documents updated after the newest one seen, so an
+    idle library costs a single page per poll. Polls come every `interval`
+    seconds while documents change. Each poll that finds nothing stretches
+    the interval by `WATCH_BACKOFF`, up to `max_interval`.
+
+    Args:
+        query (DocumentQuery): Filters and projection of the watched documents
+        since (datetime, optional): Report documents updated after this.
+            Naive times are local. Default: now
+        states (Dict[str, DocumentState], optional): Known documents, e.g.
+            from `index_states`, to tell what changed. Updated as changes arrive
+        synced (datetime, optional): When `states` were synced. Documents
+            unchanged since aren't reported. Naive times are local
+        interval (float): Seconds between polls while documents change
+        max_interval (float): Seconds between polls once idle
+        polls (int, optional): Stop after this many polls. Default: never
+        counts (Counter, optional): Incremented per change type, and for
+            "polls" and failed polls, as "errors"
+        sleep (callable): Waits between polls
+
+    Yields:
+        tuple: A `CHANGE_FIELDS` row and the changed `DocumentInfo`, one per change
+    """
+    counts = Counter() if counts is None else counts
+    states = {} if states is None else states
+    since = since.astimezone() if since else datetime.now(timezone.utc)
+    started = since
+    synced = synced.astimezone() if synced else None
+    # Documents polled again within the overlap, by the update time reported
+    reported: Dict[str, datetime] = {}
+    wait = interval
+
+    while True:
+        changed = False
+        try:
+            for document in iter_query(
+                query.updated_since(since - WATCH_OVERLAP), memoize=False, debug=debug
+            ):
+                updated_at = document.updated_at
+                if updated_at is None or reported.get(document.id) == updated_at:
+                    continue
+                reported[document.id] = updated_at
+                since = max(since, updated_at)
+                changed = True
+
+                for change in _changes(document, states, started, synced):
+                    counts[change["change"]] += 1
+                    yield change, document
+        except requests.RequestException:  # e.g. offline, try again later
+            counts["errors"] += 1
+
+        counts["polls"] += 1
+        if polls and counts["polls"] >= polls:
+            return
+
+        # Only documents that may be listed again are remembered
+        reported = {
+            document_id: updated_at
+            for document_id, updated_at in reported.items()
+            if updated_at > since - WATCH_OVERLAP
+        }
+        wait = interval if changed else min(wait * WATCH_BACKOFF, max_interval)
+        sleep(wait)
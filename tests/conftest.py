@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+import pytest
+
+# Caches are stored under a directory read when the package is imported
+os.environ["XDG_DATA_HOME"] = tempfile.mkdtemp(prefix="reader-tests-")
+os.environ.setdefault("READER_API_TOKEN", "test-token")
+
+from readwise_reader_cli import api
+from readwise_reader_cli.memo import QueryMemo
+from readwise_reader_cli.transport import LocalTransport
+
+
+def make_document(number: int, **fields) -> dict:
+    """A serialized document, newer the lower its number"""
+    document = {
+        "id": f"doc{number:04}",
+        "url": f"https://example.com/{number}",
+        "title": f"Document {number}",
+        "category": "article",
+        "location": "new",
+        "tags": {},
+        "created_at": "2024-01-01T00:00:00+00:00",
+        "updated_at": "2024-01-01T00:00:00+00:00",
+    }
+    document.update(fields)
+    return document
+
+
+@pytest.fixture
+def transport():
+    """Send requests to an emulated library of 250 documents, with a fresh memo"""
+    previous_transport, previous_memo = api.get_transport(), api.get_query_memo()
+    local = LocalTransport([make_document(number) for number in range(250)])
+    api.set_transport(local)
+    api.set_query_memo(QueryMemo())
+    yield local
+    api.set_transport(previous_transport)
+    api.set_query_memo(previous_memo)
@@ -0,0 +1,32 @@
+from conftest import make_document
+
+from readwise_reader_cli import Priority, Reader
+from readwise_reader_cli.data import read_sync_stats
+from readwise_reader_cli.profiles import use_profile
+from readwise_reader_cli.scheduler import current_job
+from readwise_reader_cli.transport import LocalTransport
+
+
+def test_sync_runs_as_a_sync_job_without_being_scheduled():
+    reader = Reader(
+        "test-token",
+        profile="client",
+        transport=LocalTransport([make_document(number) for number in range(10)]),
+    )
+    priorities = []
+    fetch = reader._sync_documents
+
+    def sync_documents(**kwargs):
+        priorities.append(current_job().priority)
+        return fetch(**kwargs)
+
+    reader._sync_documents = sync_documents
+
+    stats = reader.sync()
+
+    assert priorities == [Priority.SYNC]
+    assert stats["documents"] == 10
+    # Scheduled syncs keep the CLI's `list` offline for a while
+    assert not stats["scheduled"]
+    with use_profile("client"):
+        assert not read_sync_stats()["scheduled"]
@@ -0,0 +1,195 @@
+import threading
+import time
+from itertools import islice
+from types import SimpleNamespace
+
+import pytest
+
+from readwise_reader_cli import api, memo
+from readwise_reader_cli.constants import LIST_ENDPOINT
+from readwise_reader_cli.memo import QueryMemo
+from readwise_reader_cli.models import DocumentInfo
+from readwise_reader_cli.query import DocumentQuery
+
+
+class Source:
+    """Fetches a listing of `pages` pages of one document each, counting fetches"""
+
+    def __init__(self, pages=3, error=None, result=True, delay=0.0):
+        self.pages = [[{"id": f"doc{number}"}] for number in range(pages)]
+        self.error = error
+        self.result = result
+        self.delay = delay
+        self.calls = 0  # listings fetched
+        self.fetched = 0  # pages fetched
+
+    def __call__(self):
+        self.calls += 1
+        return self._fetch()
+
+    def _fetch(self):
+        for page in self.pages:
+            time.sleep(self.delay)
+            self.fetched += 1
+            yield page
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def read(reader, limit=100):
+    """Pages of a reader, at most `limit`, so a broken reader fails instead of hanging"""
+    return [*islice(reader, limit)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Time as seen by the memo, moved forward by setting `clock.now`"""
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(memo, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_concurrent_readers_share_one_fetch():
+    source = Source(pages=20, delay=0.001)
+    query_memo = QueryMemo()
+    barrier = threading.Barrier(8)
+    results = [None] * 8
+
+    def share(number):
+        reader = query_memo.pages("listing", source)
+        barrier.wait()  # every reader starts before the listing is done
+        results[number] = read(reader)
+
+    threads = [threading.Thread(target=share, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert source.calls == 1
+    assert source.fetched == 20
+    assert all(result == source.pages for result in results)
+
+
+def test_complete_listing_is_served_from_memory(clock):
+    source = Source()
+    query_memo = QueryMemo(ttl=60)
+
+    assert read(query_memo.pages("listing", source)) == source.pages
+    clock.now = 59
+    assert read(query_memo.pages("listing", source)) == source.pages
+    assert source.calls == 1
+
+
+def test_listing_is_fetched_again_after_ttl(clock):
+    source = Source()
+    query_memo = QueryMemo(ttl=60)
+
+    read(query_memo.pages("listing", source))
+    clock.now = 61
+    assert read(query_memo.pages("listing", source)) == source.pages
+    assert source.calls == 2
+
+
+def test_least_recently_used_listing_is_evicted(clock):
+    sources = {key: Source() for key in "abc"}
+    query_memo = QueryMemo(max_entries=2)
+
+    read(query_memo.pages("a", sources["a"]))
+    read(query_memo.pages("b", sources["b"]))
+    read(query_memo.pages("a", sources["a"]))  # now more recent than b
+    read(query_memo.pages("c", sources["c"]))
+    read(query_memo.pages("a", sources["a"]))
+    read(query_memo.pages("b", sources["b"]))
+
+    assert sources["a"].calls == 1
+    assert sources["b"].calls == 2
+
+
+def test_error_reaches_every_reader_and_isnt_kept():
+    error = RuntimeError("connection dropped")
+    source = Source(pages=2, error=error)
+    query_memo = QueryMemo()
+    first = query_memo.pages("listing", source)
+    second = query_memo.pages("listing", source)
+
+    assert next(first) == source.pages[0]
+    assert next(first) == source.pages[1]
+    with pytest.raises(RuntimeError) as raised:
+        next(first)
+    assert raised.value is error
+    # Pages that arrived before the error are still read, then the same error
+    assert next(second) == source.pages[0]
+    assert next(second) == source.pages[1]
+    with pytest.raises(RuntimeError) as raised:
+        next(second)
+    assert raised.value is error
+
+    assert read(query_memo.pages("listing", Source(pages=2))) == source.pages
+    assert source.calls == 1
+
+
+def test_listing_stopped_on_error_response_isnt_kept():
+    source = Source(result=False)
+    query_memo = QueryMemo()
+
+    read(query_memo.pages("listing", source))
+    read(query_memo.pages("listing", source))
+
+    assert source.calls == 2
+
+
+def test_detached_listing_drops_pages_every_reader_passed():
+    source = Source(pages=5)
+    query_memo = QueryMemo(max_documents=2)
+    first = query_memo.pages("listing", source)
+    second = query_memo.pages("listing", source)
+    flight = first._flight
+
+    for _ in range(4):
+        next(first)
+    assert flight.detached  # more documents than the memo keeps
+    assert flight._offset == 0  # still held for the second reader
+
+    next(second)
+    next(second)
+    assert flight._offset == 2
+
+    second.close()
+    assert flight._offset == 4
+    assert read(first) == source.pages[4:]
+
+    # A detached listing isn't served to later readers
+    read(query_memo.pages("listing", source))
+    assert source.calls == 2
+
+
+def test_clear_detaches_listings():
+    source = Source()
+    query_memo = QueryMemo()
+    reader = query_memo.pages("listing", source)
+    next(reader)
+
+    query_memo.clear()
+
+    assert read(reader) == source.pages[1:]  # readers in progress finish
+    read(query_memo.pages("listing", source))
+    assert source.calls == 2
+
+
+def test_saves_and_updates_clear_memoized_listings(transport):
+    query = DocumentQuery(limit=5)
+
+    [*api.iter_query(query)]
+    [*api.iter_query(query)]
+    assert transport.requests[LIST_ENDPOINT] == 1
+
+    api.add_document(DocumentInfo(url="https://example.org/new"))
+    [*api.iter_query(query)]
+    assert transport.requests[LIST_ENDPOINT] == 2
+
+    api.update_document("doc0001", {"title": "Renamed"})
+    documents = [*api.iter_query(query)]
+    assert transport.requests[LIST_ENDPOINT] == 3
+    assert {doc.id: doc.title for doc in documents}["doc0001"] == "Renamed"
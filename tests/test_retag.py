@@ -0,0 +1,53 @@
+import pytest
+from conftest import make_document
+
+from readwise_reader_cli.retag import TagChange, plan_retag, retagged, stored_tags
+
+
+@pytest.mark.parametrize(
+    "tags, changes, expected",
+    [
+        (("a", "b"), {"add": ("c",)}, ("a", "b", "c")),
+        (("a", "b"), {"add": ("a",)}, ("a", "b")),
+        (("a", "b"), {"remove": ("a",)}, ("b",)),
+        (("a", "b"), {"remove": ("missing",)}, ("a", "b")),
+        (("a", "b"), {"rename": ("a", "z")}, ("z", "b")),
+        (("b",), {"rename": ("a", "z")}, ("b",)),
+        # Renamed onto a tag the document already has
+        (("a", "b"), {"rename": ("a", "b")}, ("b",)),
+        # Renamed first, so the new name can be removed, then additions
+        (("a",), {"rename": ("a", "b"), "remove": ("b",), "add": ("c",)}, ("c",)),
+        ((), {"add": ("c", "c")}, ("c",)),
+    ],
+)
+def test_retagged(tags, changes, expected):
+    assert retagged(tags, **changes) == expected
+
+
+def test_plan_retag_skips_unchanged_documents():
+    documents = [
+        make_document(0, tags={"a": {"name": "a"}}),
+        make_document(1, tags={"b": {"name": "b"}}),
+        make_document(2, tags=["a", "b"]),
+        make_document(3, tags=None, title=None),
+    ]
+    skipped = []
+
+    plan = [*plan_retag(documents, add=("b",), skipped=skipped)]
+
+    assert plan == [
+        TagChange("doc0000", "Document 0", ("a",), ("a", "b")),
+        TagChange("doc0003", "https://example.com/3", (), ("b",)),
+    ]
+    assert skipped == ["doc0001", "doc0002"]
+
+
+def test_stored_tags_keep_existing_tags():
+    existing = {"name": "a", "type": "manual", "created": 1}
+    document = make_document(0, tags={"a": existing})
+
+    tags = stored_tags(document, ("a", "b"))
+
+    assert [*tags] == ["a", "b"]
+    assert tags["a"] is existing
+    assert tags["b"]["name"] == "b"
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from readwise_reader_cli.scheduler import (
+    Job,
+    Priority,
+    RateLimiter,
+    RequestCancelled,
+    current_job,
+    use_job,
+)
+
+
+def queue_waiters(limiter, waiters):
+    """Queue `(job, label)` waiters on a paused limiter, in order, and release them.
+
+    Returns:
+        list: The labels in the order the waiters were granted
+    """
+    granted = []
+    lock = threading.Lock()
+
+    def wait(job, label):
+        limiter.wait(job)
+        with lock:
+            granted.append(label)
+
+    limiter.pause(0.3)  # every waiter queues before the first slot
+    threads = []
+    for job, label in waiters:
+        thread = threading.Thread(target=wait, args=(job, label))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)  # arrive in order
+    for thread in threads:
+        thread.join(5)
+    return granted
+
+
+def test_higher_priority_is_granted_first():
+    limiter = RateLimiter()
+    bulk = Job(Priority.BULK)
+    sync = Job(Priority.SYNC)
+    interactive = Job(Priority.INTERACTIVE)
+
+    granted = queue_waiters(
+        limiter,
+        [(bulk, "bulk 1"), (bulk, "bulk 2"), (sync, "sync"), (interactive, "list")],
+    )
+
+    assert granted == ["list", "sync", "bulk 1", "bulk 2"]
+
+
+def test_jobs_of_the_same_priority_take_turns():
+    limiter = RateLimiter()
+    upload = Job(Priority.BULK, "upload")
+    update = Job(Priority.BULK, "update")
+
+    # The upload queued all its requests before the update arrived
+    granted = queue_waiters(
+        limiter,
+        [
+            (upload, "upload 1"),
+            (upload, "upload 2"),
+            (upload, "upload 3"),
+            (update, "update 1"),
+            (update, "update 2"),
+        ],
+    )
+
+    assert granted == ["upload 1", "update 1", "upload 2", "update 2", "upload 3"]
+
+
+def test_rate_spaces_grants():
+    limiter = RateLimiter(rate=600)  # one every 0.1 seconds
+    job = Job(Priority.BULK)
+
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.wait(job)
+
+    assert time.monotonic() - started >= 0.3
+
+
+def test_cancelled_job_stops_waiting():
+    limiter = RateLimiter()
+    job = Job(Priority.BULK, "upload")
+    errors = []
+
+    def wait():
+        try:
+            limiter.wait(job)
+        except RequestCancelled as e:
+            errors.append(e)
+
+    limiter.pause(10)
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.05)
+    job.cancel()
+    thread.join(1)
+
+    assert not thread.is_alive()
+    assert len(errors) == 1
+    with pytest.raises(RequestCancelled):
+        limiter.wait(job)
+
+
+def test_cancelled_waiter_leaves_the_queue_to_others():
+    limiter = RateLimiter()
+    upload = Job(Priority.INTERACTIVE, "upload")
+    sync = Job(Priority.SYNC)
+    granted = []
+
+    def wait(job, label):
+        try:
+            limiter.wait(job)
+            granted.append(label)
+        except RequestCancelled:
+            pass
+
+    limiter.pause(0.3)
+    threads = [
+        threading.Thread(target=wait, args=(upload, "upload")),
+        threading.Thread(target=wait, args=(sync, "sync")),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    upload.cancel()
+    for thread in threads:
+        thread.join(5)
+
+    assert granted == ["sync"]
+
+
+def test_requests_wait_as_the_current_job():
+    job = Job(Priority.BULK, "upload")
+
+    assert current_job().priority is Priority.INTERACTIVE
+    with use_job(job):
+        assert current_job() is job
+        assert job.run(current_job) is job
+    assert current_job() is not job
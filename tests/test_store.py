@@ -0,0 +1,217 @@
+import itertools
+import sqlite3
+from datetime import datetime
+
+import pytest
+from conftest import make_document
+
+from readwise_reader_cli.cache import read_cache_stream_rows, write_cache_stream
+from readwise_reader_cli.data import library_index, library_path, query_library
+from readwise_reader_cli.profiles import use_profile
+from readwise_reader_cli.query import DocumentQuery
+from readwise_reader_cli.store import (
+    INDEX_VERSION,
+    LibraryIndex,
+    LibraryIndexWriter,
+    index_path,
+    load_index,
+)
+
+DATE = "2024-01-02"
+SYNC_TIME = "2024-01-02 03:04:05.000006"
+
+# Tags of the library's documents, in library order
+TAGS = [("a",), ("a", "b"), ("b",), ("c",), (), ("a", "c")]
+
+_profiles = itertools.count()
+
+
+def tagged_library():
+    return [
+        make_document(number, tags={tag: {"name": tag} for tag in tags})
+        for number, tags in enumerate(TAGS)
+    ]
+
+
+@pytest.fixture
+def index():
+    """The index of a synced library of documents tagged with `TAGS`"""
+    with use_profile(f"store{next(_profiles)}"):
+        write_cache_stream(library_path(DATE), tagged_library(), time=SYNC_TIME)
+        yield library_index(DATE)
+
+
+@pytest.mark.parametrize(
+    "all_of, any_of, none_of, positions",
+    [
+        (("a",), (), (), [0, 1, 5]),
+        (("a", "b"), (), (), [1]),
+        ((), ("a", "b"), (), [0, 1, 2, 5]),
+        ((), ("b", "c"), (), [1, 2, 3, 5]),
+        (("a",), ("b", "c"), (), [1, 5]),
+        ((), ("a", "b"), ("c",), [0, 1, 2]),
+        (("a",), (), ("b",), [0, 5]),
+        ((), (), ("a",), [2, 3, 4]),
+        ((), (), ("a", "c"), [2, 4]),
+        (("missing",), (), (), []),
+    ],
+)
+def test_tagged_positions(index, all_of, any_of, none_of, positions):
+    assert index.tagged(all_of, any_of, none_of) == positions
+
+
+def test_tag_counts(index):
+    assert index.tag_counts() == {"a": 3, "b": 2, "c": 2}
+    assert index.size == len(TAGS)
+
+
+def test_tag_queries_read_the_documents_at_their_positions(index):
+    query = DocumentQuery(any_tags=("a", "b"), exclude_tags=("c",))
+
+    documents = query_library(query)
+
+    assert [document["id"] for document in documents] == [
+        "doc0000",
+        "doc0001",
+        "doc0002",
+    ]
+
+
+def test_documents_with_several_of_any_tags_are_listed_once(index):
+    documents = query_library(DocumentQuery(any_tags=("a", "b", "c")))
+
+    assert [document["id"] for document in documents] == [
+        "doc0000",
+        "doc0001",
+        "doc0002",
+        "doc0003",
+        "doc0005",
+    ]
+
+
+def test_repeated_rows_are_read_once(tmp_path):
+    path = tmp_path / "library.jsonl.gz"
+    write_cache_stream(path, tagged_library(), time=SYNC_TIME)
+
+    documents = read_cache_stream_rows(path, [0, 1, 1, 3, 3, 5])
+
+    assert [document["id"] for document in documents] == [
+        "doc0000",
+        "doc0001",
+        "doc0003",
+        "doc0005",
+    ]
+
+
+def test_index_of_another_version_is_rebuilt(index):
+    connection = sqlite3.connect(index_path())
+    connection.execute("UPDATE meta SET value = '2' WHERE key = 'version'")
+    connection.commit()
+    connection.close()
+
+    assert load_index().version == "2"
+    # Positions of an index of another version can't be trusted
+    assert query_library(DocumentQuery(tags=("a",))) is None
+
+    rebuilt = library_index(DATE)
+
+    assert rebuilt.version == INDEX_VERSION
+    assert rebuilt.tagged(("a",)) == [0, 1, 5]
+
+
+def activity_index(path):
+    """An index of documents saved, read and archived over a few weeks of 2024"""
+    documents = [
+        # Saved on a Monday, archived on the Wednesday half read
+        make_document(
+            1,
+            created_at="2024-01-01T10:00:00+00:00",
+            updated_at="2024-01-03T10:00:00+00:00",
+            location="archive",
+            word_count=1000,
+            reading_progress=0.5,
+        ),
+        # Saved on the Sunday ending that week, read the next day
+        make_document(
+            2,
+            created_at="2024-01-07T23:00:00+00:00",
+            updated_at="2024-01-08T01:00:00+00:00",
+            location="later",
+            word_count=200,
+            reading_progress=1.0,
+        ),
+        make_document(
+            3,
+            category="pdf",
+            created_at="2024-01-08T10:00:00+00:00",
+            updated_at="2024-02-01T10:00:00+00:00",
+            location="archive",
+        ),
+        # Highlights aren't documents of their own
+        make_document(
+            4,
+            category="highlight",
+            parent_id="doc0001",
+            created_at="2024-01-01T10:00:00+00:00",
+        ),
+    ]
+    with LibraryIndexWriter(path) as writer:
+        for document in documents:
+            writer.add(document)
+    return LibraryIndex.read(path)
+
+
+def test_activity_per_week_starting_on_monday(tmp_path):
+    index = activity_index(tmp_path / "index.sqlite")
+
+    assert index.activity("week") == {
+        "2024-01-01": {"saved": 2, "archived": 1, "words_read": 500},
+        "2024-01-08": {"saved": 1, "archived": 0, "words_read": 200},
+        "2024-01-29": {"saved": 0, "archived": 1, "words_read": 0},
+    }
+
+
+@pytest.mark.parametrize(
+    "period, periods",
+    [
+        (
+            "day",
+            ["2024-01-01", "2024-01-03", "2024-01-07", "2024-01-08", "2024-02-01"],
+        ),
+        ("month", ["2024-01-01", "2024-02-01"]),
+        ("year", ["2024-01-01"]),
+    ],
+)
+def test_activity_periods(tmp_path, period, periods):
+    index = activity_index(tmp_path / "index.sqlite")
+
+    activity = index.activity(period)
+
+    assert [*activity] == periods
+    assert sum(counts["saved"] for counts in activity.values()) == 3
+    assert sum(counts["archived"] for counts in activity.values()) == 2
+    assert sum(counts["words_read"] for counts in activity.values()) == 700
+
+
+def test_activity_since_and_per_category(tmp_path):
+    index = activity_index(tmp_path / "index.sqlite")
+
+    assert index.activity("week", since=datetime(2024, 1, 8)) == {
+        "2024-01-08": {"saved": 1, "archived": 0, "words_read": 200},
+        "2024-01-29": {"saved": 0, "archived": 1, "words_read": 0},
+    }
+    assert index.activity("month", category="pdf") == {
+        "2024-01-01": {"saved": 1, "archived": 0, "words_read": 0},
+        "2024-02-01": {"saved": 0, "archived": 1, "words_read": 0},
+    }
+
+
+def test_progress_totals(tmp_path):
+    index = activity_index(tmp_path / "index.sqlite")
+
+    assert index.progress_totals() == {"article": (1.5, 2), "pdf": (0.0, 1)}
+    # Only documents saved since count, the article was only read since
+    assert index.progress_totals(since=datetime(2024, 1, 8)) == {
+        "article": (0.0, 0),
+        "pdf": (0.0, 1),
+    }
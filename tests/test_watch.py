@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+
+import pytest
+from conftest import make_document
+
+from readwise_reader_cli import api
+from readwise_reader_cli.diff import index_states
+from readwise_reader_cli.memo import QueryMemo
+from readwise_reader_cli.query import DocumentQuery
+from readwise_reader_cli.transport import LocalTransport
+from readwise_reader_cli.watch import watch_library
+
+SINCE = datetime(2023, 12, 31, tzinfo=timezone.utc)
+SYNCED = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def documents():
+    """A library of four documents, all updated before `SYNCED`"""
+    documents = [make_document(number, reading_progress=0.0) for number in range(4)]
+    previous_transport, previous_memo = api.get_transport(), api.get_query_memo()
+    api.set_transport(LocalTransport(documents))
+    api.set_query_memo(QueryMemo())
+    yield documents
+    api.set_transport(previous_transport)
+    api.set_query_memo(previous_memo)
+
+
+def watched_changes(states, synced=None):
+    changes = watch_library(
+        DocumentQuery(),
+        since=SINCE,
+        states=states,
+        synced=synced,
+        polls=1,
+        sleep=lambda _: None,
+    )
+    return sorted((change["change"], change["id"]) for change, _ in changes)
+
+
+def synced_states(documents):
+    """States of the first three documents, the second since moved"""
+    states = index_states(documents[:3])
+    states["doc0001"] = states["doc0001"]._replace(location="later")
+    return states
+
+
+def test_documents_as_synced_are_not_reported(documents):
+    changes = watched_changes(synced_states(documents), synced=SYNCED)
+
+    assert changes == [("added", "doc0003"), ("moved", "doc0001")]
+
+
+def test_documents_updated_since_the_sync_are_reported(documents):
+    changes = watched_changes(
+        synced_states(documents), synced=datetime(2023, 12, 31, 12)
+    )
+
+    assert changes == [
+        ("added", "doc0003"),
+        ("moved", "doc0001"),
+        ("updated", "doc0000"),
+        ("updated", "doc0002"),
+    ]